@@ -0,0 +1,8 @@
+"""Micro-benchmarks for the deconvolution kernels.
+
+Each module contains :title-reference:`asv`-style benchmark classes: the class's
+``params`` are passed to ``setup`` and to every ``time_*`` method, and ``setup``
+raises :class:`NotImplementedError` to skip a combination, such as a Cython
+implementation which has not been built. They may be run with ``asv run``, or
+offline with ``python -m benchmarks``, which also reports memory allocations.
+"""
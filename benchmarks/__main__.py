@@ -0,0 +1,153 @@
+"""Run the benchmarks without :title-reference:`asv`.
+
+Usage::
+
+    python -m benchmarks [-k PATTERN] [--json PATH] [--compare PATH] [--threshold FRACTION]
+
+For each benchmark, the best time per call over several repeats is reported along
+with the calls per second, the peak memory traced while making one call, and the
+memory still allocated after that call. Results may be written out with ``--json``
+and compared against a previous run with ``--compare``, in which case the exit status
+is non-zero if any benchmark is slower than the previous run by more than ``--threshold``.
+A benchmark whose setup or call raises an error is reported as failed and the run
+continues with the next one, again with a non-zero exit status.
+"""
+import argparse
+import functools
+import importlib
+import inspect
+import itertools
+import json
+import os
+import pkgutil
+import sys
+import timeit
+import tracemalloc
+
+
+def discover():
+    package = os.path.dirname(os.path.abspath(__file__))
+    for _, name, _ in sorted(pkgutil.iter_modules([package])):
+        if not name.startswith("bench_"):
+            continue
+        module = importlib.import_module("benchmarks." + name)
+        for class_name, cls in sorted(inspect.getmembers(module, inspect.isclass)):
+            if cls.__module__ != module.__name__:
+                continue
+            methods = sorted(m for m in dir(cls) if m.startswith("time_"))
+            if methods:
+                yield "%s.%s" % (name, class_name), cls, methods
+
+
+def parameter_grid(cls):
+    params = getattr(cls, "params", None)
+    if params is None:
+        return [()]
+    if params and isinstance(params[0], (list, tuple)):
+        return list(itertools.product(*params))
+    return [(p,) for p in params]
+
+
+def measure(func, repeat=3):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    seconds = min(timer.repeat(repeat=repeat, number=number)) / number
+    tracemalloc.start()
+    try:
+        func()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": seconds,
+        "ops_per_second": 1. / seconds if seconds else float('inf'),
+        "peak_bytes": peak,
+        "retained_bytes": retained,
+    }
+
+
+def run(pattern=None, repeat=3):
+    results = []
+    failures = []
+    for name, cls, methods in discover():
+        param_names = getattr(cls, "param_names", [])
+        for combination in parameter_grid(cls):
+            label = ", ".join(map(str, combination))
+            selected = [m for m in methods
+                        if pattern is None or pattern in "%s.%s(%s)" % (name, m, label)]
+            if not selected:
+                continue
+            instance = cls()
+            try:
+                if hasattr(instance, "setup"):
+                    instance.setup(*combination)
+            except NotImplementedError as e:
+                print("%s(%s) skipped: %s" % (name, label, e))
+                continue
+            except Exception as e:
+                print("%s(%s) failed in setup: %s: %s" % (name, label, type(e).__name__, e))
+                failures.append("%s(%s)" % (name, label))
+                continue
+            for method in selected:
+                key = "%s.%s(%s)" % (name, method, label)
+                try:
+                    result = measure(functools.partial(getattr(instance, method), *combination), repeat)
+                except Exception as e:
+                    print("%s failed: %s: %s" % (key, type(e).__name__, e))
+                    failures.append(key)
+                    continue
+                result["name"] = "%s.%s" % (name, method)
+                result["params"] = dict(zip(param_names, map(str, combination)))
+                result["key"] = key
+                results.append(result)
+                print("%-80s %12.6f s %12.1f ops/s %10.1f KiB peak %10.1f KiB retained" % (
+                    result["key"], result["seconds"], result["ops_per_second"],
+                    result["peak_bytes"] / 1024., result["retained_bytes"] / 1024.))
+                sys.stdout.flush()
+    for key in failures:
+        print("FAILED %s" % (key,))
+    return results, failures
+
+
+def compare(results, baseline, threshold):
+    previous = {r["key"]: r for r in baseline}
+    regressions = []
+    for result in results:
+        if result["key"] not in previous:
+            continue
+        ratio = result["seconds"] / previous[result["key"]]["seconds"]
+        if ratio > 1 + threshold:
+            regressions.append((result["key"], ratio))
+    for key, ratio in regressions:
+        print("REGRESSION %s is %0.2fx slower" % (key, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the ms_deisotope micro-benchmarks")
+    parser.add_argument("-k", dest="pattern", default=None,
+                        help="Only run benchmarks whose name contains this string")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="The number of timing repeats to take the best of")
+    parser.add_argument("--json", dest="output", default=None,
+                        help="Write the results to this path")
+    parser.add_argument("--compare", dest="baseline", default=None,
+                        help="Compare the results to those written to this path by a previous run")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="The fractional slowdown reported as a regression")
+    args = parser.parse_args(argv)
+
+    results, failures = run(args.pattern, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
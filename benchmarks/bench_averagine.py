@@ -0,0 +1,29 @@
+from ms_deisotope import averagine
+
+from .common import IMPLEMENTATIONS, PEPTIDE, require_c, synthetic_envelopes
+
+
+class IsotopicCluster(object):
+    """:meth:`AveragineCache.isotopic_cluster`, answered from the cache and
+    generated from the averagine model.
+    """
+    params = IMPLEMENTATIONS
+    param_names = ["implementation"]
+
+    def setup(self, implementation):
+        if implementation == "c":
+            self.cache = require_c("averagine").AveragineCache(PEPTIDE)
+        else:
+            self.cache = averagine._AveragineCache(PEPTIDE)
+        self.queries = [(mz, charge) for mz, charge, _ in synthetic_envelopes()]
+        self.time_cached(implementation)
+
+    def time_cached(self, implementation):
+        isotopic_cluster = self.cache.isotopic_cluster
+        for mz, charge in self.queries:
+            isotopic_cluster(mz, charge)
+
+    def time_uncached(self, implementation):
+        isotopic_cluster = self.cache.averagine.isotopic_cluster
+        for mz, charge in self.queries:
+            isotopic_cluster(mz, charge)
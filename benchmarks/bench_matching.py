@@ -0,0 +1,40 @@
+from ms_deisotope import averagine, deconvolution
+
+from .common import (
+    IMPLEMENTATIONS, PEPTIDE, SEED, require_c, synthetic_envelopes,
+    synthetic_peak_index)
+
+
+def make_matcher(implementation, peaklist):
+    if implementation == "c":
+        base = require_c("deconvoluter_base").DeconvoluterBase
+    else:
+        base = deconvolution._DeconvoluterBase
+
+    class Matcher(base):
+        pass
+
+    matcher = Matcher()
+    matcher.peaklist = peaklist
+    return matcher
+
+
+class MatchTheoreticalIsotopicDistribution(object):
+    """:meth:`DeconvoluterBase.match_theoretical_isotopic_distribution` for patterns
+    which are present in the spectrum and patterns which are not.
+    """
+    params = IMPLEMENTATIONS
+    param_names = ["implementation"]
+
+    def setup(self, implementation):
+        envelopes = synthetic_envelopes()
+        self.matcher = make_matcher(implementation, synthetic_peak_index(envelopes))
+        cache = averagine._AveragineCache(PEPTIDE)
+        decoys = synthetic_envelopes(seed=SEED + 1)
+        self.patterns = [list(cache.isotopic_cluster(mz, charge))
+                         for mz, charge, _ in envelopes + decoys]
+
+    def time_match(self, implementation):
+        match = self.matcher.match_theoretical_isotopic_distribution
+        for pattern in self.patterns:
+            match(pattern, 2e-5)
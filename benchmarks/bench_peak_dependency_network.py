@@ -0,0 +1,45 @@
+from ms_deisotope.averagine import peptide
+from ms_deisotope.deconvolution import AveraginePeakDependenceGraphDeconvoluter
+from ms_deisotope.peak_dependency_network import PeakDependenceGraph, ArrayPeakDependenceGraph
+from ms_deisotope.scoring import PenalizedMSDeconVFitter
+
+from .common import synthetic_envelopes, synthetic_peak_index
+
+
+GRAPH_TYPES = {
+    "object": PeakDependenceGraph,
+    "array": ArrayPeakDependenceGraph,
+}
+
+
+class FindNonOverlappingIntervals(object):
+    """Building a peak dependence graph from the candidate fits of a synthetic
+    spectrum, and clustering it with :meth:`find_non_overlapping_intervals`.
+
+    The clustering step drops fits from the graph, so each call of
+    :meth:`time_find_non_overlapping_intervals` builds a new graph, and its
+    cost includes that of :meth:`time_add_fit_dependence`.
+    """
+    params = sorted(GRAPH_TYPES)
+    param_names = ["graph_type"]
+
+    def setup(self, graph_type):
+        self.graph_type = GRAPH_TYPES[graph_type]
+        self.peaklist = synthetic_peak_index(synthetic_envelopes())
+        decon = AveraginePeakDependenceGraphDeconvoluter(
+            self.peaklist, averagine=peptide, scorer=PenalizedMSDeconVFitter(20., 2.))
+        decon.populate_graph(charge_range=(1, 4))
+        self.fits = sorted(decon.peak_dependency_network.dependencies,
+                           key=lambda fit: (fit.seed_peak.index, fit.charge, fit.score))
+
+    def _build(self):
+        graph = self.graph_type(self.peaklist)
+        for fit in self.fits:
+            graph.add_fit_dependence(fit)
+        return graph
+
+    def time_add_fit_dependence(self, graph_type):
+        self._build()
+
+    def time_find_non_overlapping_intervals(self, graph_type):
+        self._build().find_non_overlapping_intervals()
@@ -0,0 +1,38 @@
+import random
+
+from ms_deisotope import peak_set
+
+from .common import IMPLEMENTATIONS, SEED, require_c, synthetic_deconvoluted_peaks, synthetic_envelopes
+
+
+class DeconvolutedPeakSetHasPeak(object):
+    """:meth:`DeconvolutedPeakSet.has_peak` by neutral mass and by m/z, for
+    queries which are present in the peak set and queries which are not.
+    """
+    params = IMPLEMENTATIONS
+    param_names = ["implementation"]
+
+    def setup(self, implementation):
+        if implementation == "c":
+            module = require_c("peak_set")
+            peak_type, peak_set_type = module.DeconvolutedPeak, module.DeconvolutedPeakSet
+        else:
+            peak_type, peak_set_type = peak_set._DeconvolutedPeak, peak_set._DeconvolutedPeakSet
+        peaks = synthetic_deconvoluted_peaks(synthetic_envelopes(n=5000), peak_type)
+        self.peak_set = peak_set_type(peaks)._reindex()
+        rng = random.Random(SEED)
+        present = rng.sample(peaks, 500)
+        absent = synthetic_deconvoluted_peaks(
+            synthetic_envelopes(n=500, seed=SEED + 1), peak_type)
+        self.masses = [p.neutral_mass for p in present + absent]
+        self.mzs = [p.mz for p in present + absent]
+
+    def time_has_peak(self, implementation):
+        has_peak = self.peak_set.has_peak
+        for mass in self.masses:
+            has_peak(mass, 1e-5)
+
+    def time_has_peak_mz(self, implementation):
+        has_peak = self.peak_set.has_peak
+        for mz in self.mzs:
+            has_peak(mz, 1e-5, True)
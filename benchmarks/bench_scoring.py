@@ -0,0 +1,53 @@
+from ms_deisotope import averagine, scoring
+from ms_deisotope.averagine import TheoreticalPeak
+
+from .bench_matching import make_matcher
+from .common import (
+    IMPLEMENTATIONS, PEPTIDE, require_c, synthetic_envelopes,
+    synthetic_peak_index)
+
+
+SCORERS = {
+    "msdeconv": ("MSDeconVFitter", (10.,)),
+    "penalized_msdeconv": ("PenalizedMSDeconVFitter", (20., 2.)),
+    "least_squares": ("LeastSquaresFitter", ()),
+    "scaled_g_test": ("ScaledGTestFitter", ()),
+}
+
+
+class Scorers(object):
+    """The isotopic fit scoring functions, evaluated on the matches for
+    each synthetic envelope.
+    """
+    params = [IMPLEMENTATIONS, sorted(SCORERS)]
+    param_names = ["implementation", "scorer"]
+
+    def setup(self, implementation, scorer):
+        name, args = SCORERS[scorer]
+        if implementation == "c":
+            scorer_type = getattr(require_c("scoring"), name)
+        else:
+            scorer_type = getattr(scoring, "_" + name)
+        self.scorer = scorer_type(*args)
+        envelopes = synthetic_envelopes()
+        self.peaklist = synthetic_peak_index(envelopes)
+        matcher = make_matcher("python", self.peaklist)
+        cache = averagine._AveragineCache(PEPTIDE)
+        self.pairs = []
+        for mz, charge, _ in envelopes:
+            theoretical = list(cache.isotopic_cluster(mz, charge))
+            observed = matcher.match_theoretical_isotopic_distribution(theoretical, 2e-5)
+            total = sum(p.intensity for p in observed)
+            expected = [TheoreticalPeak(p.mz, p.intensity * total, p.charge) for p in theoretical]
+            self.pairs.append((observed, expected))
+
+    def time_evaluate(self, implementation, scorer):
+        evaluate = self.scorer.evaluate
+        peaklist = self.peaklist
+        for observed, expected in self.pairs:
+            evaluate(peaklist, observed, expected)
+
+    def time_score_bound(self, implementation, scorer):
+        score_bound = self.scorer.score_bound
+        for observed, _ in self.pairs:
+            score_bound(observed)
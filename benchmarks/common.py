@@ -0,0 +1,86 @@
+"""Fixed-seed synthetic inputs shared by the benchmarks, and helpers for selecting
+the pure Python or Cython implementation of a kernel.
+"""
+import importlib
+import random
+
+import numpy as np
+
+from brainpy import neutral_mass
+from ms_peak_picker import FittedPeak, PeakIndex, PeakSet
+
+from ms_deisotope.averagine import peptide
+
+
+SEED = 1
+
+IMPLEMENTATIONS = ["python", "c"]
+
+PEPTIDE = {"C": 4.9384, "H": 7.7583, "N": 1.3577, "O": 1.4773, "S": 0.0417}
+
+
+def require_c(module):
+    """Import ``ms_deisotope._c.<module>``.
+
+    Raises
+    ------
+    NotImplementedError
+        If the extension has not been built, which marks the benchmark
+        as skipped.
+    """
+    try:
+        return importlib.import_module("ms_deisotope._c." + module)
+    except ImportError:
+        raise NotImplementedError("ms_deisotope._c.%s is not available" % (module,))
+
+
+def synthetic_envelopes(n=300, seed=SEED, mz_range=(350., 1800.), charge_range=(1, 4)):
+    """Draw `n` random isotopic envelopes.
+
+    Returns
+    -------
+    list of tuple
+        The (monoisotopic m/z, charge, abundance) of each envelope
+    """
+    rng = random.Random(seed)
+    return [(rng.uniform(*mz_range), rng.randint(*charge_range), 10 ** rng.uniform(3, 7))
+            for _ in range(n)]
+
+
+def synthetic_peak_index(envelopes, seed=SEED, noise_ratio=0.5, averagine=peptide):
+    """Build a centroided spectrum containing the averagine isotopic pattern
+    of each of `envelopes`, with a small m/z error added to each peak, and
+    `noise_ratio` times as many low abundance noise peaks.
+
+    Returns
+    -------
+    ms_peak_picker.PeakIndex
+    """
+    rng = random.Random(seed)
+    points = []
+    for mz, charge, abundance in envelopes:
+        for tp in averagine.isotopic_cluster(mz, charge, truncate_after=0.95):
+            points.append((tp.mz * (1 + rng.gauss(0, 2e-6)), tp.intensity * abundance))
+    lo = min(p[0] for p in points)
+    hi = max(p[0] for p in points)
+    for _ in range(int(len(points) * noise_ratio)):
+        points.append((rng.uniform(lo, hi), 10 ** rng.uniform(2, 3.5)))
+    points.sort()
+    peaks = [FittedPeak(mz, intensity, intensity / 100., i, i, 0.01, intensity * 0.01)
+             for i, (mz, intensity) in enumerate(points)]
+    peak_set = PeakSet(peaks)
+    peak_set.reindex()
+    return PeakIndex(np.array([p[0] for p in points]), np.array([p[1] for p in points]), peak_set)
+
+
+def synthetic_deconvoluted_peaks(envelopes, peak_type):
+    """Build one `peak_type` instance, a :class:`~.DeconvolutedPeak` implementation,
+    for each of `envelopes`.
+
+    Returns
+    -------
+    list
+    """
+    return [peak_type(neutral_mass(mz, charge), abundance, charge, abundance / 100., 0, 0.01,
+                      envelope=[(mz, abundance)], mz=mz)
+            for mz, charge, abundance in envelopes]
@@ -0,0 +1,213 @@
+"""Measure whole-run processing of simulated LC-MS/MS runs of increasing size.
+
+Usage::
+
+    python -m benchmarks.end_to_end [--durations 1 5 10] [--complexity 500] [--database]
+                                    [--workdir DIR] [--json PATH] [--statistics DIR]
+
+For each duration, a :class:`~.SyntheticRun` is written to mzML, then read back and
+processed by :class:`~.ScanProcessor`, writing the deconvoluted scans to mzML and
+optionally to a SQLite database, while the MS^1 peaks are assembled into an
+:class:`~.LCMSFeatureForest`. Each size runs in its own process so that its peak
+resident memory can be reported, along with the time, scans per second and output
+size of each stage. With ``--statistics``, the per-scan :class:`~.ScanStatistics`
+of each size are written to a JSON lines file in that directory.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+from ms_deisotope.averagine import peptide
+from ms_deisotope.scoring import PenalizedMSDeconVFitter, MSDeconVFitter
+from ms_deisotope.data_source.common import ScanBunch
+from ms_deisotope.feature_map.feature_map import LCMSFeatureForest
+from ms_deisotope.processor import ScanProcessor, ProcessingStatistics, JSONLinesStatisticsWriter
+
+from .synthetic import SyntheticRun, write_synthetic_run
+
+
+def peak_memory():
+    """The peak resident memory of this process in bytes, or `None` if
+    it cannot be determined.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux, and bytes on macOS
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+class Stage(object):
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.
+        self.scans = 0
+        self.output = None
+
+    def summary(self):
+        return {
+            "seconds": self.seconds,
+            "scans": self.scans,
+            "scans_per_second": self.scans / self.seconds if self.seconds else None,
+            "output_bytes": os.path.getsize(self.output) if self.output and os.path.exists(
+                self.output) else None,
+        }
+
+
+def run_size(duration, complexity, workdir, database=False, statistics_dir=None):
+    run = SyntheticRun(duration=duration, complexity=complexity)
+    stages = []
+
+    generate = Stage("generate")
+    generate.output = os.path.join(workdir, "synthetic_%g.mzML" % duration)
+    start = time.time()
+    with open(generate.output, 'wb') as fh:
+        generate.scans = write_synthetic_run(run, fh)
+    generate.seconds = time.time() - start
+    stages.append(generate)
+
+    from ms_deisotope.output.mzml import MzMLScanSerializer
+    process = Stage("process")
+    write_mzml = Stage("write_mzml")
+    write_mzml.output = os.path.join(workdir, "processed_%g.mzML" % duration)
+    features = Stage("feature_forest")
+    write_database = None
+    db_serializer = None
+    if database:
+        from ms_deisotope.output.db import DatabaseScanSerializer
+        write_database = Stage("write_database")
+        write_database.output = os.path.join(workdir, "processed_%g.db" % duration)
+        db_serializer = DatabaseScanSerializer(write_database.output, sample_name="synthetic")
+
+    statistics = None
+    statistics_handle = None
+    if statistics_dir is not None:
+        statistics_handle = open(os.path.join(statistics_dir, "statistics_%g.jsonl" % duration), 'w')
+        statistics = ProcessingStatistics(JSONLinesStatisticsWriter(statistics_handle), keep_records=False)
+    processor = ScanProcessor(
+        generate.output,
+        ms1_deconvolution_args={"averagine": peptide, "scorer": PenalizedMSDeconVFitter(20., 2.)},
+        msn_deconvolution_args={"averagine": peptide, "scorer": MSDeconVFitter(10.)},
+        terminate_on_error=False, statistics=statistics)
+    forest = LCMSFeatureForest()
+    with open(write_mzml.output, 'wb') as fh:
+        serializer = MzMLScanSerializer(fh, n_spectra=generate.scans, sample_name="synthetic")
+        while True:
+            start = time.time()
+            try:
+                precursor, products = processor.next()
+            except StopIteration:
+                break
+            bunch = ScanBunch(precursor.pack(), [p.pack() for p in products])
+            process.seconds += time.time() - start
+            n = 1 + len(products)
+            process.scans += n
+
+            start = time.time()
+            if statistics is not None:
+                with statistics.measure(precursor, "write"):
+                    serializer.save_scan_bunch(bunch)
+            else:
+                serializer.save_scan_bunch(bunch)
+            write_mzml.seconds += time.time() - start
+            write_mzml.scans += n
+
+            start = time.time()
+            for peak in bunch.precursor.peak_set:
+                forest.handle_peak(peak, bunch.precursor.scan_time)
+            features.seconds += time.time() - start
+            features.scans += 1
+
+            if db_serializer is not None:
+                start = time.time()
+                db_serializer.save(bunch)
+                write_database.seconds += time.time() - start
+                write_database.scans += n
+        start = time.time()
+        serializer.complete()
+        write_mzml.seconds += time.time() - start
+    if statistics_handle is not None:
+        statistics_handle.close()
+    stages.extend([process, write_mzml, features])
+    if db_serializer is not None:
+        start = time.time()
+        db_serializer.complete()
+        write_database.seconds += time.time() - start
+        stages.append(write_database)
+
+    return {
+        "duration": duration,
+        "complexity": complexity,
+        "analytes": len(run.analytes),
+        "features": len(forest),
+        "peak_memory_bytes": peak_memory(),
+        "stages": {stage.name: stage.summary() for stage in stages},
+    }
+
+
+def _run_size_task(args):
+    return run_size(*args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark whole-run processing of simulated LC-MS/MS runs")
+    parser.add_argument("--durations", type=float, nargs="+", default=[1., 5., 10.],
+                        help="The run lengths to simulate, in minutes")
+    parser.add_argument("--complexity", type=int, default=500,
+                        help="The number of analytes per 10 minutes of run time")
+    parser.add_argument("--database", action="store_true", default=False,
+                        help="Also write the processed scans to a SQLite database")
+    parser.add_argument("--workdir", default=None,
+                        help="Where to write the simulated and processed files. Defaults to a temporary "
+                             "directory which is removed afterwards")
+    parser.add_argument("--json", dest="output", default=None,
+                        help="Write the results to this path")
+    parser.add_argument("--statistics", dest="statistics_dir", default=None,
+                        help="Write the per-scan processing statistics of each size to a JSON lines "
+                             "file in this directory")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ms_deisotope_bench_")
+    results = []
+    try:
+        for duration in args.durations:
+            complexity = max(int(args.complexity * duration / 10.), 1)
+            # A fresh process per size so that peak memory reflects only that size
+            pool = multiprocessing.Pool(1, maxtasksperchild=1)
+            try:
+                result = pool.apply(_run_size_task, ((
+                    duration, complexity, workdir, args.database, args.statistics_dir),))
+            finally:
+                pool.close()
+                pool.join()
+            results.append(result)
+            memory = result["peak_memory_bytes"]
+            print("duration=%g min, %d analytes, %d features, peak memory %s" % (
+                duration, result["analytes"], result["features"],
+                "%0.1f MiB" % (memory / 2. ** 20) if memory is not None else "unknown"))
+            for name, stage in result["stages"].items():
+                print("    %-16s %8d scans %10.2f s %10.2f scans/s %12s" % (
+                    name, stage["scans"], stage["seconds"], stage["scans_per_second"] or 0.,
+                    "%0.1f KiB" % (stage["output_bytes"] / 1024.) if stage["output_bytes"] else ""))
+            sys.stdout.flush()
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""Simulate data-dependent LC-MS/MS runs from averagine isotopic patterns, for
+benchmarking whole-run processing at controllable sizes.
+"""
+import math
+import random
+
+from ms_peak_picker import FittedPeak, PeakSet
+
+from ms_deisotope.averagine import peptide, mass_charge_ratio
+from ms_deisotope.data_source.common import (
+    ProcessedScan, PrecursorInformation, ActivationInformation, ScanBunch)
+
+from .common import SEED
+
+
+class SyntheticAnalyte(object):
+    """An ion species which elutes over a Gaussian profile in time.
+
+    Attributes
+    ----------
+    neutral_mass : float
+        The monoisotopic neutral mass
+    apex_time : float
+        The time of the analyte's most abundant point, in minutes
+    width : float
+        The standard deviation of the elution profile, in minutes
+    abundance : float
+        The total intensity of the analyte at its apex
+    charge_states : list of tuple
+        Pairs of charge state and the fraction of the abundance it carries
+    fragment_seed : int
+        Seeds the fragments generated for the analyte's MSn scans, so that
+        every scan of the same analyte contains the same fragments
+    """
+
+    def __init__(self, neutral_mass, apex_time, width, abundance, charge_states, fragment_seed):
+        self.neutral_mass = neutral_mass
+        self.apex_time = apex_time
+        self.width = width
+        self.abundance = abundance
+        self.charge_states = charge_states
+        self.fragment_seed = fragment_seed
+
+    def elution(self, time):
+        return math.exp(-0.5 * ((time - self.apex_time) / self.width) ** 2)
+
+    def __repr__(self):
+        return "SyntheticAnalyte(neutral_mass=%0.4f, apex_time=%0.3f, charges=%r)" % (
+            self.neutral_mass, self.apex_time, [z for z, _ in self.charge_states])
+
+
+class SyntheticRun(object):
+    """Generates the scans of a simulated data-dependent acquisition LC-MS/MS run.
+
+    Each acquisition cycle is one MS^1 scan followed by MS^n scans of the :attr:`top_n`
+    most intense precursor ions not under dynamic exclusion. The MS^1 scans contain
+    the averagine isotopic patterns of every eluting analyte in each of its charge states
+    plus random noise peaks, and each MS^n scan contains the isotopic patterns of a fixed
+    set of fragments of its precursor plus noise. All scans are centroided.
+
+    Iterating over the run produces :class:`~.ScanBunch` instances of :class:`~.ProcessedScan`
+    with their :attr:`peak_set` populated, suitable for :meth:`~.MzMLScanSerializer.save_scan_bunch`
+    with ``deconvoluted=False``.
+
+    Attributes
+    ----------
+    duration : float
+        The length of the run in minutes
+    complexity : int
+        The number of analytes eluting over the run
+    top_n : int
+        The number of MS^n scans acquired per cycle
+    scan_duration : float
+        The time taken to acquire each scan, in minutes
+    charge_range : tuple
+        The range of charge states analytes may carry
+    mz_range : tuple
+        The m/z range acquired in MS^1 scans
+    noise_peaks : int
+        The number of noise peaks added to each MS^1 scan, and a quarter as many
+        to each MS^n scan
+    mass_error : float
+        The standard deviation of the relative m/z error added to each peak
+    dynamic_exclusion : float
+        The time a selected precursor is excluded from being selected again, in minutes
+    averagine : Averagine
+        The averagine model used to generate isotopic patterns
+    seed : int
+        The random seed the run is generated from
+    analytes : list of SyntheticAnalyte
+        The ground truth composition of the run
+    """
+
+    def __init__(self, duration=10., complexity=500, top_n=5, scan_duration=0.005, charge_range=(1, 4),
+                 mz_range=(350., 1800.), noise_peaks=200, mass_error=2e-6, dynamic_exclusion=0.25,
+                 averagine=peptide, seed=SEED):
+        self.duration = duration
+        self.complexity = complexity
+        self.top_n = top_n
+        self.scan_duration = scan_duration
+        self.charge_range = charge_range
+        self.mz_range = mz_range
+        self.noise_peaks = noise_peaks
+        self.mass_error = mass_error
+        self.dynamic_exclusion = dynamic_exclusion
+        self.averagine = averagine
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.analytes = self._make_analytes()
+
+    def __repr__(self):
+        return "SyntheticRun(duration=%r, complexity=%r, top_n=%r, seed=%r)" % (
+            self.duration, self.complexity, self.top_n, self.seed)
+
+    @property
+    def cycle_count(self):
+        return int(self.duration / (self.scan_duration * (self.top_n + 1)))
+
+    @property
+    def scan_count(self):
+        return self.cycle_count * (self.top_n + 1)
+
+    def _make_analytes(self):
+        rng = self.rng
+        lo, hi = self.charge_range
+        analytes = []
+        for i in range(self.complexity):
+            neutral_mass = rng.uniform(500., 4000.)
+            # Larger analytes tend to carry more charge
+            mean_charge = min(max(neutral_mass / 800., lo), hi)
+            weights = [(z, math.exp(-(z - mean_charge) ** 2)) for z in range(lo, hi + 1)]
+            weights = [(z, w) for z, w in weights if w > 0.05 and self.mz_range[0] <= mass_charge_ratio(
+                neutral_mass, z) <= self.mz_range[1]]
+            if not weights:
+                continue
+            total = sum(w for _, w in weights)
+            analytes.append(SyntheticAnalyte(
+                neutral_mass, rng.uniform(0, self.duration), rng.uniform(0.05, 0.25),
+                10 ** rng.uniform(4, 8), [(z, w / total) for z, w in weights],
+                self.seed * 100003 + i))
+        analytes.sort(key=lambda x: x.apex_time)
+        return analytes
+
+    def _eluting(self, time):
+        return [a for a in self.analytes if abs(time - a.apex_time) < 4 * a.width]
+
+    def _peak_set(self, points):
+        points.sort()
+        peaks = [FittedPeak(mz, intensity, intensity / 50., i, i, 0.01, intensity * 0.01)
+                 for i, (mz, intensity) in enumerate(points)]
+        peak_set = PeakSet(peaks)
+        peak_set.reindex()
+        return peak_set
+
+    def _isotopic_points(self, points, neutral_mass, charge, abundance):
+        ions = []
+        for peak in self.averagine.isotopic_cluster(
+                mass_charge_ratio(neutral_mass, charge), charge, truncate_after=0.95):
+            mz = peak.mz * (1 + self.rng.gauss(0, self.mass_error))
+            points.append((mz, peak.intensity * abundance))
+            ions.append(points[-1])
+        return ions
+
+    def _noise(self, points, n, lo, hi, floor):
+        for _ in range(n):
+            points.append((self.rng.uniform(lo, hi), floor * self.rng.expovariate(1.)))
+
+    def _ms1_scan(self, time, index, scan_id):
+        points = []
+        precursors = []
+        for analyte in self._eluting(time):
+            abundance = analyte.abundance * analyte.elution(time)
+            for charge, fraction in analyte.charge_states:
+                ions = self._isotopic_points(points, analyte.neutral_mass, charge, abundance * fraction)
+                if ions:
+                    base_peak = max(ions, key=lambda x: x[1])
+                    precursors.append((base_peak[1], base_peak[0], charge, analyte))
+        self._noise(points, self.noise_peaks, self.mz_range[0], self.mz_range[1], 1e3)
+        scan = ProcessedScan(
+            scan_id, scan_id, None, 1, time, index, self._peak_set(points), None,
+            polarity=1)
+        return scan, precursors
+
+    def _msn_scan(self, time, index, scan_id, precursor_scan, selection):
+        intensity, mz, charge, analyte = selection
+        rng = random.Random(analyte.fragment_seed)
+        points = []
+        n_fragments = rng.randint(10, 40)
+        for _ in range(n_fragments):
+            fragment_mass = rng.uniform(150., analyte.neutral_mass - 50.)
+            fragment_charge = rng.randint(1, max(1, charge - 1))
+            self._isotopic_points(
+                points, fragment_mass, fragment_charge, intensity * rng.uniform(0.01, 0.5))
+        self._noise(points, self.noise_peaks // 4, 100., mass_charge_ratio(analyte.neutral_mass, 1), 1e2)
+        precursor_information = PrecursorInformation(
+            mz, intensity, charge, precursor_scan.id, None, product_scan_id=scan_id)
+        scan = ProcessedScan(
+            scan_id, scan_id, precursor_information, 2, time, index, self._peak_set(points), None,
+            polarity=1, activation=ActivationInformation("beam-type collision-induced dissociation", 30.))
+        return scan
+
+    def _select_precursors(self, precursors, time, exclusions):
+        selected = []
+        for selection in sorted(precursors, key=lambda x: x[0], reverse=True):
+            mz = selection[1]
+            if any(abs(mz - excluded_mz) / mz < 1e-5 and time < until
+                   for excluded_mz, until in exclusions):
+                continue
+            selected.append(selection)
+            exclusions.append((mz, time + self.dynamic_exclusion))
+            if len(selected) == self.top_n:
+                break
+        return selected
+
+    def __iter__(self):
+        # Each iteration over the run produces the same scans
+        self.rng = random.Random(self.seed + 1)
+        time = 0.
+        index = 0
+        exclusions = []
+        for _ in range(self.cycle_count):
+            precursor_id = "controllerType=0 controllerNumber=1 scan=%d" % (index + 1,)
+            precursor_scan, precursors = self._ms1_scan(time, index, precursor_id)
+            time += self.scan_duration
+            index += 1
+            exclusions = [(mz, until) for mz, until in exclusions if until > time]
+            products = []
+            for selection in self._select_precursors(precursors, time, exclusions):
+                product_id = "controllerType=0 controllerNumber=1 scan=%d" % (index + 1,)
+                products.append(self._msn_scan(time, index, product_id, precursor_scan, selection))
+                time += self.scan_duration
+                index += 1
+            # Keep the cycle time constant when fewer than top_n precursors are available
+            time += self.scan_duration * (self.top_n - len(products))
+            yield ScanBunch(precursor_scan, products)
+
+
+def write_synthetic_run(run, handle, sample_name="synthetic"):
+    """Write all of the scans of `run` to `handle` in mzML format.
+
+    Parameters
+    ----------
+    run : SyntheticRun
+        The run to write
+    handle : file-like
+        The binary file to write to
+    sample_name : str, optional
+        The sample name recorded in the file
+
+    Returns
+    -------
+    int
+        The number of scans written
+    """
+    from ms_deisotope.output.mzml import MzMLScanSerializer
+    serializer = MzMLScanSerializer(
+        handle, n_spectra=run.scan_count, deconvoluted=False, sample_name=sample_name)
+    n = 0
+    for bunch in run:
+        serializer.save_scan_bunch(bunch)
+        n += 1 + len(bunch.products)
+    serializer.complete()
+    return n
@@ -5,6 +5,7 @@ from .averagine import (
 from .deconvolution import (
     AveragineDeconvoluter, CompositionListDeconvoluter,
     AveraginePeakDependenceGraphDeconvoluter, CompositionListPeakDependenceGraphDeconvoluter)
+from .composition_library import CompositionLibrary
 from .scoring import MSDeconVFitter, PenalizedMSDeconVFitter, DistinctPatternFitter, IsotopicFitRecord
 from .peak_set import DeconvolutedPeak, DeconvolutedPeakSet, DeconvolutedPeakSolution
 from .processor import ScanProcessor
@@ -15,6 +16,7 @@ __all__ = [
     "Averagine", 'peptide', 'glycan', 'glycopeptide', 'heparin',
     "AveragineDeconvoluter", "CompositionListDeconvoluter",
     "AveraginePeakDependenceGraphDeconvoluter", "CompositionListPeakDependenceGraphDeconvoluter",
+    "CompositionLibrary",
     "MSDeconVFitter", "PenalizedMSDeconVFitter", "DistinctPatternFitter", "IsotopicFitRecord",
     "DeconvolutedPeak", "DeconvolutedPeakSet", "DeconvolutedPeakSolution",
     "MzMLLoader", "MzXMLLoader", "MSFileLoader", "ScanProcessor"
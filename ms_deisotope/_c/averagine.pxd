@@ -7,6 +7,14 @@ cdef double neutral_mass(double mz,  int z, double charge_carrier=*)
 cdef void slide(double mz, list peaklist)
 cdef dict scale_dict(dict data, double factor)
 
+cdef enum ScaleMethod:
+    scale_sum
+    scale_max
+    scale_meanscale
+
+cdef double scale_factor_arrays(double* theoretical_intensity, size_t n, double* experimental_intensity,
+                                size_t n_experimental, int method) nogil
+
 cdef class Averagine(object):
     cdef:
         public double base_mass
@@ -51,6 +59,8 @@ cdef class AveragineCache(object):
         public Averagine averagine
         public double cache_truncation
         public bint enabled
+        public size_t hits
+        public size_t misses
     
     cdef TheoreticalIsotopicPattern has_mz_charge_pair(self, double mz, int charge=*, double charge_carrier=*, double truncate_after=*, double ignore_below=*)
     cpdef TheoreticalIsotopicPattern isotopic_cluster(self, double mz, int charge=*, double charge_carrier=*, double truncate_after=*, double ignore_below=*)
@@ -190,6 +190,40 @@ cdef double sum_intensity(list peaklist):
     return total
 
 
+@cython.cdivision
+cdef double scale_factor_arrays(double* theoretical_intensity, size_t n, double* experimental_intensity,
+                                size_t n_experimental, int method) nogil:
+    """Compute the factor by which to multiply a theoretical isotopic pattern's intensities
+    to match an experimental distribution, using only C arrays.
+
+    ``n_experimental`` must be at least 1 for "max" and at least ``n`` for "meanscale".
+    """
+    cdef:
+        size_t i
+        double total_abundance, maximum, scales, weights, w
+
+    if method == ScaleMethod.scale_sum:
+        total_abundance = 0
+        for i in range(n_experimental):
+            total_abundance += experimental_intensity[i]
+        return total_abundance
+    elif method == ScaleMethod.scale_max:
+        maximum = 0
+        for i in range(n):
+            if theoretical_intensity[i] > maximum:
+                maximum = theoretical_intensity[i]
+        return experimental_intensity[0] / maximum
+    elif method == ScaleMethod.scale_meanscale:
+        scales = 0
+        weights = 0
+        for i in range(n):
+            w = (theoretical_intensity[i] * experimental_intensity[i] ** 2)
+            scales += experimental_intensity[i] / theoretical_intensity[i] * w
+            weights += w
+        return scales / weights
+    return 1.0
+
+
 @cython.freelist(1000000)
 cdef class TheoreticalIsotopicPattern(object):
 
@@ -340,51 +374,47 @@ cdef class TheoreticalIsotopicPattern(object):
             peak.intensity *= normalizer
         return self
 
-    @cython.cdivision
     cpdef TheoreticalIsotopicPattern scale(self, list experimental_distribution, str method="sum"):
         cdef:
-            size_t i, j, n
+            size_t i, n, n_experimental
+            int method_code
             TheoreticalPeak peak
-            FittedPeak expeak
-            double total_abundance, maximum, scale_factor
-            double weights, scales, w
+            double scale_factor
+            double* buffer
+            double* theoretical_intensity
+            double* experimental_intensity
 
         n = self.get_size()
         if n == 0:
             raise ValueError("Isotopic Pattern has length 0")
         if method == "sum":
-            total_abundance = sum_intensity(experimental_distribution)
-            for i in range(n):
-                peak = self.get(i)
-                peak.intensity *= total_abundance
+            method_code = ScaleMethod.scale_sum
         elif method == "max":
-            i = 0
-            maximum = 0
-            for j in range(n):
-                peak = self.get(j)
-                if peak.intensity > maximum:
-                    maximum = peak.intensity
-                    j = i
-            scale_factor = (<FittedPeak>PyList_GET_ITEM(
-                experimental_distribution, i)).intensity / maximum
-            for j in range(n):
-                peak = self.get(j)
-                peak.intensity *= scale_factor
+            method_code = ScaleMethod.scale_max
         elif method == "meanscale":
-            scales = 0
-            weights = 0
-            total_abundance = 0
-            for i in range(n):
-                expeak = <FittedPeak>PyList_GET_ITEM(experimental_distribution, i)
-                peak = self.get(i)
-                total_abundance += expeak.intensity
-                w = (peak.intensity * expeak.intensity ** 2)
-                scales += expeak.intensity / peak.intensity * w
-                weights += w
-            scale_factor = scales / weights
-            for i in range(n):
-                peak = self.get(i)
-                peak.intensity *= scale_factor
+            method_code = ScaleMethod.scale_meanscale
+        else:
+            return self
+
+        n_experimental = PyList_GET_SIZE(experimental_distribution)
+        buffer = <double*>malloc(sizeof(double) * (n + n_experimental))
+        if buffer == NULL:
+            raise MemoryError()
+        theoretical_intensity = buffer
+        experimental_intensity = buffer + n
+        for i in range(n):
+            theoretical_intensity[i] = self.get(i).intensity
+        for i in range(n_experimental):
+            experimental_intensity[i] = (<FittedPeak>PyList_GET_ITEM(experimental_distribution, i)).intensity
+
+        with nogil:
+            scale_factor = scale_factor_arrays(
+                theoretical_intensity, n, experimental_intensity, n_experimental, method_code)
+            free(buffer)
+
+        for i in range(n):
+            peak = self.get(i)
+            peak.intensity *= scale_factor
         return self
 
     def _scale_raw(self, double scale_factor):
@@ -437,6 +467,8 @@ cdef class AveragineCache(object):
             self.averagine = Averagine(averagine)
         self.cache_truncation = cache_truncation
         self.enabled = True
+        self.hits = 0
+        self.misses = 0
 
     def __reduce__(self):
         return self.__class__, self.__getstate__()
@@ -471,10 +503,12 @@ cdef class AveragineCache(object):
             cache_key = (key_mz, charge, charge_carrier, truncate_after)
             pvalue = PyDict_GetItem(self.backend, cache_key)
             if pvalue == NULL:
+                self.misses += 1
                 tid = self.averagine._isotopic_cluster(mz, charge, charge_carrier, truncate_after)
                 PyDict_SetItem(self.backend, cache_key, tid.clone())
                 return tid
             else:
+                self.hits += 1
                 tid = <TheoreticalIsotopicPattern>pvalue
                 tid = tid.clone()
                 tid.shift(mz, True)
@@ -503,6 +537,13 @@ cdef class AveragineCache(object):
     def items(self):
         return self.averagine.items()
 
+    @property
+    def hit_rate(self):
+        cdef size_t total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / <double>total
+
     def __repr__(self):
         return "AveragineCache(%r)" % self.averagine
 
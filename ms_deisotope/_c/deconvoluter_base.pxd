@@ -20,7 +20,18 @@ cdef class DeconvoluterBase(object):
         public IsotopicFitterBase scorer
         public bint verbose
         public dict _slice_cache
-
+        public dict _placeholder_cache
+        public long scored_fits
+        public long pruned_fits
+
+        double* _mz_index
+        size_t _mz_index_size
+        object _mz_index_source
+        bint _mz_index_usable
+
+    cdef int _update_mz_index(self) except -1
+    cdef bint _prune_fit(self, list experimental, bint has_best, double best)
+    cpdef FittedPeak _placeholder_peak(self, double mz)
     cpdef PeakSet between(self, double m1, double m2)
     cpdef FittedPeak has_peak(self, double mz, double error_tolerance)
     cdef FittedPeak _has_peak(self, double mz, double error_tolerance)
@@ -42,18 +53,23 @@ cdef class AveragineDeconvoluterBase(DeconvoluterBase):
                                                          double ignore_below=*)
 
     cpdef set _fit_peaks_at_charges(self, set peak_charge_set, double error_tolerance, double charge_carrier=*, double truncate_after=*,
-                                    double ignore_below=*)
+                                    double ignore_below=*, bint best_only=*)
 
 
 cdef class MultiAveragineDeconvoluterBase(DeconvoluterBase):
     cdef:
         public list averagines
+        public bint use_shared_matching
 
     cpdef IsotopicFitRecord fit_theoretical_distribution(self, FittedPeak peak, double error_tolerance, int charge,
                                                          AveragineCache  averagine, double charge_carrier=*, double truncate_after=*,
                                                          double ignore_below=*)
+    cpdef list match_shared_isotopic_distributions(self, list theoretical_distributions, double error_tolerance=*)
+    cpdef list fit_shared_theoretical_distributions(self, FittedPeak peak, double error_tolerance, int charge,
+                                                    double charge_carrier=*, double truncate_after=*,
+                                                    double ignore_below=*, object best=*)
     cpdef set _fit_peaks_at_charges(self, set peak_charge_set, double error_tolerance, double charge_carrier=*, double truncate_after=*,
-                                    double ignore_below=*)
+                                    double ignore_below=*, bint best_only=*)
 
 
 cdef bint has_multiple_real_peaks(list peaklist)
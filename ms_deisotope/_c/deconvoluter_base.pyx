@@ -2,12 +2,14 @@
 
 cimport cython
 from libc.stdlib cimport malloc, free
+from libc.math cimport fabs
 
 from ms_peak_picker._c.peak_index cimport PeakIndex
 from ms_peak_picker._c.peak_set cimport PeakSet, FittedPeak
 from brainpy._c.isotopic_distribution cimport TheoreticalPeak
 
 from ms_deisotope.constants import ERROR_TOLERANCE as _ERROR_TOLERANCE
+from ms_deisotope.constants import MAX_PLACEHOLDER_CACHE
 from ms_deisotope._c.scoring cimport IsotopicFitterBase, IsotopicFitRecord
 from ms_deisotope._c.averagine cimport (AveragineCache, isotopic_shift, PROTON,
                                         TheoreticalIsotopicPattern)
@@ -21,6 +23,11 @@ from cpython.object cimport PyObject
 
 import operator
 
+try:
+    from ms_peak_picker._c.peak_set import PeakSetIndexed as _PeakSetIndexed
+except ImportError:
+    _PeakSetIndexed = None
+
 
 cdef double ERROR_TOLERANCE = _ERROR_TOLERANCE
 
@@ -57,6 +64,63 @@ cdef FittedPeak make_placeholder_peak(double mz):
     return peak
 
 
+@cython.cdivision(True)
+cdef ssize_t binary_search_ppm(double* array, double value, double tolerance, size_t n) nogil:
+    """Find the index of the value in a sorted array of m/z values closest to `value`
+    within `tolerance` PPM error, or -1 if there is no such value.
+
+    This follows the same search as :class:`ms_peak_picker.PeakSetIndexed`, but may be
+    called without the GIL.
+    """
+    cdef:
+        size_t lo, hi, mid, i, best_ix
+        double x, err, abs_err, best_err
+    if n == 0:
+        return -1
+    lo = 0
+    hi = n
+    mid = 0
+    while hi != lo:
+        mid = (hi + lo) // 2
+        x = array[mid]
+        err = (x - value) / value
+        abs_err = fabs(err)
+        if abs_err < tolerance:
+            best_err = abs_err
+            best_ix = mid
+            i = mid
+            while i > 0:
+                i -= 1
+                abs_err = fabs((array[i] - value) / value)
+                if abs_err > tolerance:
+                    break
+                elif abs_err < best_err:
+                    best_err = abs_err
+                    best_ix = i
+            i = mid
+            while i < n - 1:
+                i += 1
+                abs_err = fabs((array[i] - value) / value)
+                if abs_err > tolerance:
+                    break
+                elif abs_err < best_err:
+                    best_err = abs_err
+                    best_ix = i
+            return best_ix
+        elif (hi - 1) == lo:
+            break
+        elif err > 0:
+            hi = mid
+        else:
+            lo = mid
+    if fabs((array[mid] - value) / value) < tolerance:
+        return mid
+    return -1
+
+
+cdef size_t MATCH_BUFFER_SIZE = 16
+
+
 cdef class DeconvoluterBase(object):
 
     def __init__(self, use_subtraction=False, scale_method="sum", merge_isobaric_peaks=True,
@@ -66,6 +130,83 @@ cdef class DeconvoluterBase(object):
         self.merge_isobaric_peaks = merge_isobaric_peaks
         self.minimum_intensity = minimum_intensity
         self._slice_cache = {}
+        self._placeholder_cache = {}
+        self.scored_fits = 0
+        self.pruned_fits = 0
+
+    def __cinit__(self, *args, **kwargs):
+        self._mz_index = NULL
+        self._mz_index_size = 0
+        self._mz_index_source = None
+        self._mz_index_usable = False
+
+    def __dealloc__(self):
+        if self._mz_index != NULL:
+            free(self._mz_index)
+            self._mz_index = NULL
+
+    cdef int _update_mz_index(self) except -1:
+        """Copy the m/z values of :attr:`peaklist` into a C array if the peak list
+        has changed since the last call, so that isotopic pattern matching can search
+        it without holding the GIL.
+
+        Only peak lists searched by :class:`ms_peak_picker.PeakSetIndexed` are copied,
+        as other peak sets may break ties differently. Returns 1 if the index is usable,
+        0 otherwise.
+        """
+        cdef:
+            PeakSet peaks
+            size_t i, n
+            double* mz_index
+        peaks = self.peaklist.peaks
+        if peaks.peaks is self._mz_index_source:
+            return self._mz_index_usable
+        if self._mz_index != NULL:
+            free(self._mz_index)
+            self._mz_index = NULL
+        self._mz_index_size = 0
+        self._mz_index_source = peaks.peaks
+        self._mz_index_usable = _PeakSetIndexed is not None and isinstance(peaks, _PeakSetIndexed)
+        if not self._mz_index_usable:
+            return 0
+        n = peaks.get_size()
+        if n == 0:
+            return 1
+        mz_index = <double*>malloc(sizeof(double) * n)
+        if mz_index == NULL:
+            self._mz_index_source = None
+            self._mz_index_usable = False
+            raise MemoryError()
+        for i in range(n):
+            mz_index[i] = peaks.getitem(i).mz
+        self._mz_index = mz_index
+        self._mz_index_size = n
+        return 1
+
+    cdef bint _prune_fit(self, list experimental, bint has_best, double best):
+        cdef double bound
+        bound = self.scorer.score_bound(experimental)
+        if self.scorer.reject_score(bound) or (has_best and (
+                bound < best if self.scorer.is_maximizing() else bound > best)):
+            self.pruned_fits += 1
+            return True
+        self.scored_fits += 1
+        return False
+
+    cpdef FittedPeak _placeholder_peak(self, double mz):
+        cdef:
+            object key
+            PyObject* p
+            FittedPeak peak
+        key = mz
+        p = PyDict_GetItem(self._placeholder_cache, key)
+        if p == NULL:
+            if len(self._placeholder_cache) >= MAX_PLACEHOLDER_CACHE:
+                self._placeholder_cache.clear()
+            peak = make_placeholder_peak(mz)
+            PyDict_SetItem(self._placeholder_cache, key, peak)
+            return peak
+        return <FittedPeak>p
 
     cpdef PeakSet between(self, double m1, double m2):
         cdef:
@@ -88,22 +229,63 @@ cdef class DeconvoluterBase(object):
     cdef FittedPeak _has_peak(self, double mz, double error_tolerance):
         peak = self.peaklist._has_peak(mz, error_tolerance)
         if peak is None or peak.intensity < self.minimum_intensity:
-            return make_placeholder_peak(mz)
+            return self._placeholder_peak(mz)
         return peak
 
     cpdef list match_theoretical_isotopic_distribution(self, list theoretical_distribution, double error_tolerance=2e-5):
         cdef:
             list experimental_distribution
-            size_t i
+            size_t i, n
+            ssize_t j
             TheoreticalPeak theo_peak
+            FittedPeak peak
+            double mz_stack[16]
+            ssize_t match_stack[16]
+            double* mz_buffer
+            ssize_t* match_buffer
+            double* mz_index
+            size_t mz_index_size
 
         experimental_distribution = []
+        n = PyList_GET_SIZE(theoretical_distribution)
+        if not self._update_mz_index():
+            for i in range(n):
+                theo_peak = <TheoreticalPeak>PyList_GET_ITEM(theoretical_distribution, i)
+                experimental_distribution.append(self._has_peak(theo_peak.mz, error_tolerance))
+            return experimental_distribution
+
+        if n <= MATCH_BUFFER_SIZE:
+            mz_buffer = mz_stack
+            match_buffer = match_stack
+        else:
+            mz_buffer = <double*>malloc(sizeof(double) * n)
+            match_buffer = <ssize_t*>malloc(sizeof(ssize_t) * n)
+            if mz_buffer == NULL or match_buffer == NULL:
+                free(mz_buffer)
+                free(match_buffer)
+                raise MemoryError()
+        for i in range(n):
+            mz_buffer[i] = (<TheoreticalPeak>PyList_GET_ITEM(theoretical_distribution, i)).mz
 
-        for i in range(PyList_GET_SIZE(theoretical_distribution)):
-            theo_peak = <TheoreticalPeak>PyList_GET_ITEM(theoretical_distribution, i)
-            experimental_distribution.append(self._has_peak(theo_peak.mz, error_tolerance))
-
+        mz_index = self._mz_index
+        mz_index_size = self._mz_index_size
+        with nogil:
+            for i in range(n):
+                match_buffer[i] = binary_search_ppm(mz_index, mz_buffer[i], error_tolerance, mz_index_size)
 
+        for i in range(n):
+            j = match_buffer[i]
+            if j < 0:
+                experimental_distribution.append(self._placeholder_peak(mz_buffer[i]))
+                continue
+            peak = self.peaklist.peaks.getitem(j)
+            if peak.intensity < self.minimum_intensity:
+                experimental_distribution.append(self._placeholder_peak(mz_buffer[i]))
+            else:
+                experimental_distribution.append(peak)
+        if n > MATCH_BUFFER_SIZE:
+            free(mz_buffer)
+            free(match_buffer)
         return experimental_distribution
 
     cpdef scale_theoretical_distribution(self, TheoreticalIsotopicPattern theoretical_distribution,
@@ -190,7 +372,7 @@ cdef class DeconvoluterBase(object):
         for i in range(n):
             forward = peaklist_slice.getitem(i)
             prev_peak_mz = forward.mz - (shift * step)
-            dummy_peak = make_placeholder_peak(prev_peak_mz)
+            dummy_peak = self._placeholder_peak(prev_peak_mz)
             candidates.append((dummy_peak, charge))
         return candidates
 
@@ -262,16 +444,22 @@ cdef class AveragineDeconvoluterBase(DeconvoluterBase):
         return IsotopicFitRecord._create(peak, score, charge, tid, eid, None, 0)
 
     cpdef set _fit_peaks_at_charges(self, set peak_charge_set, double error_tolerance, double charge_carrier=PROTON,
-                                    double truncate_after=0.95, double ignore_below=0):
+                                    double truncate_after=0.95, double ignore_below=0, bint best_only=False):
         cdef:
-            list results
+            list results, eid
             tuple peak_charge
             IsotopicFitRecord fit
+            TheoreticalIsotopicPattern tid
             size_t i
+            bint has_best, maximizing
+            double best, score
 
             int charge
             list peak_charge_list
         results = []
+        has_best = False
+        best = 0
+        maximizing = self.scorer.is_maximizing()
         peak_charge_list = list(peak_charge_set)
         for i in range(PyList_GET_SIZE(peak_charge_list)):
             peak_charge = <tuple>PyList_GET_ITEM(peak_charge_list, i)
@@ -281,16 +469,24 @@ cdef class AveragineDeconvoluterBase(DeconvoluterBase):
             if peak.mz < 1:
                 continue
 
-            fit = self.fit_theoretical_distribution(
-                     peak, error_tolerance, charge,
-                     charge_carrier, truncate_after=truncate_after,
-                     ignore_below=ignore_below)
-            fit.missed_peaks = count_missed_peaks(fit.experimental)
-            if not has_multiple_real_peaks(fit.experimental) and fit.charge > 1:
+            tid = self.averagine.isotopic_cluster(
+                peak.mz, charge, charge_carrier=charge_carrier, truncate_after=truncate_after,
+                ignore_below=ignore_below)
+            eid = self.match_theoretical_isotopic_distribution(tid.get_processed_peaks(), error_tolerance=error_tolerance)
+            if not has_multiple_real_peaks(eid) and charge > 1:
+                continue
+            if self._prune_fit(eid, has_best, best):
                 continue
+            self.scale_theoretical_distribution(tid, eid)
+            score = self.scorer._evaluate(self.peaklist, eid, tid.get_processed_peaks())
+            fit = IsotopicFitRecord._create(peak, score, charge, tid, eid, None, 0)
+            fit.missed_peaks = count_missed_peaks(eid)
             if self.scorer.reject(fit):
                 continue
             results.append(fit)
+            if best_only and (not has_best or (score > best if maximizing else score < best)):
+                best = score
+                has_best = True
         return set(results)
 
 
@@ -317,32 +513,138 @@ cdef class MultiAveragineDeconvoluterBase(DeconvoluterBase):
         score = self.scorer._evaluate(self.peaklist, eid, tid.get_processed_peaks())
         return IsotopicFitRecord._create(peak, score, charge, tid, eid, None, 0)
 
+    cpdef list match_shared_isotopic_distributions(self, list theoretical_distributions, double error_tolerance=2e-5):
+        cdef:
+            list experimental_distributions, tid, eid
+            size_t i, j, k, n_patterns, width
+            double lo, hi, center, spread, mz
+            FittedPeak match
+            TheoreticalPeak theo_peak
+
+        n_patterns = PyList_GET_SIZE(theoretical_distributions)
+        experimental_distributions = []
+        width = 0
+        for j in range(n_patterns):
+            experimental_distributions.append([])
+            tid = <list>PyList_GET_ITEM(theoretical_distributions, j)
+            if PyList_GET_SIZE(tid) > width:
+                width = PyList_GET_SIZE(tid)
+
+        for k in range(width):
+            lo = -1
+            hi = -1
+            for j in range(n_patterns):
+                tid = <list>PyList_GET_ITEM(theoretical_distributions, j)
+                if k >= PyList_GET_SIZE(tid):
+                    continue
+                mz = (<TheoreticalPeak>PyList_GET_ITEM(tid, k)).mz
+                if lo < 0 or mz < lo:
+                    lo = mz
+                if mz > hi:
+                    hi = mz
+            center = (lo + hi) / 2.
+            spread = (hi - lo) / 2. / center
+            match = None
+            if spread <= error_tolerance:
+                match = self.peaklist._has_peak(center, error_tolerance + spread)
+                if match is not None and match.intensity < self.minimum_intensity:
+                    match = None
+            for j in range(n_patterns):
+                tid = <list>PyList_GET_ITEM(theoretical_distributions, j)
+                if k >= PyList_GET_SIZE(tid):
+                    continue
+                eid = <list>PyList_GET_ITEM(experimental_distributions, j)
+                mz = (<TheoreticalPeak>PyList_GET_ITEM(tid, k)).mz
+                if match is not None and abs(match.mz - mz) / mz <= error_tolerance:
+                    eid.append(match)
+                elif spread > error_tolerance:
+                    eid.append(self._has_peak(mz, error_tolerance))
+                else:
+                    eid.append(self._placeholder_peak(mz))
+        return experimental_distributions
+
+    cpdef list fit_shared_theoretical_distributions(self, FittedPeak peak, double error_tolerance, int charge,
+                                                    double charge_carrier=PROTON, double truncate_after=0.95,
+                                                    double ignore_below=0, object best=None):
+        cdef:
+            list tids, peak_lists, eids, eid, fits
+            size_t j, n_averagine
+            AveragineCache averagine
+            TheoreticalIsotopicPattern tid
+            IsotopicFitRecord fit
+            double score, best_score
+            bint has_best
+
+        has_best = best is not None
+        best_score = best if has_best else 0
+
+        n_averagine = PyList_GET_SIZE(self.averagine)
+        tids = []
+        peak_lists = []
+        for j in range(n_averagine):
+            averagine = <AveragineCache>PyList_GET_ITEM(self.averagine, j)
+            tid = averagine.isotopic_cluster(
+                peak.mz, charge, charge_carrier=charge_carrier,
+                truncate_after=truncate_after, ignore_below=ignore_below)
+            tids.append(tid)
+            peak_lists.append(tid.get_processed_peaks())
+        eids = self.match_shared_isotopic_distributions(peak_lists, error_tolerance)
+        fits = []
+        for j in range(n_averagine):
+            eid = <list>PyList_GET_ITEM(eids, j)
+            if not has_multiple_real_peaks(eid) and charge > 1:
+                continue
+            if self._prune_fit(eid, has_best, best_score):
+                continue
+            tid = <TheoreticalIsotopicPattern>PyList_GET_ITEM(tids, j)
+            self.scale_theoretical_distribution(tid, eid)
+            score = self.scorer._evaluate(self.peaklist, eid, <list>PyList_GET_ITEM(peak_lists, j))
+            fit = IsotopicFitRecord._create(peak, score, charge, tid, eid, None, 0)
+            fit.data = <AveragineCache>PyList_GET_ITEM(self.averagine, j)
+            fits.append(fit)
+        return fits
+
     cpdef set _fit_peaks_at_charges(self, set peak_charge_set, double error_tolerance, double charge_carrier=PROTON,
-                                    double truncate_after=0.95, double ignore_below=0):
+                                    double truncate_after=0.95, double ignore_below=0, bint best_only=False):
         cdef:
-            list results
+            list results, fits
             tuple peak_charge
             IsotopicFitRecord fit
             size_t i, j, n_averagine
             int charge
             list peak_charge_list
+            object best
+            bint maximizing
         results = []
+        best = None
+        maximizing = self.scorer.is_maximizing()
         n_averagine = len(self.averagine)
         for peak, charge in peak_charge_set:
             if peak.mz < 1:
                 continue
-            for j in range(n_averagine):
-                averagine = <AveragineCache>PyList_GET_ITEM(self.averagine, j)
-                fit = self.fit_theoretical_distribution(
-                    peak, error_tolerance, charge, averagine, charge_carrier,
-                    truncate_after=truncate_after, ignore_below=ignore_below)
+            if self.use_shared_matching:
+                fits = self.fit_shared_theoretical_distributions(
+                    peak, error_tolerance, charge, charge_carrier,
+                    truncate_after=truncate_after, ignore_below=ignore_below, best=best)
+            else:
+                fits = []
+                for j in range(n_averagine):
+                    averagine = <AveragineCache>PyList_GET_ITEM(self.averagine, j)
+                    fit = self.fit_theoretical_distribution(
+                        peak, error_tolerance, charge, averagine, charge_carrier,
+                        truncate_after=truncate_after, ignore_below=ignore_below)
+                    fit.data = averagine
+                    fits.append(fit)
+            for i in range(PyList_GET_SIZE(fits)):
+                fit = <IsotopicFitRecord>PyList_GET_ITEM(fits, i)
                 fit.missed_peaks = count_missed_peaks(fit.experimental)
-                fit.data = averagine
                 if not has_multiple_real_peaks(fit.experimental) and fit.charge > 1:
                     continue
                 if self.scorer.reject(fit):
                     continue
                 results.append(fit)
+                if best_only and (best is None or (fit.score > best if maximizing else fit.score < best)):
+                    best = fit.score
 
         return set(results)
 
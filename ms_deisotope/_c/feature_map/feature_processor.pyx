@@ -27,12 +27,15 @@ from ms_deisotope._c.feature_map.feature_map cimport LCMSFeatureMap
 from ms_deisotope._c.feature_map.feature_fit cimport LCMSFeatureSetFit
 from ms_deisotope._c.feature_map.lcms_feature cimport (
     LCMSFeature,
+    LCMSFeatureTreeNode,
     FeatureSetIterator,
     EmptyFeature)
 
 cimport numpy as np
 import numpy as np
 
+from heapq import heappop, heappush
+
 
 np.import_array()
 
@@ -223,6 +226,185 @@ cpdef tuple conform_envelopes(list experimental, list base_theoretical,
     return out
 
 
+# The most combinations of candidate features to evaluate for one theoretical isotopic pattern
+DEF MAX_COMBINATIONS = 1000
+
+
+cdef dict _signal_within(LCMSFeature feature, double start_time, double end_time):
+    cdef:
+        dict signal
+        size_t i, n
+        LCMSFeatureTreeNode node
+
+    signal = {}
+    n = feature.get_size()
+    for i in range(n):
+        node = feature.getitem(i)
+        if start_time <= node.time <= end_time:
+            signal[node.time] = node.total_intensity()
+    return signal
+
+
+cdef double _profile_similarity(dict signal, dict expected):
+    cdef:
+        double shared, total, observed, predicted
+        object time
+
+    shared = 0
+    total = 0
+    for time in set(signal) | set(expected):
+        observed = signal.get(time, 0.)
+        predicted = expected.get(time, 0.)
+        shared += min(observed, predicted)
+        total += max(observed, predicted)
+    if total == 0:
+        return 0
+    return shared / total
+
+
+cpdef list rank_feature_candidates(list feature_groups, list theoretical_distribution, LCMSFeature interval=None):
+    """Score the candidate features for each isotopic peak independently of one another.
+
+    When `interval`, the feature being fit, is itself a candidate, every other candidate is
+    scored by how closely its signal within the time span of `interval` matches the signal of
+    `interval` scaled by their ratio in `theoretical_distribution`, from 0 to 1. Otherwise
+    candidates are scored by their signal within that span, or in total if `interval` is
+    :const:`None`. Candidates which score 0 are dropped, as a fit is only scored where all of its
+    features were observed. Scores are then made relative to the best candidate for the same peak.
+
+    Parameters
+    ----------
+    feature_groups : list of list of LCMSFeature
+        The candidates for each isotopic peak, as from
+        :meth:`LCMSFeatureProcessorBase.match_theoretical_isotopic_distribution`
+    theoretical_distribution : list of TheoreticalPeak
+        The isotopic pattern the candidates were matched to
+    interval : LCMSFeature, optional
+        The feature being fit
+
+    Returns
+    -------
+    list of list of tuple
+        For each isotopic peak, the score, original index and feature of each candidate
+        from best to worst, or a single :const:`None` placeholder if none remain
+    """
+    cdef:
+        size_t position, n_groups, i, n
+        double start_time, end_time, seed_abundance, ratio, score, best
+        dict seed_signal, expected
+        list group, candidates, ranked_groups
+        LCMSFeature feature
+        TheoreticalPeak tpeak
+
+    seed_signal = None
+    start_time = end_time = seed_abundance = 0
+    n_groups = PyList_GET_SIZE(feature_groups)
+    if interval is not None:
+        start_time = interval.get_start_time()
+        end_time = interval.get_end_time()
+        for position in range(n_groups):
+            group = <list>PyList_GET_ITEM(feature_groups, position)
+            n = PyList_GET_SIZE(group)
+            for i in range(n):
+                if <object>PyList_GET_ITEM(group, i) is interval:
+                    seed_signal = _signal_within(interval, start_time, end_time)
+                    tpeak = <TheoreticalPeak>PyList_GET_ITEM(theoretical_distribution, position)
+                    seed_abundance = tpeak.intensity
+                    break
+            if seed_signal is not None:
+                break
+    ranked_groups = []
+    for position in range(n_groups):
+        group = <list>PyList_GET_ITEM(feature_groups, position)
+        expected = None
+        if seed_signal is not None:
+            tpeak = <TheoreticalPeak>PyList_GET_ITEM(theoretical_distribution, position)
+            ratio = tpeak.intensity / seed_abundance
+            expected = {time: value * ratio for time, value in seed_signal.items()}
+        candidates = []
+        n = PyList_GET_SIZE(group)
+        for i in range(n):
+            if <object>PyList_GET_ITEM(group, i) is None:
+                continue
+            feature = <LCMSFeature>PyList_GET_ITEM(group, i)
+            if interval is None:
+                score = feature.total_signal
+            elif expected is None:
+                score = sum(_signal_within(feature, start_time, end_time).values())
+            else:
+                score = _profile_similarity(_signal_within(feature, start_time, end_time), expected)
+            if score > 0:
+                candidates.append((score, i, feature))
+        if not candidates:
+            ranked_groups.append([(0., 0, None)])
+            continue
+        candidates.sort(key=_candidate_order)
+        best = candidates[0][0]
+        ranked_groups.append([(c[0] / best, c[1], c[2]) for c in candidates])
+    return ranked_groups
+
+
+def _candidate_order(candidate):
+    return (-candidate[0], candidate[1])
+
+
+cdef double _combination_priority(list ranked_groups, tuple indices):
+    cdef:
+        size_t i, n
+        double total
+
+    total = 0
+    n = len(indices)
+    for i in range(n):
+        total += ranked_groups[i][indices[i]][0]
+    return -total
+
+
+cpdef list best_first_combinations(list ranked_groups, size_t max_combinations=MAX_COMBINATIONS):
+    """Enumerate combinations of one candidate per isotopic peak in decreasing order
+    of the sum of their scores.
+
+    As each peak's candidates are ordered from best to worst, a combination's total
+    bounds that of every combination reached by replacing one of its candidates with
+    the next one for the same peak, so a combination is only queued once one of its
+    predecessors has been taken.
+
+    Parameters
+    ----------
+    ranked_groups : list of list of tuple
+        As from :func:`rank_feature_candidates`
+    max_combinations : int, optional
+        The most combinations to produce. If 0, all of them are produced.
+
+    Returns
+    -------
+    list of tuple of int
+        The position of the chosen candidate in each group, for each combination
+    """
+    cdef:
+        size_t i, n, ix
+        list heap, combinations
+        set seen
+        tuple start, indices, successor
+
+    n = PyList_GET_SIZE(ranked_groups)
+    start = (0,) * n
+    heap = [(_combination_priority(ranked_groups, start), start)]
+    seen = {start}
+    combinations = []
+    while heap and (max_combinations == 0 or <size_t>PyList_GET_SIZE(combinations) < max_combinations):
+        indices = <tuple>heappop(heap)[1]
+        combinations.append(indices)
+        for i in range(n):
+            ix = indices[i]
+            if ix + 1 < <size_t>PyList_GET_SIZE(<list>PyList_GET_ITEM(ranked_groups, i)):
+                successor = indices[:i] + (ix + 1,) + indices[i + 1:]
+                if successor not in seen:
+                    seen.add(successor)
+                    heappush(heap, (_combination_priority(ranked_groups, successor), successor))
+    return combinations
+
+
 cdef int has_no_valid_features(list features):
     cdef:
         size_t i, n, cnt
@@ -242,9 +424,15 @@ cdef class LCMSFeatureProcessorBase(object):
         public LCMSFeatureMap feature_map
         public IsotopicFitterBase scorer
         public AveragineCache averagine
+        public size_t max_combinations
+
+    def __cinit__(self, *args, **kwargs):
+        self.max_combinations = MAX_COMBINATIONS
 
-    cpdef list create_theoretical_distribution(self, double mz, int charge, double charge_carrier=PROTON, double truncate_after=0.8,
-                                               double ignore_below=0.05):
+    cpdef TheoreticalIsotopicPattern create_theoretical_distribution(self, double mz, int charge,
+                                                                     double charge_carrier=PROTON,
+                                                                     double truncate_after=0.8,
+                                                                     double ignore_below=0.05):
         cdef:
             TheoreticalIsotopicPattern base_tid
         base_tid = self.averagine.isotopic_cluster(
@@ -406,16 +594,16 @@ cdef class LCMSFeatureProcessorBase(object):
                                                         double threshold_scale=0.3, LCMSFeature feature=None):
         cdef:
             double score, final_score, score_acc, neutral_mass
-            list feature_groups, feature_fits, features
+            list feature_groups, feature_fits, features, ranked_groups, combinations
             list eid, cleaned_eid, tid
+            tuple indices
             np.ndarray scores_array, times_array
             tuple temp
-            size_t combn_size, combn_i, n_missing, missing_features, counter
+            size_t combn_n, combn_i, n_missing, missing_features, counter
             TheoreticalIsotopicPattern snapped_tid
             size_t feat_i, feat_n
             FeatureSetIterator feat_iter
             LCMSFeature f
-            CartesianProductIterator combn_iter
             envelope_conformer conformer
             dvec* score_vec
             dvec* time_vec
@@ -426,24 +614,20 @@ cdef class LCMSFeatureProcessorBase(object):
 
         conformer = envelope_conformer._create()
 
-        combn_iter = CartesianProductIterator(feature_groups)
-        combn_i = 0
-        while combn_iter.has_more():
-            features = combn_iter.get_next_value()
-            if features is None:
-                break
-            combn_i += 1
-            if combn_i % (100000) == 0:
-                print("\t%d combinations have been considered for m/z %0.3f at charge %d in %s (%0.2f%%)" % (
-                    combn_i, mz, charge, "-" if feature is None else (
-                        "%0.2f-%0.2f" % (feature.start_time, feature.end_time)),
-                    100. * combn_i / combn_iter.total_combinations))
+        ranked_groups = rank_feature_candidates(feature_groups, base_tid.truncated_tid, feature)
+        # Evaluate in the order the features were found, as enumerating every combination would
+        combinations = [([ranked_groups[i][j][1] for i, j in enumerate(indices)], indices)
+                        for indices in best_first_combinations(ranked_groups, self.max_combinations)]
+        combinations.sort()
+        combn_n = PyList_GET_SIZE(combinations)
+        for combn_i in range(combn_n):
+            indices = <tuple>(<tuple>PyList_GET_ITEM(combinations, combn_i))[1]
+            features = [ranked_groups[i][j][2] for i, j in enumerate(indices)]
             if has_no_valid_features(features):
                 continue
             # If the monoisotopic feature wasn't actually observed, create a dummy feature
             # since the monoisotopic feature cannot be None
             if features[0] is None:
-                features = list(features)
                 features[0] = EmptyFeature._create(mz)
                 snapped_tid = base_tid.clone().shift(mz, True)
             else:
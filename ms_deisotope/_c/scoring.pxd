@@ -5,6 +5,25 @@ from ms_peak_picker._c.peak_index cimport PeakIndex
 from ms_deisotope._c.deconvoluter_base cimport DeconvoluterBase
 from ms_deisotope._c.averagine cimport TheoreticalIsotopicPattern
 
+ctypedef struct fit_arrays_t:
+    size_t observed_size
+    size_t theoretical_size
+    double* observed_mz
+    double* observed_intensity
+    double* observed_signal_to_noise
+    double* theoretical_mz
+    double* theoretical_intensity
+
+
+cdef int fill_fit_arrays(fit_arrays_t* arrays, list observed, list expected) except -1
+cdef void free_fit_arrays(fit_arrays_t* arrays) nogil
+
+cdef double msdeconv_score_arrays(fit_arrays_t* arrays, double mass_error_tolerance,
+                                  double minimum_signal_to_noise) nogil
+cdef double g_test_score_arrays(fit_arrays_t* arrays) nogil
+cdef double least_squares_score_arrays(fit_arrays_t* arrays) nogil
+
+
 cdef class IsotopicFitRecord(object):
     cdef:
         public FittedPeak seed_peak
@@ -44,6 +63,7 @@ cdef class IsotopicFitterBase(object):
     cpdef bint reject(self, IsotopicFitRecord fit)
     cpdef bint reject_score(self, double score)
     cpdef bint is_maximizing(self)
+    cpdef double score_bound(self, list observed)
 
     cpdef IsotopicFitterBase _configure(self, DeconvoluterBase deconvoluter, dict kwargs)
 
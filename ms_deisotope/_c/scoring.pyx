@@ -1,7 +1,7 @@
 # cython: embedsignature=True
 
 cimport cython
-from libc.math cimport fabs, sqrt, log, ceil, floor
+from libc.math cimport fabs, sqrt, log, ceil, floor, INFINITY
 from libc.stdlib cimport malloc, free
 import operator
 
@@ -292,6 +292,11 @@ cdef class IsotopicFitterBase(object):
     cpdef bint is_maximizing(self):
         return self.select.is_maximizing()
 
+    cpdef double score_bound(self, list observed):
+        if self.is_maximizing():
+            return INFINITY
+        return -INFINITY
+
     cpdef IsotopicFitterBase _configure(self, DeconvoluterBase deconvoluter, dict kwargs):
         return self
 
@@ -302,6 +307,100 @@ cdef class IsotopicFitterBase(object):
         return "{self.__class__.__name__}({fields})".format(self=self, fields=self.__getstate__())
 
 
+cdef int fill_fit_arrays(fit_arrays_t* arrays, list observed, list expected) except -1:
+    """Copy the m/z, intensity and signal-to-noise of the peaks of an isotopic fit into
+    C arrays, so that it may be scored without holding the GIL. The arrays must be
+    released with :func:`free_fit_arrays`.
+    """
+    cdef:
+        size_t i, n_observed, n_expected
+        double* block
+        FittedPeak obs
+        TheoreticalPeak theo
+
+    n_observed = PyList_GET_SIZE(observed)
+    n_expected = PyList_GET_SIZE(expected)
+    block = <double*>malloc(sizeof(double) * (3 * n_observed + 2 * n_expected + 1))
+    if block == NULL:
+        raise MemoryError()
+    arrays.observed_size = n_observed
+    arrays.theoretical_size = n_expected
+    arrays.observed_mz = block
+    arrays.observed_intensity = block + n_observed
+    arrays.observed_signal_to_noise = block + 2 * n_observed
+    arrays.theoretical_mz = block + 3 * n_observed
+    arrays.theoretical_intensity = block + 3 * n_observed + n_expected
+    for i in range(n_observed):
+        obs = <FittedPeak>PyList_GET_ITEM(observed, i)
+        arrays.observed_mz[i] = obs.mz
+        arrays.observed_intensity[i] = obs.intensity
+        arrays.observed_signal_to_noise[i] = obs.signal_to_noise
+    for i in range(n_expected):
+        theo = <TheoreticalPeak>PyList_GET_ITEM(expected, i)
+        arrays.theoretical_mz[i] = theo.mz
+        arrays.theoretical_intensity[i] = theo.intensity
+    return 0
+
+
+cdef void free_fit_arrays(fit_arrays_t* arrays) nogil:
+    if arrays.observed_mz != NULL:
+        free(arrays.observed_mz)
+    arrays.observed_mz = NULL
+    arrays.observed_intensity = NULL
+    arrays.observed_signal_to_noise = NULL
+    arrays.theoretical_mz = NULL
+    arrays.theoretical_intensity = NULL
+    arrays.observed_size = 0
+    arrays.theoretical_size = 0
+
+
+@cython.cdivision
+cdef double g_test_score_arrays(fit_arrays_t* arrays) nogil:
+    cdef:
+        size_t i
+        double total_observed, total_expected, obs, theo, g_score
+
+    total_observed = 0
+    for i in range(arrays.observed_size):
+        total_observed += arrays.observed_intensity[i]
+    total_expected = 0
+    for i in range(arrays.theoretical_size):
+        total_expected += arrays.theoretical_intensity[i]
+
+    g_score = 0.
+    for i in range(arrays.observed_size):
+        obs = arrays.observed_intensity[i] / total_observed
+        theo = arrays.theoretical_intensity[i] / total_expected
+        g_score += obs * log(obs / theo)
+    return g_score * 2.
+
+
+@cython.cdivision
+cdef double least_squares_score_arrays(fit_arrays_t* arrays) nogil:
+    cdef:
+        size_t i
+        double exp_max, theo_max, normed_expr, normed_theo
+        double sum_of_squared_errors, sum_of_squared_theoreticals
+
+    exp_max = 0
+    for i in range(arrays.observed_size):
+        if arrays.observed_intensity[i] > exp_max:
+            exp_max = arrays.observed_intensity[i]
+    theo_max = 0
+    for i in range(arrays.theoretical_size):
+        if arrays.theoretical_intensity[i] > theo_max:
+            theo_max = arrays.theoretical_intensity[i]
+
+    sum_of_squared_errors = 0
+    sum_of_squared_theoreticals = 0
+    for i in range(arrays.observed_size):
+        normed_expr = arrays.observed_intensity[i] / exp_max
+        normed_theo = arrays.theoretical_intensity[i] / theo_max
+        sum_of_squared_errors += (normed_theo - normed_expr) ** 2
+        sum_of_squared_theoreticals += normed_theo ** 2
+    return sum_of_squared_errors / sum_of_squared_theoreticals
+
+
 cdef double sum_intensity_theoretical(list peaklist):
     cdef:
         double summed
@@ -349,37 +448,15 @@ cdef double* normalize_intensity_fitted(list peaklist, double* out, double total
 
 
 cdef class ScaledGTestFitter(IsotopicFitterBase):
-    @cython.cdivision
     cpdef double _evaluate(self, PeakIndex peaklist, list observed, list expected):
         cdef:
-            double total_observed
-            double total_expected
-            double* normalized_observed
-            double* normalized_expected
-            double g_score, obs, theo, log_ratio
-            size_t n
-        total_observed = sum_intensity_fitted(observed)
-        total_expected = sum_intensity_theoretical(expected)
-        n = PyList_GET_SIZE(observed)
-
-        normalized_observed = <double*>malloc(sizeof(double) * n)
-        normalize_intensity_fitted(observed, normalized_observed, total_observed)
-
-        normalized_expected = <double*>malloc(sizeof(double) * n)
-        normalize_intensity_theoretical(expected, normalized_expected, total_expected)
-
-        g_score = 0.
-        for i in range(n):
-            obs = normalized_observed[i]
-            theo = normalized_expected[i]
-
-            log_ratio = log(obs / theo)
-            g_score += obs * log_ratio
-
-        free(normalized_observed)
-        free(normalized_expected)
-
-        return g_score * 2.
+            fit_arrays_t arrays
+            double g_score
+        fill_fit_arrays(&arrays, observed, expected)
+        with nogil:
+            g_score = g_test_score_arrays(&arrays)
+            free_fit_arrays(&arrays)
+        return g_score
 
 
 cdef ScaledGTestFitter g_test_scaled
@@ -415,32 +492,17 @@ cdef double max_intensity_fitted(list peaklist):
 
 cdef class LeastSquaresFitter(IsotopicFitterBase):
     
-    @cython.cdivision
     cpdef double _evaluate(self, PeakIndex peaklist, list observed, list expected):
         cdef:
-            double exp_max, theo_max, sum_of_squared_errors, sum_of_squared_theoreticals
-            double normed_theo, normed_expr
-            size_t i
-            TheoreticalPeak t
-            FittedPeak e
-
-        exp_max = max_intensity_fitted(observed)
-        theo_max = max_intensity_theoretical(expected)
-
-        sum_of_squared_errors = 0
-        sum_of_squared_theoreticals = 0
+            fit_arrays_t arrays
+            double score
 
         assert len(observed) == len(expected)
-
-        # for e, t in zip(observed, expected):
-        for i in range(PyList_GET_SIZE(observed)):
-            e = <FittedPeak>PyList_GetItem(observed, i)
-            t = <TheoreticalPeak>PyList_GetItem(expected, i)
-            normed_expr = e.intensity / exp_max
-            normed_theo = t.intensity / theo_max
-            sum_of_squared_errors += (normed_theo - normed_expr) ** 2
-            sum_of_squared_theoreticals += normed_theo ** 2
-        return sum_of_squared_errors / sum_of_squared_theoreticals
+        fill_fit_arrays(&arrays, observed, expected)
+        with nogil:
+            score = least_squares_score_arrays(&arrays)
+            free_fit_arrays(&arrays)
+        return score
 
 
 cdef LeastSquaresFitter least_squares
@@ -449,29 +511,49 @@ least_squares = LeastSquaresFitter()
 
 
 @cython.cdivision
-cdef double score_peak(FittedPeak obs, TheoreticalPeak theo, double mass_error_tolerance=0.02, double minimum_signal_to_noise=1) nogil:
+cdef inline double msdeconv_score_peak(double obs_mz, double obs_intensity, double obs_signal_to_noise,
+                                       double theo_mz, double theo_intensity, double mass_error_tolerance,
+                                       double minimum_signal_to_noise) nogil:
     cdef:
-        double mass_error, abundance_diff
-    if obs.signal_to_noise < minimum_signal_to_noise:
+        double mass_error, mass_accuracy, abundance_diff
+    if obs_signal_to_noise < minimum_signal_to_noise:
         return 0.
 
-    mass_error = fabs(obs.mz - theo.mz)
+    mass_error = fabs(obs_mz - theo_mz)
 
     if mass_error <= mass_error_tolerance:
         mass_accuracy = 1 - mass_error / mass_error_tolerance
     else:
         mass_accuracy = 0
 
-    if obs.intensity < theo.intensity and (((theo.intensity - obs.intensity) / obs.intensity) <= 1):
-        abundance_diff = 1 - ((theo.intensity - obs.intensity) / obs.intensity)
-    elif obs.intensity >= theo.intensity and (((obs.intensity - theo.intensity) / obs.intensity) <= 1):
-        abundance_diff = sqrt(1 - ((obs.intensity - theo.intensity) / obs.intensity))
+    if obs_intensity < theo_intensity and (((theo_intensity - obs_intensity) / obs_intensity) <= 1):
+        abundance_diff = 1 - ((theo_intensity - obs_intensity) / obs_intensity)
+    elif obs_intensity >= theo_intensity and (((obs_intensity - theo_intensity) / obs_intensity) <= 1):
+        abundance_diff = sqrt(1 - ((obs_intensity - theo_intensity) / obs_intensity))
     else:
         abundance_diff = 0.
-    score = sqrt(theo.intensity) * mass_accuracy * abundance_diff
+    return sqrt(theo_intensity) * mass_accuracy * abundance_diff
+
+
+cdef double msdeconv_score_arrays(fit_arrays_t* arrays, double mass_error_tolerance,
+                                  double minimum_signal_to_noise) nogil:
+    cdef:
+        size_t i
+        double score
+    score = 0
+    for i in range(arrays.observed_size):
+        score += msdeconv_score_peak(
+            arrays.observed_mz[i], arrays.observed_intensity[i], arrays.observed_signal_to_noise[i],
+            arrays.theoretical_mz[i], arrays.theoretical_intensity[i], mass_error_tolerance,
+            minimum_signal_to_noise)
     return score
 
 
+cdef double score_peak(FittedPeak obs, TheoreticalPeak theo, double mass_error_tolerance=0.02, double minimum_signal_to_noise=1) nogil:
+    return msdeconv_score_peak(obs.mz, obs.intensity, obs.signal_to_noise, theo.mz, theo.intensity,
+                               mass_error_tolerance, minimum_signal_to_noise)
+
+
 cdef class MSDeconVFitter(IsotopicFitterBase):
 
     def __init__(self, minimum_score=10):
@@ -486,20 +568,30 @@ cdef class MSDeconVFitter(IsotopicFitterBase):
         return self._evaluate(peaklist, observed, expected, mass_error_tolerance)
 
     cpdef double _evaluate(self, PeakIndex peaklist, list observed, list expected, double mass_error_tolerance=0.02):
+        cdef:
+            fit_arrays_t arrays
+            double score
+
+        fill_fit_arrays(&arrays, observed, expected)
+        with nogil:
+            score = msdeconv_score_arrays(&arrays, mass_error_tolerance, 1)
+            free_fit_arrays(&arrays)
+        return score
+
+    cpdef double score_bound(self, list observed):
         cdef:
             size_t i, n
             FittedPeak obs
-            TheoreticalPeak theo
-            double score
+            double bound
 
         n = PyList_GET_SIZE(observed)
-        score = 0
+        bound = 0
         for i in range(n):
             obs = <FittedPeak>PyList_GET_ITEM(observed, i)
-            theo = <TheoreticalPeak>PyList_GET_ITEM(expected, i)
-            score += self.score_peak(obs, theo, mass_error_tolerance, 1)
-
-        return score
+            if obs.signal_to_noise < 1:
+                continue
+            bound += sqrt(obs.intensity)
+        return bound
 
 
 cdef class PenalizedMSDeconVFitter(IsotopicFitterBase):
@@ -523,11 +615,25 @@ cdef class PenalizedMSDeconVFitter(IsotopicFitterBase):
 
     cpdef double _evaluate(self, PeakIndex peaklist, list observed, list expected, double mass_error_tolerance=0.02):
         cdef:
+            fit_arrays_t arrays
             double score, penalty
-        score = self.msdeconv._evaluate(peaklist, observed, expected, mass_error_tolerance)
-        penalty = abs(self.penalizer._evaluate(peaklist, observed, expected))
+        if type(self.msdeconv) is MSDeconVFitter and type(self.penalizer) is ScaledGTestFitter:
+            # Copy the fit once and compute both terms without the GIL
+            fill_fit_arrays(&arrays, observed, expected)
+            with nogil:
+                score = msdeconv_score_arrays(&arrays, mass_error_tolerance, 1)
+                penalty = fabs(g_test_score_arrays(&arrays))
+                free_fit_arrays(&arrays)
+        else:
+            score = self.msdeconv._evaluate(peaklist, observed, expected, mass_error_tolerance)
+            penalty = abs(self.penalizer._evaluate(peaklist, observed, expected))
         return score * ((1 - penalty * self.penalty_factor))
 
+    cpdef double score_bound(self, list observed):
+        if self.penalty_factor < 0:
+            return INFINITY
+        return self.msdeconv.score_bound(observed)
+
 
 cdef class FunctionScorer(IsotopicFitterBase):
 
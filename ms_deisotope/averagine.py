@@ -1,6 +1,15 @@
+import warnings
 from collections import defaultdict
+
+import numpy as np
+
 from brainpy import calculate_mass, neutral_mass, PROTON, isotopic_variants, mass_charge_ratio
 
+try:
+    from brainpy._c.isotopic_distribution import TheoreticalPeak
+except ImportError:  # pragma: no cover
+    from brainpy import Peak as TheoreticalPeak
+
 from .utils import dict_proxy
 
 
@@ -228,6 +237,8 @@ class AveragineCache(object):
         self.backend = backend
         self.averagine = Averagine(averagine)
         self.cache_truncation = cache_truncation
+        self.hits = 0
+        self.misses = 0
 
     def has_mz_charge_pair(self, mz, charge=1, charge_carrier=PROTON, truncate_after=0.95, ignore_below=0.0):
         if self.cache_truncation == 0.0:
@@ -235,10 +246,12 @@ class AveragineCache(object):
         else:
             key_mz = round(mz / self.cache_truncation) * self.cache_truncation
         if (key_mz, charge, charge_carrier) in self.backend:
+            self.hits += 1
             # return shift_isotopic_pattern(
             #     mz, [p.clone() for p in self.backend[key_mz, charge, charge_carrier]])
             return self.backend[key_mz, charge, charge_carrier].clone().shift(mz)
         else:
+            self.misses += 1
             tid = self.averagine.isotopic_cluster(
                 mz, charge, charge_carrier, truncate_after, ignore_below)
             self.backend[key_mz, charge, charge_carrier] = tid.clone()
@@ -246,6 +259,13 @@ class AveragineCache(object):
 
     isotopic_cluster = has_mz_charge_pair
 
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / float(total)
+
     def __repr__(self):
         return "AveragineCache(%r)" % self.averagine
 
@@ -259,3 +279,190 @@ try:
     from ms_deisotope._c.averagine import AveragineCache, isotopic_shift
 except ImportError:
     pass
+
+
+class InterpolatedAveragineCache(AveragineCache):
+    """An :class:`AveragineCache` which generates theoretical isotopic patterns by
+    interpolating precomputed tables instead of calculating the isotopic distribution
+    of a scaled averagine composition on every cache miss.
+
+    On construction, the isotopic pattern of :attr:`averagine` is computed at every
+    `step` Daltons between `min_mass` and `max_mass`, recording each isotopic peak's
+    relative abundance and mass offset from the monoisotopic peak. A pattern at any
+    neutral mass in that range is then produced by linear interpolation between the
+    two nearest rows. Masses outside the range fall back to :attr:`averagine`.
+
+    Because :meth:`Averagine.scale` rounds element counts to integers, the exact
+    patterns jump slightly where an element count changes. The interpolated patterns
+    smooth over these jumps, so :meth:`validate` compares them to the exact patterns
+    at the midpoints between rows, and the largest absolute difference in relative
+    abundance is stored in :attr:`max_error`. If it exceeds `tolerance`, a warning
+    is issued.
+
+    Attributes
+    ----------
+    min_mass : float
+        The smallest neutral mass covered by the tables
+    max_mass : float
+        The largest neutral mass covered by the tables
+    step : float
+        The mass spacing between table rows
+    tolerance : float
+        The largest acceptable absolute error in relative abundance
+    max_error : float
+        The largest absolute error in relative abundance observed by :meth:`validate`
+    """
+    def __init__(self, averagine, backend=None, cache_truncation=1.0, min_mass=100., max_mass=100000.,
+                 step=25., tolerance=0.01):
+        super(InterpolatedAveragineCache, self).__init__(averagine, backend, cache_truncation)
+        self.min_mass = min_mass
+        self.max_mass = max_mass
+        self.step = step
+        self.tolerance = tolerance
+        self._build_tables()
+        self.max_error = self.validate()
+        if self.max_error > tolerance:
+            warnings.warn(
+                "Interpolated isotopic patterns for %r differ from exact patterns by up to %f" % (
+                    self.averagine, self.max_error))
+
+    def __reduce__(self):
+        return _rebuild_interpolated_averagine_cache, (self.__class__, self.__getstate__())
+
+    def __getstate__(self):
+        return {
+            "averagine": dict(self.averagine.base_composition),
+            "backend": dict(self.backend),
+            "cache_truncation": self.cache_truncation,
+            "min_mass": self.min_mass,
+            "max_mass": self.max_mass,
+            "step": self.step,
+            "tolerance": self.tolerance,
+            "max_error": self.max_error,
+            "masses": self.masses,
+            "intensities": self.intensities,
+            "offsets": self.offsets,
+        }
+
+    def _exact_pattern(self, mass):
+        composition = self.averagine.scale(mass_charge_ratio(mass, 1), 1)
+        return isotopic_variants(composition, charge=0)
+
+    def _build_tables(self):
+        masses = np.arange(self.min_mass, self.max_mass + self.step, self.step)
+        patterns = [self._exact_pattern(mass) for mass in masses]
+        width = max(len(pattern) for pattern in patterns)
+        intensities = np.zeros((len(masses), width))
+        offsets = np.tile(np.arange(width) * _neutron_shift, (len(masses), 1))
+        for i, pattern in enumerate(patterns):
+            n = len(pattern)
+            intensities[i, :n] = [p.intensity for p in pattern]
+            offsets[i, :n] = [p.mz - pattern[0].mz for p in pattern]
+            # Continue the offsets past the end of the pattern so that rows of different
+            # lengths can be interpolated between
+            offsets[i, n:] = offsets[i, n - 1] + np.arange(1, width - n + 1) * _neutron_shift
+        self.masses = masses
+        self.intensities = intensities
+        self.offsets = offsets
+
+    def interpolate(self, neutral_masses):
+        """Evaluate the interpolated isotopic pattern at each of `neutral_masses`.
+
+        Parameters
+        ----------
+        neutral_masses : np.ndarray
+            The neutral masses to evaluate, which must lie between :attr:`min_mass`
+            and :attr:`max_mass`
+
+        Returns
+        -------
+        intensities : np.ndarray
+            The relative abundance of each isotopic peak for each mass, with each row summing to 1
+        offsets : np.ndarray
+            The mass offset from the monoisotopic peak of each isotopic peak for each mass
+        """
+        position = (np.asarray(neutral_masses, dtype=float) - self.min_mass) / self.step
+        lower = np.clip(np.floor(position).astype(int), 0, len(self.masses) - 2)
+        weight = (position - lower)[:, None]
+        intensities = self.intensities[lower] * (1 - weight) + self.intensities[lower + 1] * weight
+        offsets = self.offsets[lower] * (1 - weight) + self.offsets[lower + 1] * weight
+        intensities /= intensities.sum(axis=1)[:, None]
+        return intensities, offsets
+
+    def validate(self, neutral_masses=None, n_samples=200):
+        """Compare interpolated isotopic patterns to the exact patterns produced by
+        :attr:`averagine`.
+
+        Parameters
+        ----------
+        neutral_masses : np.ndarray, optional
+            The masses to compare at. If not provided, `n_samples` midpoints between
+            table rows, evenly spread across the table, are used
+        n_samples : int, optional
+            The number of midpoints to compare at if `neutral_masses` is not provided
+
+        Returns
+        -------
+        float
+            The largest absolute difference in relative abundance of any isotopic peak
+        """
+        if neutral_masses is None:
+            midpoints = self.masses[:-1] + self.step / 2.
+            indices = np.unique(np.linspace(0, len(midpoints) - 1, n_samples).astype(int))
+            neutral_masses = midpoints[indices]
+        intensities, _ = self.interpolate(neutral_masses)
+        error = 0.
+        for mass, row in zip(neutral_masses, intensities):
+            exact = np.zeros_like(row)
+            pattern = self._exact_pattern(mass)[:len(row)]
+            exact[:len(pattern)] = [p.intensity for p in pattern]
+            error = max(error, np.abs(exact - row).max())
+        return error
+
+    def _interpolated_cluster(self, mz, charge=1, charge_carrier=PROTON, truncate_after=0.95, ignore_below=0.0):
+        mass = neutral_mass(mz, charge, charge_carrier)
+        if mass < self.min_mass or mass > self.max_mass:
+            return self.averagine.isotopic_cluster(mz, charge, charge_carrier, truncate_after, ignore_below)
+        intensities, offsets = self.interpolate([mass])
+        intensities = intensities[0]
+        offsets = offsets[0] / abs(charge)
+        n = len(intensities)
+        while n > 1 and intensities[n - 1] <= 0:
+            n -= 1
+        tid = TheoreticalIsotopicPattern([
+            TheoreticalPeak(mz + offset, intensity, charge)
+            for offset, intensity in zip(offsets[:n].tolist(), intensities[:n].tolist())])
+        if truncate_after < 1.0:
+            tid.truncate_after(truncate_after)
+        if ignore_below > 0:
+            tid.ignore_below(ignore_below)
+        return tid
+
+    def isotopic_cluster(self, mz, charge=1, charge_carrier=PROTON, truncate_after=0.95, ignore_below=0.0):
+        if self.cache_truncation == 0.0:
+            key_mz = mz
+        else:
+            key_mz = round(mz / self.cache_truncation) * self.cache_truncation
+        key = (key_mz, charge, charge_carrier, truncate_after)
+        try:
+            tid = self.backend[key].clone().shift(mz)
+            self.hits += 1
+            return tid
+        except KeyError:
+            self.misses += 1
+            tid = self._interpolated_cluster(mz, charge, charge_carrier, truncate_after, ignore_below)
+            self.backend[key] = tid.clone()
+            return tid
+
+    has_mz_charge_pair = isotopic_cluster
+
+    def __repr__(self):
+        return "InterpolatedAveragineCache(%r, %0.1f-%0.1f)" % (self.averagine, self.min_mass, self.max_mass)
+
+
+def _rebuild_interpolated_averagine_cache(cls, state):
+    inst = cls.__new__(cls)
+    AveragineCache.__init__(inst, state['averagine'], state['backend'], state['cache_truncation'])
+    for key in ("min_mass", "max_mass", "step", "tolerance", "max_error", "masses", "intensities", "offsets"):
+        setattr(inst, key, state[key])
+    return inst
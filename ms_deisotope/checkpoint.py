@@ -0,0 +1,283 @@
+"""Record the progress of a long deconvolution run writing processed mzML, so that
+it may be resumed after a failure instead of being started over.
+
+A :class:`Checkpointer` is updated after each :class:`~.ScanBunch` is saved by a
+:class:`~.MzMLScanSerializer`. At most every :attr:`~Checkpointer.interval` seconds,
+it flushes the serializer and writes a :class:`Checkpoint` next to the output file
+recording the last bunch fully written and the size of the output at that point.
+
+:func:`resume_mzml` reads the spectra written before the checkpoint back out of the
+unfinished output, discarding anything after them, and saves them again with a new
+serializer, whose :class:`~.ExtendedScanIndex` and chromatograms are rebuilt along
+the way. :func:`next_bunch_id` then gives the scan to continue from with
+:meth:`~.ScanProcessor.start_from_scan`.
+"""
+import json
+import logging
+import os
+import time
+
+from .data_source.infer_type import MSFileLoader
+from .utils import Base
+
+logger = logging.getLogger("ms_deisotope.checkpoint")
+
+
+class Checkpoint(Base):
+    """The progress of a run at the end of the last bunch written to its output.
+
+    Attributes
+    ----------
+    input_path : str
+        The path of the file being deconvoluted
+    output_path : str
+        The path of the mzML file being written
+    scan_id : str
+        The id of the MS^1 scan of the last bunch written
+    index : int
+        The index of that scan in the input
+    scan_time : float
+        The time that scan was acquired
+    bunches : int
+        The number of bunches written so far
+    offset : int
+        The number of bytes of the output written up to the end of that bunch
+    timestamp : float
+        When the checkpoint was made, as given by :func:`time.time`
+    """
+
+    def __init__(self, input_path, output_path, scan_id, index, scan_time, bunches, offset, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        self.input_path = input_path
+        self.output_path = output_path
+        self.scan_id = scan_id
+        self.index = index
+        self.scan_time = scan_time
+        self.bunches = bunches
+        self.offset = offset
+        self.timestamp = timestamp
+
+    @staticmethod
+    def path_for(output_path):
+        return output_path + ".checkpoint"
+
+    def to_dict(self):
+        return {
+            "input_path": self.input_path,
+            "output_path": self.output_path,
+            "scan_id": self.scan_id,
+            "index": self.index,
+            "scan_time": self.scan_time,
+            "bunches": self.bunches,
+            "offset": self.offset,
+            "timestamp": self.timestamp,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def save(self, path=None):
+        """Write the checkpoint to `path`, replacing the previous one only once
+        it has been written completely.
+
+        Returns
+        -------
+        str
+            The path written to
+        """
+        if path is None:
+            path = self.path_for(self.output_path)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w') as handle:
+            json.dump(self.to_dict(), handle, indent=2, sort_keys=True)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as handle:
+            return cls.from_dict(json.load(handle))
+
+    def __repr__(self):
+        return "Checkpoint(%r, scan_id=%r, bunches=%d, offset=%d)" % (
+            self.output_path, self.scan_id, self.bunches, self.offset)
+
+
+class Checkpointer(object):
+    """Periodically writes a :class:`Checkpoint` for a run.
+
+    Attributes
+    ----------
+    serializer : MzMLScanSerializer
+        The serializer writing the output
+    input_path : str
+        The path of the file being deconvoluted
+    output_path : str
+        The path of the mzML file being written
+    interval : float
+        The least number of seconds between checkpoints
+    bunches : int
+        The number of bunches saved so far
+    last_checkpoint : Checkpoint
+        The most recent checkpoint written
+    """
+
+    def __init__(self, serializer, input_path, output_path, interval=300.0, bunches=0):
+        self.serializer = serializer
+        self.input_path = input_path
+        self.output_path = output_path
+        self.interval = interval
+        self.bunches = bunches
+        self.last_checkpoint = None
+        self.last_time = time.time()
+        self._last_scan = None
+
+    @property
+    def path(self):
+        return Checkpoint.path_for(self.output_path)
+
+    def update(self, bunch):
+        """Note that `bunch` has been saved by :attr:`serializer`, writing a checkpoint
+        if :attr:`interval` seconds have passed since the last one.
+
+        Returns
+        -------
+        Checkpoint or None
+        """
+        self.bunches += 1
+        precursor = bunch.precursor
+        self._last_scan = (precursor.id, precursor.index, precursor.scan_time)
+        if time.time() - self.last_time >= self.interval:
+            return self.checkpoint()
+        return None
+
+    def checkpoint(self):
+        """Write a checkpoint for the last bunch saved
+
+        Returns
+        -------
+        Checkpoint or None
+            :const:`None` if no spectrum has been written yet
+        """
+        if self._last_scan is None or self.serializer.spectra_written == 0:
+            return None
+        offset = self.serializer.flush()
+        os.fsync(self.serializer.handle.fileno())
+        scan_id, index, scan_time = self._last_scan
+        checkpoint = Checkpoint(
+            self.input_path, self.output_path, scan_id, index, scan_time, self.bunches, offset)
+        checkpoint.save(self.path)
+        self.last_checkpoint = checkpoint
+        self.last_time = time.time()
+        logger.info("Checkpoint after %d bunches at %s", self.bunches, scan_id)
+        return checkpoint
+
+    def restore(self, checkpoint):
+        """Continue counting from `checkpoint`, as when resuming a run
+        """
+        self.bunches = checkpoint.bunches
+        self._last_scan = (checkpoint.scan_id, checkpoint.index, checkpoint.scan_time)
+
+    def complete(self):
+        """Remove the checkpoint once the output has been completed
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _remove_recovered(reader):
+    reader.close()
+    for path in (reader.source_file, reader._index_file_name):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def resume_mzml(checkpoint, sample_name=None, n_spectra=2e4):
+    """Start writing :attr:`Checkpoint.output_path` again, beginning with the spectra
+    written before `checkpoint` was made.
+
+    The unfinished output is first renamed with ``.partial`` appended, and is only removed
+    once the spectra recovered from it have been saved and a new checkpoint made, so that a
+    failure while resuming may itself be resumed.
+
+    Parameters
+    ----------
+    checkpoint : Checkpoint
+        The last checkpoint of the interrupted run
+    sample_name : str, optional
+        The sample name to record. Defaults to the one in the unfinished output
+    n_spectra : int, optional
+        The number of spectra the finished output will contain
+
+    Returns
+    -------
+    serializer : MzMLScanSerializer
+        The serializer to continue writing with
+    handle : file
+        The file `serializer` writes to, which must be closed after it is completed
+    checkpointer : Checkpointer
+        Records the progress of the resumed run, already holding the recovered bunches
+    """
+    from .output.mzml import MzMLScanSerializer, read_partial_processed_mzml
+    output_path = checkpoint.output_path
+    partial_path = output_path + ".partial"
+    reader = None
+    if os.path.exists(partial_path):
+        try:
+            reader = read_partial_processed_mzml(partial_path, checkpoint.offset)
+        except ValueError:
+            # Left behind by a resumed run which failed after making its first checkpoint
+            os.remove(partial_path)
+    if reader is None:
+        os.rename(output_path, partial_path)
+        reader = read_partial_processed_mzml(partial_path, checkpoint.offset)
+    try:
+        if sample_name is None:
+            sample_name = reader.sample_run.name
+        handle = open(output_path, 'wb')
+        serializer = MzMLScanSerializer(handle, n_spectra=n_spectra, sample_name=sample_name)
+        checkpointer = Checkpointer(serializer, checkpoint.input_path, output_path)
+        last = None
+        for bunch in reader:
+            serializer.save_scan_bunch(bunch)
+            last = bunch.precursor
+        if last is not None and last.id != checkpoint.scan_id:
+            # The checkpointed bunch itself may have been left out for having no peaks
+            logger.info("The last bunch recovered from %s is %s, not %s", partial_path, last.id, checkpoint.scan_id)
+    finally:
+        _remove_recovered(reader)
+    checkpointer.restore(checkpoint)
+    if checkpointer.checkpoint() is None:
+        # Nothing was recovered, so the old checkpoint would refer to a file which is gone
+        checkpointer.complete()
+    os.remove(partial_path)
+    logger.info("Resumed %s with %d bunches written, from %s", output_path, checkpoint.bunches, checkpoint.scan_id)
+    return serializer, handle, checkpointer
+
+
+def next_bunch_id(path, scan_id):
+    """Find the id of the MS^1 scan of the bunch following the one which
+    begins with `scan_id` in `path`.
+
+    Returns
+    -------
+    str or None
+        :const:`None` if that was the last bunch
+    """
+    reader = MSFileLoader(path)
+    try:
+        reader.start_from_scan(scan_id)
+        found = False
+        for bunch in reader:
+            if found:
+                return bunch.precursor.id
+            found = bunch.precursor.id == scan_id
+        if not found:
+            raise KeyError(scan_id)
+        return None
+    finally:
+        reader.close()
@@ -0,0 +1,571 @@
+"""The ``ms-deisotope`` command line interface.
+
+Usage::
+
+    ms-deisotope deconvolute INPUT OUTPUT [options]
+    ms-deisotope shards INPUT COUNT
+    ms-deisotope merge OUTPUT SHARD [SHARD ...]
+    ms-deisotope serve [options]
+
+Deconvolutes every MS^1 scan and its MS^n scans from any file :class:`~.MSFileLoader`
+can read, writing the processed scans to mzML, along with its :class:`~.ExtendedScanIndex`,
+or to a SQLite database if `OUTPUT` ends in ``.db`` or ``.sqlite``. With ``--processes``,
+scan bunches are deconvoluted in parallel worker processes, but are still written in
+the order they were acquired.
+
+With ``--checkpoint-interval``, the progress of an mzML output is recorded next to it
+every so many seconds, and after a failure the same command with ``--resume`` keeps the
+spectra written before the last checkpoint and continues from the following bunch.
+
+To spread a run across several machines, ``deconvolute --shard INDEX COUNT`` processes
+only the `INDEX`-th of `COUNT` disjoint scan ranges, whose bounds fall on MS^1 scans
+(``shards`` prints them), and ``merge`` combines the processed mzML files of all of the
+shards into one without deconvoluting them again.
+
+``serve`` keeps a deconvolution service running for interactive tools, which POST
+peak lists or scan ids to it over HTTP. See :mod:`ms_deisotope.server`.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+from . import averagine as _averagine
+from .data_source.infer_type import MSFileLoader
+from .checkpoint import Checkpoint, Checkpointer, next_bunch_id, resume_mzml
+from .processor import ScanProcessor, ProcessingStatistics, JSONLinesStatisticsWriter
+from .replay import SlowScanCapture
+from .scoring import MSDeconVFitter, PenalizedMSDeconVFitter
+from .transfer import ScanBunchTransfer, has_shared_memory
+
+logger = logging.getLogger("ms_deisotope.cli")
+
+
+AVERAGINES = {
+    "peptide": _averagine.peptide,
+    "glycopeptide": _averagine.glycopeptide,
+    "glycan": _averagine.glycan,
+    "permethylated-glycan": _averagine.permethylated_glycan,
+    "heparin": _averagine.heparin,
+}
+
+
+def make_scorer(name, minimum_score):
+    """Build the isotopic fit scorer called `name`, which will reject fits
+    scoring below `minimum_score`.
+    """
+    if name == "penalized-msdeconv":
+        return PenalizedMSDeconVFitter(minimum_score, 2.0)
+    elif name == "msdeconv":
+        return MSDeconVFitter(minimum_score)
+    raise ValueError("Unknown scorer %r" % (name,))
+
+
+SCORERS = ["penalized-msdeconv", "msdeconv"]
+
+
+def processor_arguments(args):
+    """Translate parsed command line arguments into keyword arguments
+    for :class:`~.ScanProcessor`
+
+    Returns
+    -------
+    dict
+    """
+    slow_scan_hook = None
+    if args.capture_slow_scans is not None:
+        slow_scan_hook = SlowScanCapture(args.capture_slow_scans, args.slow_scan_threshold)
+    return {
+        "slow_scan_hook": slow_scan_hook,
+        "ms1_deconvolution_args": {
+            "averagine": AVERAGINES[args.ms1_averagine],
+            "scorer": make_scorer(args.ms1_scorer, args.ms1_score_threshold),
+            "charge_range": tuple(args.charge_range),
+        },
+        "msn_deconvolution_args": {
+            "averagine": AVERAGINES[args.msn_averagine],
+            "scorer": make_scorer(args.msn_scorer, args.msn_score_threshold),
+            "charge_range": tuple(args.msn_charge_range),
+        },
+        "trust_charge_hint": not args.ignore_charge_hint,
+        "targeted_ms1_only": args.targeted_ms1_only,
+        "use_precursor_cache": args.use_precursor_cache,
+        "terminate_on_error": False,
+    }
+
+
+class ScanRange(object):
+    """A retention time and scan id interval to process.
+
+    Attributes
+    ----------
+    start_time : float
+        The earliest time to start from, or :const:`None` to start from the beginning
+    end_time : float
+        The latest MS^1 scan time to process, or :const:`None` to continue to the end
+    start_scan : str
+        The scan id to start from, taking precedence over `start_time`
+    end_scan : str
+        The id of the last scan to process
+    stop_scan : str
+        The id of the MS^1 scan to stop before, as the next shard starts from it
+    """
+
+    def __init__(self, start_time=None, end_time=None, start_scan=None, end_scan=None, stop_scan=None):
+        self.start_time = start_time
+        self.end_time = end_time
+        self.start_scan = start_scan
+        self.end_scan = end_scan
+        self.stop_scan = stop_scan
+
+    def seek(self, target):
+        """Move `target`, a :class:`~.ScanProcessor` or :class:`~.RandomAccessScanSource`,
+        to the MS^1 scan at or before the start of the range.
+        """
+        if self.start_scan is not None:
+            target.start_from_scan(self.start_scan)
+        elif self.start_time is not None:
+            target.start_from_scan(rt=self.start_time)
+        return target
+
+    def past_end(self, precursor):
+        if self.stop_scan is not None and precursor.id == self.stop_scan:
+            return True
+        return self.end_time is not None and precursor.scan_time > self.end_time
+
+    def contains_end(self, bunch):
+        if self.end_scan is None:
+            return False
+        if bunch.precursor.id == self.end_scan:
+            return True
+        return any(product.id == self.end_scan for product in bunch.products)
+
+    def bunches(self, iterator):
+        """Yield bunches from `iterator` until the end of the range
+        """
+        for bunch in iterator:
+            if self.past_end(bunch.precursor):
+                break
+            yield bunch
+            if self.contains_end(bunch):
+                break
+
+
+def plan_shards(path, n_shards):
+    """Divide `path` into at most `n_shards` disjoint :class:`ScanRange` of about the
+    same number of scans, each starting from an MS^1 scan so that no bunch is split
+    between shards.
+
+    Returns
+    -------
+    list of ScanRange
+    """
+    reader = MSFileLoader(path)
+    n_scans = len(reader.index)
+    starts = [None]
+    last_index = 0
+    for i in range(1, n_shards):
+        try:
+            scan = reader._locate_ms1_scan(reader.get_scan_by_index(i * n_scans // n_shards))
+        except (IndexError, KeyError):
+            # Before the first MS^1 scan, or an index entry which is not a spectrum
+            continue
+        # Skip boundaries which would leave the previous shard empty
+        if scan.index > last_index:
+            starts.append(scan.id)
+            last_index = scan.index
+    reader.close()
+    return [ScanRange(start_scan=start, stop_scan=stop)
+            for start, stop in zip(starts, starts[1:] + [None])]
+
+
+class Progress(object):
+    """Periodically logs the number of scans processed and the rate of processing
+    """
+
+    def __init__(self, interval=30.0):
+        self.interval = interval
+        self.start = time.time()
+        self.last = self.start
+        self.scans = 0
+        self.bunches = 0
+
+    def update(self, bunch):
+        self.bunches += 1
+        self.scans += 1 + len(bunch.products)
+        now = time.time()
+        if now - self.last >= self.interval:
+            self.last = now
+            self.report(bunch.precursor)
+
+    def report(self, precursor=None):
+        elapsed = time.time() - self.start
+        logger.info("%d scans in %d bunches, %0.2f scans/s%s", self.scans, self.bunches,
+                    self.scans / elapsed if elapsed else 0.,
+                    ", at %s (%0.3f min)" % (precursor.id, precursor.scan_time) if precursor is not None else "")
+
+
+def _make_statistics(args):
+    if args.statistics is None:
+        return None
+    return ProcessingStatistics()
+
+
+def process_sequential(path, scan_range, processor_args, statistics=None):
+    """Deconvolute the scan bunches of `path` within `scan_range` in this process.
+
+    Yields
+    ------
+    bunch : ScanBunch
+        The packed, deconvoluted bunch
+    records : list of ScanStatistics
+        The statistics of the bunch's scans, if `statistics` was given
+    """
+    processor = ScanProcessor(path, statistics=statistics, **processor_args)
+    scan_range.seek(processor)
+    while True:
+        try:
+            bunch = processor.pack_next()
+        except StopIteration:
+            break
+        if scan_range.past_end(bunch.precursor):
+            break
+        yield bunch, _take_records(statistics)
+        if scan_range.contains_end(bunch):
+            break
+
+
+def _take_records(statistics):
+    if statistics is None:
+        return []
+    statistics.flush()
+    records = statistics.records
+    statistics.records = []
+    return records
+
+
+_worker_processor = None
+_worker_shared_memory = False
+
+
+def _initialize_worker(path, processor_args, collect_statistics, shared_memory=False):
+    global _worker_processor, _worker_shared_memory
+    statistics = ProcessingStatistics() if collect_statistics else None
+    _worker_processor = ScanProcessor(path, statistics=statistics, **processor_args)
+    _worker_shared_memory = shared_memory
+
+
+def _process_bunch(scan_id):
+    processor = _worker_processor
+    processor.start_from_scan(scan_id)
+    bunch = processor.pack_next()
+    transfer = ScanBunchTransfer.from_bunch(bunch, shared=_worker_shared_memory)
+    return transfer, _take_records(processor.statistics)
+
+
+def list_bunches(path, scan_range):
+    """List the ids of the MS^1 scans which begin each bunch of `path`
+    within `scan_range`.
+
+    Returns
+    -------
+    list of str
+    """
+    reader = MSFileLoader(path)
+    scan_range.seek(reader)
+    return [bunch.precursor.id for bunch in scan_range.bunches(reader)]
+
+
+def process_parallel(path, scan_range, processor_args, n_processes, statistics=None, shared_memory=False):
+    """As :func:`process_sequential`, but deconvolute the bunches in `n_processes`
+    worker processes, each with its own reader. Bunches are still yielded in
+    acquisition order.
+
+    Bunches are sent back from the workers as a :class:`~.ScanBunchTransfer`,
+    through shared memory if `shared_memory` is :const:`True`.
+    """
+    if shared_memory and not has_shared_memory:
+        logger.warning("Shared memory is not available, sending bunches through pipes")
+        shared_memory = False
+    bunch_ids = list_bunches(path, scan_range)
+    logger.info("Processing %d bunches with %d processes", len(bunch_ids), n_processes)
+    pool = multiprocessing.Pool(
+        n_processes, _initialize_worker, (path, processor_args, statistics is not None, shared_memory))
+    try:
+        for transfer, records in pool.imap(_process_bunch, bunch_ids, chunksize=1):
+            yield transfer.to_bunch(), records
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _is_database(path):
+    return os.path.splitext(path)[1].lower() in (".db", ".sqlite")
+
+
+def open_serializer(path, sample_name, n_spectra):
+    """Create a serializer writing to `path`, a SQLite database if it ends
+    in ``.db`` or ``.sqlite``, and an mzML file otherwise.
+
+    Returns
+    -------
+    serializer : ScanSerializerBase
+    handle : file-like
+        The file the serializer writes to, which must be closed after
+        the serializer is completed, or :const:`None`
+    """
+    if _is_database(path):
+        from .output.db import DatabaseScanSerializer
+        return DatabaseScanSerializer(path, sample_name=sample_name), None
+    from .output.mzml import MzMLScanSerializer
+    handle = open(path, 'wb')
+    return MzMLScanSerializer(handle, n_spectra=n_spectra, sample_name=sample_name), handle
+
+
+def _spectrum_count(path):
+    try:
+        return len(MSFileLoader(path).index)
+    except (AttributeError, TypeError):
+        return 2e4
+
+
+def _scan_range(args):
+    if args.shard is None:
+        return ScanRange(args.start_time, args.end_time, args.start_scan, args.end_scan)
+    index, count = args.shard
+    if not 1 <= index <= count:
+        raise ValueError("Shard index must be between 1 and %d, not %d" % (count, index))
+    shards = plan_shards(args.input, count)
+    if index > len(shards):
+        logger.warning("%s only has %d shards, shard %d is empty", args.input, len(shards), index)
+        return None
+    scan_range = shards[index - 1]
+    logger.info("Processing shard %d of %d, from %s to before %s", index, count,
+                scan_range.start_scan or "the beginning", scan_range.stop_scan or "the end")
+    return scan_range
+
+
+def _open_output(args, scan_range, sample_name):
+    n_spectra = _spectrum_count(args.input)
+    checkpointing = args.resume or args.checkpoint_interval is not None
+    if checkpointing and _is_database(args.output):
+        raise ValueError("Checkpoints are only supported when writing mzML")
+    if not args.resume:
+        serializer, handle = open_serializer(args.output, sample_name, n_spectra)
+        checkpointer = None
+        if checkpointing:
+            checkpointer = Checkpointer(
+                serializer, os.path.abspath(args.input), args.output, args.checkpoint_interval)
+        return serializer, handle, checkpointer, scan_range
+
+    checkpoint_path = Checkpoint.path_for(args.output)
+    if not os.path.exists(checkpoint_path):
+        raise ValueError("No checkpoint to resume from at %s" % (checkpoint_path,))
+    checkpoint = Checkpoint.load(checkpoint_path)
+    if checkpoint.input_path != os.path.abspath(args.input):
+        raise ValueError("%s was checkpointed while deconvoluting %s, not %s" % (
+            args.output, checkpoint.input_path, args.input))
+    serializer, handle, checkpointer = resume_mzml(checkpoint, args.sample_name, n_spectra)
+    if args.checkpoint_interval is not None:
+        checkpointer.interval = args.checkpoint_interval
+    next_id = next_bunch_id(args.input, checkpoint.scan_id)
+    if next_id is None or scan_range is None:
+        scan_range = None
+    else:
+        scan_range.start_scan = next_id
+    logger.info("Resuming after %d bunches, from %s", checkpoint.bunches, next_id or "the end")
+    return serializer, handle, checkpointer, scan_range
+
+
+def deconvolute(args):
+    scan_range = _scan_range(args)
+    processor_args = processor_arguments(args)
+    statistics = _make_statistics(args)
+    sample_name = args.sample_name or os.path.splitext(os.path.basename(args.input))[0]
+    serializer, handle, checkpointer, scan_range = _open_output(args, scan_range, sample_name)
+
+    if scan_range is None:
+        bunches = iter(())
+    elif args.processes > 1:
+        bunches = process_parallel(args.input, scan_range, processor_args, args.processes, statistics,
+                                   args.shared_memory)
+    else:
+        bunches = process_sequential(args.input, scan_range, processor_args, statistics)
+
+    statistics_handle = None
+    statistics_writer = None
+    if statistics is not None:
+        statistics_handle = open(args.statistics, 'a' if args.resume else 'w')
+        statistics_writer = JSONLinesStatisticsWriter(statistics_handle)
+
+    progress = Progress(args.progress_interval)
+    try:
+        for bunch, records in bunches:
+            start = time.time()
+            serializer.save(bunch)
+            if checkpointer is not None:
+                checkpointer.update(bunch)
+            if records:
+                records[0].add_time("write", time.time() - start)
+            for record in records:
+                statistics_writer(record)
+            progress.update(bunch)
+        serializer.complete()
+        if checkpointer is not None:
+            checkpointer.complete()
+    finally:
+        if handle is not None:
+            handle.close()
+        if statistics_handle is not None:
+            statistics_handle.close()
+    progress.report()
+    return 0
+
+
+def shards(args):
+    for i, scan_range in enumerate(plan_shards(args.input, args.count), 1):
+        print("%d\t%s\t%s" % (i, scan_range.start_scan or "", scan_range.stop_scan or ""))
+    return 0
+
+
+def merge(args):
+    from .output.mzml import merge_processed_mzml
+    with open(args.output, 'wb') as handle:
+        merge_processed_mzml(args.shards, handle, args.sample_name)
+    return 0
+
+
+def serve(args):
+    from .server import serve as _serve
+    warm_up_args = None
+    if args.warm_up is not None:
+        warm_up_args = {"mz_range": tuple(args.warm_up), "charge_range": tuple(args.warm_up_charge_range)}
+    _serve(args.host, args.port, args.workers, {
+        "averagines": args.averagine or None,
+        "max_readers": args.max_readers,
+    }, warm_up_args)
+
+
+def _add_deconvolute_arguments(parser):
+    parser.add_argument("input", help="The mzML, mzXML or other supported file to deconvolute")
+    parser.add_argument("output", help="The mzML file, or SQLite database ending in .db or .sqlite, to write")
+    parser.add_argument("-p", "--processes", type=int, default=1,
+                        help="The number of worker processes to deconvolute with")
+    parser.add_argument("--shared-memory", action="store_true", default=False,
+                        help="Send deconvoluted scans from worker processes through shared memory")
+    parser.add_argument("-a", "--ms1-averagine", choices=sorted(AVERAGINES), default="peptide",
+                        help="The averagine model for MS1 scans")
+    parser.add_argument("-an", "--msn-averagine", choices=sorted(AVERAGINES), default="peptide",
+                        help="The averagine model for MSn scans")
+    parser.add_argument("-s", "--ms1-scorer", choices=SCORERS, default="penalized-msdeconv",
+                        help="The isotopic fit scorer for MS1 scans")
+    parser.add_argument("-sn", "--msn-scorer", choices=SCORERS, default="msdeconv",
+                        help="The isotopic fit scorer for MSn scans")
+    parser.add_argument("-t", "--ms1-score-threshold", type=float, default=20.,
+                        help="The minimum score of an MS1 isotopic fit")
+    parser.add_argument("-tn", "--msn-score-threshold", type=float, default=10.,
+                        help="The minimum score of an MSn isotopic fit")
+    parser.add_argument("-z", "--charge-range", type=int, nargs=2, default=(1, 8), metavar=("MIN", "MAX"),
+                        help="The range of charge states to consider in MS1 scans")
+    parser.add_argument("-zn", "--msn-charge-range", type=int, nargs=2, default=(1, 8), metavar=("MIN", "MAX"),
+                        help="The range of charge states to consider in MSn scans, which is further "
+                             "limited by the charge of the precursor ion")
+    parser.add_argument("--start-time", type=float, default=None,
+                        help="The retention time to start from")
+    parser.add_argument("--end-time", type=float, default=None,
+                        help="The retention time to stop at")
+    parser.add_argument("--start-scan", default=None,
+                        help="The id of the scan to start from, taking precedence over --start-time")
+    parser.add_argument("--end-scan", default=None,
+                        help="The id of the last scan to process")
+    parser.add_argument("--shard", type=int, nargs=2, default=None, metavar=("INDEX", "COUNT"),
+                        help="Only process the INDEX-th (from 1) of COUNT disjoint scan ranges, "
+                             "replacing the other range options")
+    parser.add_argument("--ignore-charge-hint", action="store_true", default=False,
+                        help="Do not restrict precursor ions to the charge state reported by the instrument")
+    parser.add_argument("--targeted-ms1-only", action="store_true", default=False,
+                        help="Only deconvolute the regions of MS1 scans around precursor ions")
+    parser.add_argument("--use-precursor-cache", action="store_true", default=False,
+                        help="Reuse precursor ion solutions from nearby MS1 scans")
+    parser.add_argument("--sample-name", default=None,
+                        help="The sample name to record. Defaults to the input file's name")
+    parser.add_argument("--statistics", default=None,
+                        help="Write per-scan timing and counter statistics to this JSON lines file")
+    parser.add_argument("--capture-slow-scans", default=None, metavar="DIR",
+                        help="Save the inputs of scans which are slow to deconvolute to this directory. "
+                             "See `python -m ms_deisotope.replay`")
+    parser.add_argument("--slow-scan-threshold", type=float, default=10.,
+                        help="The number of seconds a scan must take to be saved by --capture-slow-scans")
+    parser.add_argument("--progress-interval", type=float, default=30.,
+                        help="The number of seconds between progress reports")
+    parser.add_argument("--checkpoint-interval", type=float, default=None, metavar="SECONDS",
+                        help="Record the progress of an mzML output at most every SECONDS seconds, "
+                             "so that the run may be resumed")
+    parser.add_argument("--resume", action="store_true", default=False,
+                        help="Resume an interrupted run from the checkpoint next to OUTPUT, "
+                             "checkpointing every 300 seconds unless --checkpoint-interval is given")
+    parser.set_defaults(func=deconvolute)
+
+
+def _add_shards_arguments(parser):
+    parser.add_argument("input", help="The file to divide")
+    parser.add_argument("count", type=int, help="The number of shards to divide it into")
+    parser.set_defaults(func=shards)
+
+
+def _add_merge_arguments(parser):
+    parser.add_argument("output", help="The mzML file to write")
+    parser.add_argument("shards", nargs="+", help="The processed mzML files of each shard")
+    parser.add_argument("--sample-name", default=None,
+                        help="The sample name to record. Defaults to the first shard's")
+    parser.set_defaults(func=merge)
+
+
+def _add_serve_arguments(parser):
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="The address to listen on. Any file its user can read may be requested, "
+                             "so this should not be reachable from other machines")
+    parser.add_argument("--port", type=int, default=8765, help="The port to listen on")
+    parser.add_argument("-w", "--workers", type=int, default=0,
+                        help="The number of worker processes to deconvolute with. With none, requests "
+                             "are deconvoluted on the threads handling them")
+    parser.add_argument("-a", "--averagine", choices=sorted(AVERAGINES), action="append", default=None,
+                        help="An averagine model to serve, which may be given more than once. "
+                             "Defaults to all of them")
+    parser.add_argument("--max-readers", type=int, default=8,
+                        help="The number of files to keep open between requests")
+    parser.add_argument("--warm-up", type=float, nargs=2, default=None, metavar=("MIN_MZ", "MAX_MZ"),
+                        help="Compute the isotopic patterns of every m/z in this range before serving")
+    parser.add_argument("--warm-up-charge-range", type=int, nargs=2, default=(1, 4), metavar=("MIN", "MAX"),
+                        help="The charge states to compute isotopic patterns for with --warm-up")
+    parser.set_defaults(func=serve)
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(prog="ms-deisotope", description="Deisotoping and charge state deconvolution "
+                                     "of mass spectra")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+    _add_deconvolute_arguments(subparsers.add_parser(
+        "deconvolute", help="Deconvolute a mass spectrometry data file"))
+    _add_shards_arguments(subparsers.add_parser(
+        "shards", help="Print the scan ranges `deconvolute --shard` would process"))
+    _add_merge_arguments(subparsers.add_parser(
+        "merge", help="Combine the processed mzML files of the shards of a run"))
+    _add_serve_arguments(subparsers.add_parser(
+        "serve", help="Run a local deconvolution server with warm caches"))
+    return parser
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(name)s %(levelname)s: %(message)s")
+    logger.setLevel(logging.INFO)
+    args = make_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
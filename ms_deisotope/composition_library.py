@@ -0,0 +1,230 @@
+import pickle
+
+import numpy as np
+
+from brainpy import isotopic_variants
+
+from .averagine import PROTON, TheoreticalPeak
+from .constants import TRUNCATE_AFTER
+from .utils import range
+
+
+class CompositionLibrary(object):
+    """A precomputed collection of theoretical isotopic patterns for a list of
+    compositions over a range of charge states, indexed by monoisotopic m/z.
+
+    Building a library performs all of the isotopic pattern calculations a
+    :class:`~.CompositionListDeconvoluterBase` would otherwise repeat for every
+    composition on every spectrum. A library may be passed in place of a plain
+    composition list, in which case the deconvoluter only searches the compositions
+    whose isotopic patterns overlap the spectrum's m/z range. Libraries may be
+    saved with :meth:`dump` and re-read with :meth:`load` to be shared between runs.
+
+    The theoretical peaks are stored as flat arrays with `offsets` marking where
+    each entry's peaks begin, with entries sorted by monoisotopic m/z.
+
+    Attributes
+    ----------
+    compositions : list of Mapping
+        The compositions the library was built from, in their original order
+    charge_range : tuple
+        The range of charge states patterns were generated for
+    charge_carrier : float
+        The mass of the charge carrier used to generate the patterns
+    truncate_after : float
+        The percent of intensity included in each theoretical isotopic pattern
+    composition_index : np.ndarray
+        The index into :attr:`compositions` of each entry
+    charges : np.ndarray
+        The charge state of each entry
+    monoisotopic_mz : np.ndarray
+        The monoisotopic m/z of each entry, sorted
+    last_mz : np.ndarray
+        The m/z of the last peak of each entry
+    offsets : np.ndarray
+        The start of each entry's peaks in :attr:`peak_mz` and :attr:`peak_intensity`
+    peak_mz : np.ndarray
+        The m/z of every theoretical peak
+    peak_intensity : np.ndarray
+        The relative intensity of every theoretical peak
+    """
+    def __init__(self, compositions, charge_range=(1, 8), charge_carrier=PROTON,
+                 truncate_after=TRUNCATE_AFTER):
+        self.compositions = list(compositions)
+        self.charge_range = tuple(charge_range)
+        self.charge_carrier = charge_carrier
+        self.truncate_after = truncate_after
+        self._build()
+
+    def _charges(self):
+        lo, hi = self.charge_range
+        sign = -1 if lo < 0 else 1
+        lo, hi = sorted((abs(lo), abs(hi)))
+        return [sign * z for z in range(lo, hi + 1)]
+
+    def _build(self):
+        composition_index = []
+        charges = []
+        lengths = []
+        peak_mz = []
+        peak_intensity = []
+        for i, composition in enumerate(self.compositions):
+            for charge in self._charges():
+                cumsum = 0
+                n = 0
+                for peak in isotopic_variants(composition, charge=charge, charge_carrier=self.charge_carrier):
+                    cumsum += peak.intensity
+                    peak_mz.append(peak.mz)
+                    peak_intensity.append(peak.intensity)
+                    n += 1
+                    if cumsum >= self.truncate_after:
+                        break
+                composition_index.append(i)
+                charges.append(charge)
+                lengths.append(n)
+
+        lengths = np.array(lengths, dtype=np.intp)
+        offsets = np.zeros(len(lengths) + 1, dtype=np.intp)
+        np.cumsum(lengths, out=offsets[1:])
+        peak_mz = np.array(peak_mz, dtype=np.float64)
+        peak_intensity = np.array(peak_intensity, dtype=np.float64)
+        monoisotopic_mz = peak_mz[offsets[:-1]] if len(peak_mz) else np.zeros(0)
+
+        # Re-lay the entries and their peaks out in monoisotopic m/z order
+        order = np.argsort(monoisotopic_mz, kind='stable')
+        lengths = lengths[order]
+        starts = offsets[:-1][order]
+        gather = np.repeat(starts, lengths) + (
+            np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths))
+        self.composition_index = np.array(composition_index, dtype=np.intp)[order]
+        self.charges = np.array(charges, dtype=np.intp)[order]
+        self.offsets = np.zeros(len(lengths) + 1, dtype=np.intp)
+        np.cumsum(lengths, out=self.offsets[1:])
+        self.peak_mz = peak_mz[gather]
+        self.peak_intensity = peak_intensity[gather]
+        self.monoisotopic_mz = monoisotopic_mz[order]
+        self.last_mz = self.peak_mz[self.offsets[1:] - 1] if len(self.peak_mz) else np.zeros(0)
+        self._index()
+
+    def _index(self):
+        self._composition_ids = {id(c): i for i, c in enumerate(self.compositions)}
+        self._entry_map = {
+            (c, z): k for k, (c, z) in enumerate(zip(self.composition_index.tolist(), self.charges.tolist()))}
+        self._max_width = float((self.last_mz - self.monoisotopic_mz).max()) if len(self.last_mz) else 0.
+
+    def __len__(self):
+        return len(self.compositions)
+
+    def __iter__(self):
+        return iter(self.compositions)
+
+    def __getitem__(self, i):
+        return self.compositions[i]
+
+    def __repr__(self):
+        return "CompositionLibrary(%d compositions, %d patterns, charge_range=%r)" % (
+            len(self.compositions), len(self.charges), self.charge_range)
+
+    def is_compatible(self, charge_range, charge_carrier=PROTON, truncate_after=TRUNCATE_AFTER):
+        """Check whether the library's patterns can answer a search with these parameters
+
+        Parameters
+        ----------
+        charge_range : tuple
+        charge_carrier : float, optional
+        truncate_after : float, optional
+
+        Returns
+        -------
+        bool
+        """
+        if charge_carrier != self.charge_carrier or truncate_after != self.truncate_after:
+            return False
+        lo, hi = charge_range
+        sign = -1 if lo < 0 else 1
+        lo, hi = sorted((abs(lo), abs(hi)))
+        available = set(self._charges())
+        return all(sign * z in available for z in range(lo, hi + 1))
+
+    def entries_between(self, lo, hi):
+        """Find the entries whose isotopic patterns overlap the interval [`lo`, `hi`]
+
+        Parameters
+        ----------
+        lo : float
+        hi : float
+
+        Returns
+        -------
+        np.ndarray
+            The indices of the matching entries
+        """
+        start = np.searchsorted(self.monoisotopic_mz, lo - self._max_width, side='left')
+        end = np.searchsorted(self.monoisotopic_mz, hi, side='right')
+        candidates = np.arange(start, end)
+        return candidates[self.last_mz[start:end] >= lo]
+
+    def compositions_between(self, lo, hi):
+        """Find the compositions with at least one isotopic pattern which overlaps the
+        interval [`lo`, `hi`], in their original order
+
+        Parameters
+        ----------
+        lo : float
+        hi : float
+
+        Returns
+        -------
+        list of Mapping
+        """
+        indices = np.unique(self.composition_index[self.entries_between(lo, hi)])
+        return [self.compositions[i] for i in indices]
+
+    def isotopic_cluster(self, composition, charge):
+        """Build a new copy of the theoretical isotopic pattern of `composition`
+        at `charge`.
+
+        Parameters
+        ----------
+        composition : Mapping
+            One of :attr:`compositions`
+        charge : int
+
+        Returns
+        -------
+        list of TheoreticalPeak
+            The pattern, or :const:`None` if `composition` or `charge` is not in the library
+        """
+        try:
+            k = self._entry_map[self._composition_ids[id(composition)], charge]
+        except KeyError:
+            return None
+        start = self.offsets[k]
+        end = self.offsets[k + 1]
+        return [TheoreticalPeak(mz, intensity, charge) for mz, intensity in zip(
+            self.peak_mz[start:end].tolist(), self.peak_intensity[start:end].tolist())]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_composition_ids")
+        state.pop("_entry_map")
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._index()
+
+    def dump(self, fh):
+        """Write the library to the file-like object `fh`
+        """
+        pickle.dump(self, fh, pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, fh):
+        """Read a library written by :meth:`dump` from the file-like object `fh`
+
+        Returns
+        -------
+        CompositionLibrary
+        """
+        return pickle.load(fh)
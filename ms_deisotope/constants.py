@@ -4,3 +4,4 @@ ERROR_TOLERANCE = 2e-5
 IGNORE_BELOW = 0.01
 CONVERGENCE = 1e-3
 SCALE_METHOD = "sum"
+MAX_PLACEHOLDER_CACHE = 2 ** 18
@@ -322,6 +322,7 @@ class ScanIterator(ScanDataSource):
             else:
                 raise ValueError("Could not interpret MS Level %r" % (packed.ms_level,))
         if precursor_scan is not None:
+            precursor_scan.product_scans = list(product_scans)
             yield ScanBunch(precursor_scan, product_scans)
 
 
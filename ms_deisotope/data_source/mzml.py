@@ -5,6 +5,7 @@ from .common import (
     ChargeNotProvided, ActivationInformation)
 from weakref import WeakValueDictionary
 from .xml_reader import XMLReaderBase, IndexSavingXML
+from ..utils import basestring
 
 
 class _MzMLParser(mzml.MzML, IndexSavingXML):
@@ -294,9 +295,13 @@ class MzMLLoader(MzMLDataInterface, XMLReaderBase, _MzMLMetadataLoader):
 
     def _yield_from_index(self, scan_source, start):
         offset_provider = scan_source._offset_index.offsets
-        keys = offset_provider.keys()
+        # The index may be keyed by bytes, while scans are looked up by str
+        keys = [key.decode("utf-8") if isinstance(key, bytes) else key
+                for key in offset_provider.keys()]
         if start is not None:
             if isinstance(start, basestring):
+                if isinstance(start, bytes):
+                    start = start.decode("utf-8")
                 start = keys.index(start)
             elif isinstance(start, int):
                 start = start
@@ -4,6 +4,7 @@ from .common import (
     PrecursorInformation, ScanDataSource, ChargeNotProvided,
     ActivationInformation)
 from .xml_reader import XMLReaderBase, IndexSavingXML
+from ..utils import basestring
 from weakref import WeakValueDictionary
 
 
@@ -266,6 +267,8 @@ class MzXMLLoader(MzXMLDataInterface, XMLReaderBase):
         index = dict()
         i = 0
         for scan, offset in self.index.items():
+            if isinstance(scan, bytes):
+                scan = scan.decode("utf-8")
             index[scan] = i
             i += 1
         self._scan_index_lookup = index
@@ -275,9 +278,13 @@ class MzXMLLoader(MzXMLDataInterface, XMLReaderBase):
 
     def _yield_from_index(self, scan_source, start=None):
         offset_provider = scan_source._offset_index.offsets
-        keys = offset_provider.keys()
+        # The index may be keyed by bytes, while scans are looked up by str
+        keys = [key.decode("utf-8") if isinstance(key, bytes) else key
+                for key in offset_provider.keys()]
         if start is not None:
             if isinstance(start, basestring):
+                if isinstance(start, bytes):
+                    start = start.decode("utf-8")
                 start = keys.index(start)
             elif isinstance(start, int):
                 start = start
@@ -430,6 +430,7 @@ class ThermoRawLoader(ThermoRawDataInterface, RandomAccessScanSource, ScanIterat
             else:
                 raise Exception("This object is not able to handle MS levels higher than 2")
         if precursor_scan is not None:
+            precursor_scan.product_scans = list(product_scans)
             yield ScanBunch(precursor_scan, product_scans)
 
     def next(self):
@@ -1,24 +1,35 @@
 # -*- coding: utf-8 -*-
+import atexit
 import operator
 import logging
+from bisect import bisect_left
+from collections import defaultdict, OrderedDict
+import multiprocessing
+import time
 
-from ms_peak_picker import FittedPeak
+import numpy as np
+
+from ms_peak_picker import FittedPeak, PeakIndex, PeakSet
 
 from .averagine import (
     AveragineCache, peptide, glycopeptide, glycan, neutral_mass, isotopic_variants,
-    isotopic_shift, PROTON, shift_isotopic_pattern)
+    isotopic_shift, PROTON, shift_isotopic_pattern, TheoreticalIsotopicPattern)
 from .peak_set import DeconvolutedPeak, DeconvolutedPeakSolution, DeconvolutedPeakSet
 from .scoring import IsotopicFitRecord, penalized_msdeconv
+from .composition_library import CompositionLibrary
 from .utils import range, Base, TrivialTargetedDeconvolutionResult, DeconvolutionProcessResult
 from .envelope_statistics import a_to_a2_ratio, average_mz, most_abundant_mz
 from .peak_dependency_network import PeakDependenceGraph, NetworkedTargetedDeconvolutionResult
+from .peak_dependency_network.subgraph import SUBGRAPH_TIME_BUDGET
+from .transfer import ArrayBundle, peak_index_to_arrays, peak_index_from_arrays
 from .constants import (
     TRUNCATE_AFTER,
     MAX_ITERATION,
     ERROR_TOLERANCE,
     IGNORE_BELOW,
     CONVERGENCE,
-    SCALE_METHOD)
+    SCALE_METHOD,
+    MAX_PLACEHOLDER_CACHE)
 
 logger = logging.getLogger("deconvolution")
 info = logger.info
@@ -183,12 +194,20 @@ class DeconvoluterBase(Base):
         times as in a multi-pass method or when peak dependence is not considered
     verbose : bool
         Produce extra logging information
+    scored_fits : int
+        The number of candidate isotopic fits which were scaled and scored
+    pruned_fits : int
+        The number of candidate isotopic fits which were skipped because their
+        scorer's :meth:`~.IsotopicFitterBase.score_bound` showed they could not be
+        accepted or beat the best fit found so far
     """
     use_subtraction = False
     scale_method = 'sum'
     merge_isobaric_peaks = True
     minimum_intensity = 5.
     verbose = False
+    scored_fits = 0
+    pruned_fits = 0
 
     def __init__(self, use_subtraction=False, scale_method="sum", merge_isobaric_peaks=True,
                  minimum_intensity=5., *args, **kwargs):
@@ -197,6 +216,59 @@ class DeconvoluterBase(Base):
         self.merge_isobaric_peaks = merge_isobaric_peaks
         self.minimum_intensity = minimum_intensity
         self._slice_cache = {}
+        self._placeholder_cache = {}
+
+    def _prune_fit(self, experimental, best=None):
+        """Decide whether a candidate fit on `experimental` can be skipped before it
+        is scaled and scored, because the most optimistic score :attr:`scorer` could
+        give it would be rejected or would not beat `best`.
+
+        Updates :attr:`scored_fits` or :attr:`pruned_fits`.
+
+        Parameters
+        ----------
+        experimental : list of FittedPeak
+            The experimental peaks matched for the candidate
+        best : float, optional
+            The score of the best fit found so far, if only the best fit is wanted
+
+        Returns
+        -------
+        bool
+        """
+        scorer = self.scorer
+        bound = scorer.score_bound(experimental)
+        if scorer.reject_score(bound) or (best is not None and (
+                bound < best if scorer.is_maximizing() else bound > best)):
+            self.pruned_fits += 1
+            return True
+        self.scored_fits += 1
+        return False
+
+    def _placeholder_peak(self, mz):
+        """Get a placeholder peak at `mz`, re-using the same instance for repeated
+        requests for the same m/z.
+
+        Placeholder peaks are never mutated, so a single instance may be shared by every
+        isotopic fit which is missing a peak at `mz`. The cache is emptied once it holds
+        :const:`MAX_PLACEHOLDER_CACHE` peaks.
+
+        Parameters
+        ----------
+        mz : float
+            The m/z of the missing peak
+
+        Returns
+        -------
+        FittedPeak
+        """
+        try:
+            return self._placeholder_cache[mz]
+        except KeyError:
+            if len(self._placeholder_cache) >= MAX_PLACEHOLDER_CACHE:
+                self._placeholder_cache.clear()
+            peak = self._placeholder_cache[mz] = FittedPeak(mz, 1.0, 1.0, -1, 0, 0, 0)
+            return peak
 
     def has_peak(self, mz, error_tolerance):
         """Query :attr:`peaklist` for a peak at `mz` within `error_tolerance` ppm. If a peak
@@ -216,7 +288,7 @@ class DeconvoluterBase(Base):
         """
         peak = self.peaklist.has_peak(mz, error_tolerance)
         if peak is None or peak.intensity < self.minimum_intensity:
-            return FittedPeak(mz, 1.0, 1.0, -1, 0, 0, 0)
+            return self._placeholder_peak(mz)
         return peak
 
     def between(self, m1, m2):
@@ -372,7 +444,7 @@ class DeconvoluterBase(Base):
         candidates = []
         for forward in peaklist_slice:
             prev_peak_mz = forward.mz - (shift * step)
-            dummy_peak = FittedPeak(prev_peak_mz, 1.0, 1.0, -1, 0, 0, 0)
+            dummy_peak = self._placeholder_peak(prev_peak_mz)
             candidates.append((dummy_peak, charge))
         return candidates
 
@@ -473,11 +545,13 @@ class AveragineDeconvoluterBase(DeconvoluterBase):
         return IsotopicFitRecord(peak, score, charge, tid, eid)
 
     def _fit_peaks_at_charges(self, peak_charge_set, error_tolerance, charge_carrier=PROTON, truncate_after=0.8,
-                              ignore_below=IGNORE_BELOW):
+                              ignore_below=IGNORE_BELOW, best_only=False):
         """Given a set of candidate monoisotopic peaks and charge states, and a PPM error tolerance,
         fit each putative isotopic pattern.
 
-        Calls :meth:`fit_theoretical_distribution` on each candidate.
+        Each candidate is fit as in :meth:`fit_theoretical_distribution`, but the theoretical
+        pattern is only scaled and scored if :meth:`_prune_fit` cannot rule it out from the
+        matched experimental peaks alone.
 
         If a fit does not satisfy :attr:`scorer` `.reject`, it is discarded. If a fit has only one real peak
         and has a charge state greater than 1, it will also be discarded.
@@ -490,6 +564,9 @@ class AveragineDeconvoluterBase(DeconvoluterBase):
             Matching error tolerance
         charge_carrier : float, optional
             The charge carrier to use. Defaults to `PROTON`
+        best_only : bool, optional
+            Whether only the best fit is needed, in which case candidates which cannot
+            beat the best fit found so far are pruned as well. Defaults to :const:`False`
 
         Returns
         -------
@@ -497,22 +574,35 @@ class AveragineDeconvoluterBase(DeconvoluterBase):
             The set of IsotopicFitRecord instances produced
         """
         results = []
+        best = None
+        maximizing = self.scorer.is_maximizing()
         for peak, charge in peak_charge_set:
             if peak.mz < 1:
                 continue
-            fit = self.fit_theoretical_distribution(
-                peak, error_tolerance, charge, charge_carrier, truncate_after,
-                ignore_below)
-            fit.missed_peaks = count_placeholders(fit.experimental)
-            if len(drop_placeholders(fit.experimental)) == 1 and fit.charge > 1:
+            tid = self.averagine.isotopic_cluster(
+                peak.mz, charge, charge_carrier=charge_carrier,
+                truncate_after=truncate_after, ignore_below=ignore_below)
+            eid = self.match_theoretical_isotopic_distribution(
+                tid, error_tolerance=error_tolerance)
+            if len(drop_placeholders(eid)) == 1 and charge > 1:
+                continue
+            if self._prune_fit(eid, best):
                 continue
+            self.scale_theoretical_distribution(tid, eid)
+            score = self.scorer(self.peaklist, eid, tid)
+            fit = IsotopicFitRecord(peak, score, charge, tid, eid)
+            fit.missed_peaks = count_placeholders(eid)
             if self.scorer.reject(fit):
                 continue
             results.append(fit)
+            if best_only and (best is None or (score > best if maximizing else score < best)):
+                best = score
         return set(results)
 
 
 try:
+    _DeconvoluterBase = DeconvoluterBase
+    _AveragineDeconvoluterBase = AveragineDeconvoluterBase
     from ms_deisotope._c.deconvoluter_base import DeconvoluterBase, AveragineDeconvoluterBase
 except ImportError:
     pass
@@ -645,7 +735,7 @@ class ExhaustivePeakSearchDeconvoluterBase(object):
     def _fit_all_charge_states(self, peak, error_tolerance=ERROR_TOLERANCE, charge_range=(1, 8), left_search_limit=3,
                                right_search_limit=3, use_charge_state_hint=False,
                                recalculate_starting_peak=True, charge_carrier=PROTON,
-                               truncate_after=TRUNCATE_AFTER, ignore_below=IGNORE_BELOW):
+                               truncate_after=TRUNCATE_AFTER, ignore_below=IGNORE_BELOW, best_only=False):
         """Carry out the fitting process for `peak`.
 
         This method calls :meth:`_get_all_peak_charge_pairs` to collect all hypothetical solutions
@@ -681,6 +771,9 @@ class ExhaustivePeakSearchDeconvoluterBase(object):
             starting from the monoisotopic peak. This will cause theoretical isotopic patterns
             to be truncated, excluding trailing peaks which do not contribute substantially to
             the overall shape of the isotopic pattern.
+        best_only : bool, optional
+            Whether only the best fit is needed, allowing :meth:`_fit_peaks_at_charges` to
+            prune candidates which cannot beat it. Defaults to :const:`False`
 
         Returns
         -------
@@ -692,6 +785,10 @@ class ExhaustivePeakSearchDeconvoluterBase(object):
             left_search_limit=left_search_limit, right_search_limit=right_search_limit,
             use_charge_state_hint=use_charge_state_hint, recalculate_starting_peak=True)
 
+        if best_only:
+            return self._fit_peaks_at_charges(
+                target_peaks, error_tolerance, charge_carrier=charge_carrier, truncate_after=truncate_after,
+                ignore_below=ignore_below, best_only=True)
         results = self._fit_peaks_at_charges(
             target_peaks, error_tolerance, charge_carrier=charge_carrier, truncate_after=truncate_after,
             ignore_below=ignore_below)
@@ -737,7 +834,8 @@ class ExhaustivePeakSearchDeconvoluterBase(object):
         results = self._fit_all_charge_states(
             peak, error_tolerance=error_tolerance, charge_range=charge_range, left_search_limit=left_search_limit,
             right_search_limit=right_search_limit, use_charge_state_hint=use_charge_state_hint,
-            charge_carrier=charge_carrier, truncate_after=truncate_after, ignore_below=ignore_below)
+            charge_carrier=charge_carrier, truncate_after=truncate_after, ignore_below=ignore_below,
+            best_only=True)
 
         if self.verbose:
             info("Fits for %r" % peak)
@@ -927,6 +1025,23 @@ class ExhaustivePeakSearchDeconvoluterBase(object):
 
         return DeconvolutedPeakSet(self._deconvoluted_peaks)._reindex()
 
+    def deconvolute_targets(self, *args, **kwargs):
+        """Collect the solutions to the peaks passed to :meth:`targeted_deconvolution`
+        without deconvoluting the rest of the spectrum.
+
+        Each targeted peak has already been deconvoluted, so the arguments are accepted
+        only for compatibility with :meth:`PeakDependenceGraphDeconvoluterBase.deconvolute_targets`.
+
+        Returns
+        -------
+        DeconvolutedPeakSet
+        """
+        if self.merge_isobaric_peaks:
+            self._deconvoluted_peaks = self._merge_peaks(
+                self._deconvoluted_peaks)
+
+        return DeconvolutedPeakSet(self._deconvoluted_peaks)._reindex()
+
 
 try:
     from ms_deisotope._c.deconvoluter_base import (
@@ -989,34 +1104,156 @@ class AveragineDeconvoluter(AveragineDeconvoluterBase, ExhaustivePeakSearchDecon
 
 
 class MultiAveragineDeconvoluterBase(DeconvoluterBase):
+    """A base class derived from :class:`DeconvoluterBase` which provides some common methods
+    for fitting isotopic patterns using multiple Averagine models.
+
+    Attributes
+    ----------
+    use_shared_matching : bool
+        Whether to match the experimental peaks for all averagine models' isotopic
+        patterns for the same (peak, charge) pair at once using
+        :meth:`match_shared_isotopic_distributions`, rather than matching each
+        pattern independently
+    """
+    use_shared_matching = False
 
     def fit_theoretical_distribution(self, peak, error_tolerance, charge, averagine, charge_carrier=PROTON,
-                                     truncate_after=TRUNCATE_AFTER):
+                                     truncate_after=TRUNCATE_AFTER, ignore_below=IGNORE_BELOW):
         tid = averagine.isotopic_cluster(
-            peak.mz, charge, charge_carrier=charge_carrier, truncate_after=truncate_after)
+            peak.mz, charge, charge_carrier=charge_carrier, truncate_after=truncate_after,
+            ignore_below=ignore_below)
         eid = self.match_theoretical_isotopic_distribution(
             tid, error_tolerance=error_tolerance)
         self.scale_theoretical_distribution(tid, eid)
         score = self.scorer(self.peaklist, eid, tid)
         return IsotopicFitRecord(peak, score, charge, tid, eid)
 
+    def match_shared_isotopic_distributions(self, theoretical_distributions, error_tolerance=ERROR_TOLERANCE):
+        """Match several theoretical isotopic patterns seeded at the same peak against
+        :attr:`peaklist` at once.
+
+        The patterns' peaks at each isotopic position are looked up with a single
+        query spanning all of their m/z values, and the matched experimental peak is then
+        accepted for each pattern whose own m/z is within `error_tolerance` of it. Because
+        different averagine models at the same mass place their peaks within a few parts-per-million
+        of each other, this needs one query per position instead of one per pattern per position.
+
+        Parameters
+        ----------
+        theoretical_distributions : list of TheoreticalIsotopicPattern
+            The theoretical isotopic patterns to match
+        error_tolerance : float, optional
+            Parts-per-million error tolerance to permit in searching for matches
+
+        Returns
+        -------
+        list of list of FittedPeak
+            The matched peaks for each pattern, in the same order as `theoretical_distributions`
+        """
+        experimental_distributions = [[] for tid in theoretical_distributions]
+        positions = [[p.mz for p in tid] for tid in theoretical_distributions]
+        width = max(map(len, positions))
+        for k in range(width):
+            mzs = [mz[k] for mz in positions if k < len(mz)]
+            lo = min(mzs)
+            hi = max(mzs)
+            center = (lo + hi) / 2.
+            spread = (hi - lo) / 2. / center
+            if spread > error_tolerance:
+                # The patterns disagree too much to share a query at this position
+                match = None
+            else:
+                match = self.peaklist.has_peak(center, error_tolerance + spread)
+                if match is not None and match.intensity < self.minimum_intensity:
+                    match = None
+            for mz, eid in zip(positions, experimental_distributions):
+                if k >= len(mz):
+                    continue
+                mz = mz[k]
+                if match is not None and abs(match.mz - mz) / mz <= error_tolerance:
+                    eid.append(match)
+                elif spread > error_tolerance:
+                    eid.append(self.has_peak(mz, error_tolerance))
+                else:
+                    eid.append(self._placeholder_peak(mz))
+        return experimental_distributions
+
+    def fit_shared_theoretical_distributions(self, peak, error_tolerance, charge, charge_carrier=PROTON,
+                                             truncate_after=TRUNCATE_AFTER, ignore_below=IGNORE_BELOW,
+                                             best=None):
+        """Fit the isotopic pattern of every model in :attr:`averagine` seeded at `peak` at
+        `charge`, matching the experimental peaks once with :meth:`match_shared_isotopic_distributions`
+        and then scaling and scoring each model's pattern against its match.
+
+        Parameters
+        ----------
+        peak : FittedPeak
+            The putative monoisotopic peak to use for interpolating an isotopic pattern
+        error_tolerance : float
+            Parts-per-million error tolerance for isotopic pattern matching
+        charge : int
+            The charge state to produce an isotopic pattern for
+        charge_carrier : float, optional
+            The charge carrier mass, defaults to `PROTON`
+        best : float, optional
+            The score of the best fit found so far, if only the best fit is wanted
+
+        Returns
+        -------
+        list of IsotopicFitRecord
+            The fitted isotopic patterns, in the same order as :attr:`averagine`. Patterns
+            which match only a single real peak at a charge state greater than 1 could never
+            be accepted, and patterns ruled out by :meth:`_prune_fit` could never be accepted
+            or beat `best`, so they are not scored and are omitted.
+        """
+        tids = [
+            averagine.isotopic_cluster(
+                peak.mz, charge, charge_carrier=charge_carrier,
+                truncate_after=truncate_after, ignore_below=ignore_below)
+            for averagine in self.averagine]
+        eids = self.match_shared_isotopic_distributions(tids, error_tolerance)
+        fits = []
+        for averagine, tid, eid in zip(self.averagine, tids, eids):
+            if charge > 1 and len(drop_placeholders(eid)) == 1:
+                continue
+            if self._prune_fit(eid, best):
+                continue
+            self.scale_theoretical_distribution(tid, eid)
+            score = self.scorer(self.peaklist, eid, tid)
+            fit = IsotopicFitRecord(peak, score, charge, tid, eid)
+            fit.data = averagine
+            fits.append(fit)
+        return fits
+
     def _fit_peaks_at_charges(self, peak_charge_set, error_tolerance, charge_carrier=PROTON,
-                              truncate_after=TRUNCATE_AFTER, ignore_below=IGNORE_BELOW):
+                              truncate_after=TRUNCATE_AFTER, ignore_below=IGNORE_BELOW, best_only=False):
         results = []
+        best = None
+        maximizing = self.scorer.is_maximizing()
         for peak, charge in peak_charge_set:
-            for averagine in self.averagine:
-                if peak.mz < 1:
-                    continue
-                fit = self.fit_theoretical_distribution(
-                    peak, error_tolerance, charge, averagine, charge_carrier=charge_carrier,
-                    truncate_after=truncate_after, ignore_below=ignore_below)
+            if peak.mz < 1:
+                continue
+            if self.use_shared_matching:
+                fits = self.fit_shared_theoretical_distributions(
+                    peak, error_tolerance, charge, charge_carrier=charge_carrier,
+                    truncate_after=truncate_after, ignore_below=ignore_below, best=best)
+            else:
+                fits = []
+                for averagine in self.averagine:
+                    fit = self.fit_theoretical_distribution(
+                        peak, error_tolerance, charge, averagine, charge_carrier=charge_carrier,
+                        truncate_after=truncate_after, ignore_below=ignore_below)
+                    fit.data = averagine
+                    fits.append(fit)
+            for fit in fits:
                 fit.missed_peaks = count_placeholders(fit.experimental)
-                fit.data = averagine
                 if len(drop_placeholders(fit.experimental)) == 1 and fit.charge > 1:
                     continue
                 if self.scorer.reject(fit):
                     continue
                 results.append(fit)
+                if best_only and (best is None or (fit.score > best if maximizing else fit.score < best)):
+                    best = fit.score
         return set(results)
 
 
@@ -1047,6 +1284,9 @@ class MultiAveragineDeconvoluter(MultiAveragineDeconvoluterBase, ExhaustivePeakS
         An object derived from IsotopicFitterBase which can evaluate isotopic fits
     verbose : bool
         How much diagnostic information to provide
+    use_shared_matching : bool
+        Whether to match experimental peaks once per (peak, charge) pair for all
+        averagine models. Defaults to :const:`True`
 
     References
     ----------
@@ -1062,6 +1302,7 @@ class MultiAveragineDeconvoluter(MultiAveragineDeconvoluterBase, ExhaustivePeakS
         self.scorer = scorer
         self.use_subtraction = use_subtraction
         self.scale_method = scale_method
+        self.use_shared_matching = kwargs.pop("shared_averagine_matching", True)
 
         cache_backend = dict
         if averagine is None:
@@ -1080,6 +1321,128 @@ class MultiAveragineDeconvoluter(MultiAveragineDeconvoluterBase, ExhaustivePeakS
             minimum_intensity, *args, **kwargs)
 
 
+class IsotopicFitCache(object):
+    """Memoizes the isotopic fits computed for each (seed peak, charge) pair across
+    the iterations of :meth:`PeakDependenceGraphDeconvoluterBase.deconvolute`.
+
+    Each entry records the intensities of the peaks in the m/z window its fits could
+    depend upon at the time they were computed. Whenever peaks may have been changed,
+    :meth:`advance` starts a new generation, and an entry from an earlier generation
+    is only reused if the intensities in its window are unchanged. This way fits in
+    regions untouched by subtraction are not matched, scaled and scored again.
+
+    Scorers which consider peaks outside of the isotopic pattern's window, such as
+    :class:`~.InterferenceDetection`-aware scorers, may see stale context when a
+    cached fit is reused.
+
+    Attributes
+    ----------
+    entries : dict
+        Maps (seed peak m/z, charge, search parameters) to the window, the intensity
+        state of the window, the fits computed for it and the generation it was last
+        validated in
+    widths : dict
+        Memoized isotopic pattern widths used to build the windows
+    generation : int
+        The number of times peak intensities may have changed
+    hits : int
+        The number of lookups answered from the cache
+    misses : int
+        The number of lookups which required fitting
+    invalidations : int
+        The number of entries discarded because their peaks' intensities changed
+    """
+    def __init__(self):
+        self.entries = {}
+        self.widths = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def clear(self):
+        self.entries.clear()
+        self.widths.clear()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def advance(self):
+        """Mark that the intensities of the peaks may have changed, so each entry must
+        be validated before it is next used.
+        """
+        self.generation += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def _state(deconvoluter, lo, hi):
+        return tuple([p.intensity for p in deconvoluter.between(lo, hi)])
+
+    def get(self, key, deconvoluter):
+        """Look up the fits stored for `key`, if the peaks they depend upon have not
+        changed since they were computed.
+
+        Parameters
+        ----------
+        key : tuple
+        deconvoluter : DeconvoluterBase
+            The deconvoluter whose :attr:`peaklist` the fits were computed from
+
+        Returns
+        -------
+        list of IsotopicFitRecord
+            The stored fits, or :const:`None` if there is no valid entry
+        """
+        try:
+            entry = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        if entry[4] != self.generation:
+            if self._state(deconvoluter, entry[0], entry[1]) != entry[2]:
+                del self.entries[key]
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            entry[4] = self.generation
+        self.hits += 1
+        return entry[3]
+
+    def put(self, key, lo, hi, fits, deconvoluter):
+        """Store `fits` for `key`, recording the current intensities of the peaks
+        between `lo` and `hi`.
+        """
+        self.entries[key] = [lo, hi, self._state(deconvoluter, lo, hi), fits, self.generation]
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / float(total)
+
+    def statistics(self):
+        """Summarize the cache's usage
+
+        Returns
+        -------
+        dict
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hit_rate,
+            "size": len(self.entries),
+        }
+
+    def __repr__(self):
+        return "IsotopicFitCache(%d entries, hit_rate=%0.3f)" % (len(self.entries), self.hit_rate)
+
+
 class PeakDependenceGraphDeconvoluterBase(ExhaustivePeakSearchDeconvoluterBase):
     """Extends the concept of :class:`ExhaustivePeakSearchDeconvoluterBase` to include a way to handle
     conflicting solutions which claim the same experimental peak.
@@ -1101,16 +1464,68 @@ class PeakDependenceGraphDeconvoluterBase(ExhaustivePeakSearchDeconvoluterBase):
         The maximum number of missing peaks to tolerate in an isotopic fit
     peak_dependency_network : PeakDependenceGraph
         The peak dependence graph onto which isotopic fit dependences on peaks
-        are constructed and solved.
+        are constructed and solved. The type of graph used may be controlled by
+        passing `peak_dependency_graph_type`, such as
+        :class:`~.ArrayPeakDependenceGraph` for very large spectra, and the strategy
+        used to select disjoint fits from each cluster may be set by passing
+        `subgraph_selection_method`. The total time that selection may take for
+        one spectrum is set by passing `subgraph_time_budget`, after which the remaining
+        clusters use the greedy selection.
+    time_budget : float
+        The number of seconds :meth:`deconvolute` may run before switching to
+        cheaper search settings. If :const:`None`, there is no time limit.
+    max_fits : int
+        The number of fits which may be added to :attr:`peak_dependency_network`
+        before switching to cheaper search settings. If :const:`None`, there is
+        no limit.
+    degraded_peak_count : int
+        The number of most intense peaks to continue searching from once the budget
+        has been exceeded
+    degraded : bool
+        Whether the most recent call to :meth:`deconvolute` exceeded its budget and
+        finished with reduced search settings
+    batch_subtraction : bool
+        Whether to subtract all of the isotopic patterns accepted in an iteration of
+        :meth:`deconvolute` at once using :meth:`apply_batch_subtraction`, tracking the
+        total remaining signal incrementally, instead of one pattern at a time
+    fit_cache : IsotopicFitCache
+        If `use_fit_cache` is passed, the cache used to reuse isotopic fits whose peaks
+        were not changed by subtraction between iterations of :meth:`deconvolute`,
+        otherwise :const:`None`
+    cluster_sizes : list of int
+        The number of fits in each connected cluster of :attr:`peak_dependency_network`
+        solved by the most recent call to :meth:`deconvolute`, over all of its iterations
+    subtraction_iterations : int
+        The number of times the most recent call to :meth:`deconvolute` populated and
+        solved :attr:`peak_dependency_network`
     """
     def __init__(self, peaklist, *args, **kwargs):
         max_missed_peaks = kwargs.pop("max_missed_peaks", 1)
+        graph_type = kwargs.pop("peak_dependency_graph_type", PeakDependenceGraph)
+        selection_method = kwargs.pop("subgraph_selection_method", "greedy")
+        subgraph_time_budget = kwargs.pop("subgraph_time_budget", SUBGRAPH_TIME_BUDGET)
         ExhaustivePeakSearchDeconvoluterBase.__init__(self)
-        self.peak_dependency_network = PeakDependenceGraph(
-            self.peaklist, maximize=self.scorer.is_maximizing())
+        self.peak_dependency_network = graph_type(
+            self.peaklist, maximize=self.scorer.is_maximizing(),
+            selection_method=selection_method, subgraph_time_budget=subgraph_time_budget)
         self.max_missed_peaks = max_missed_peaks
         self.fit_postprocessor = kwargs.pop("fit_postprocessor", None)
         self._priority_map = {}
+        self.time_budget = kwargs.pop("time_budget", None)
+        self.max_fits = kwargs.pop("max_fits", None)
+        self.degraded_peak_count = kwargs.pop("degraded_peak_count", 500)
+        self.degraded = False
+        self._deadline = None
+        self._fit_count = 0
+        self._degraded_peaks = None
+        self.batch_subtraction = kwargs.pop("batch_subtraction", False)
+        self._subtraction_queue = None
+        self._peak_mz_array = None
+        self._peak_intensity_array = None
+        self._total_signal = None
+        self.fit_cache = IsotopicFitCache() if kwargs.pop("use_fit_cache", False) else None
+        self.cluster_sizes = []
+        self.subtraction_iterations = 0
 
     @property
     def max_missed_peaks(self):
@@ -1120,6 +1535,99 @@ class PeakDependenceGraphDeconvoluterBase(ExhaustivePeakSearchDeconvoluterBase):
     def max_missed_peaks(self, value):
         self.peak_dependency_network.max_missed_peaks = value
 
+    def _fit_dependency_window(self, peak, charge, error_tolerance=ERROR_TOLERANCE, charge_carrier=PROTON,
+                               truncate_after=TRUNCATE_AFTER, ignore_below=IGNORE_BELOW):
+        """Compute the m/z interval containing every peak a fit seeded at `peak` with
+        `charge` could match.
+
+        The width of the theoretical isotopic pattern is memoized for each unit m/z bin,
+        measured at the upper edge of the bin and padded by one isotopic spacing so that
+        it covers every seed in the bin.
+
+        Returns
+        -------
+        lo : float
+        hi : float
+        """
+        widths = self.fit_cache.widths
+        key = (int(peak.mz), charge, charge_carrier, truncate_after, ignore_below)
+        try:
+            width = widths[key]
+        except KeyError:
+            averagines = self.averagine if isinstance(self.averagine, list) else [self.averagine]
+            width = 0
+            for averagine in averagines:
+                # Use the underlying model so the pattern cache used for fitting is left as is
+                tid = averagine.averagine.isotopic_cluster(
+                    int(peak.mz) + 1, charge, charge_carrier=charge_carrier,
+                    truncate_after=truncate_after, ignore_below=ignore_below)
+                width = max(width, tid[-1].mz - tid[0].mz)
+            width += isotopic_shift(charge)
+            widths[key] = width
+        hi = peak.mz + width
+        return peak.mz - peak.mz * error_tolerance, hi + hi * error_tolerance
+
+    def _fit_all_charge_states(self, peak, error_tolerance=ERROR_TOLERANCE, charge_range=(1, 8), left_search_limit=3,
+                               right_search_limit=3, use_charge_state_hint=False,
+                               recalculate_starting_peak=True, charge_carrier=PROTON,
+                               truncate_after=TRUNCATE_AFTER, ignore_below=IGNORE_BELOW, best_only=False):
+        """Carry out the fitting process for `peak`, reusing fits from :attr:`fit_cache`
+        when it is enabled and all fits are wanted.
+
+        Candidate (peak, charge) pairs are looked up in :attr:`fit_cache` by the seed peak's m/z,
+        which also identifies the placeholder seeds produced by :meth:`_find_next_putative_peak`,
+        and only the pairs without a valid entry are passed to :meth:`_fit_peaks_at_charges`.
+        The fits computed for those pairs, including the absence of any acceptable fit, are
+        then stored for later iterations.
+
+        See :meth:`ExhaustivePeakSearchDeconvoluterBase._fit_all_charge_states` for the parameters.
+
+        Returns
+        -------
+        set
+            The set of IsotopicFitRecord instances produced
+        """
+        cache = self.fit_cache
+        if cache is None or best_only:
+            return ExhaustivePeakSearchDeconvoluterBase._fit_all_charge_states(
+                self, peak, error_tolerance=error_tolerance, charge_range=charge_range,
+                left_search_limit=left_search_limit, right_search_limit=right_search_limit,
+                use_charge_state_hint=use_charge_state_hint,
+                recalculate_starting_peak=recalculate_starting_peak, charge_carrier=charge_carrier,
+                truncate_after=truncate_after, ignore_below=ignore_below, best_only=best_only)
+
+        target_peaks = self._get_all_peak_charge_pairs(
+            peak, error_tolerance=error_tolerance, charge_range=charge_range,
+            left_search_limit=left_search_limit, right_search_limit=right_search_limit,
+            use_charge_state_hint=use_charge_state_hint, recalculate_starting_peak=True)
+
+        params = (error_tolerance, charge_carrier, truncate_after, ignore_below)
+        results = set()
+        misses = set()
+        for seed, charge in target_peaks:
+            fits = cache.get((seed.mz, charge) + params, self)
+            if fits is None:
+                misses.add((seed, charge))
+            else:
+                results.update(fits)
+
+        if misses:
+            fitted = self._fit_peaks_at_charges(
+                misses, error_tolerance, charge_carrier=charge_carrier, truncate_after=truncate_after,
+                ignore_below=ignore_below)
+            results.update(fitted)
+            grouped = defaultdict(list)
+            for fit in fitted:
+                grouped[fit.seed_peak.mz, fit.charge].append(fit)
+            for seed, charge in misses:
+                lo, hi = self._fit_dependency_window(
+                    seed, charge, error_tolerance, charge_carrier=charge_carrier,
+                    truncate_after=truncate_after, ignore_below=ignore_below)
+                cache.put(
+                    (seed.mz, charge) + params, lo, hi,
+                    grouped.get((seed.mz, charge), []), self)
+        return results
+
     def _explore_local(self, peak, error_tolerance=ERROR_TOLERANCE, charge_range=(1, 8), left_search_limit=1,
                        right_search_limit=0, use_charge_state_hint=False, charge_carrier=PROTON,
                        truncate_after=TRUNCATE_AFTER, ignore_below=IGNORE_BELOW):
@@ -1189,10 +1697,38 @@ class PeakDependenceGraphDeconvoluterBase(ExhaustivePeakSearchDeconvoluterBase):
             if self.verbose:
                 info("Candidate: %r", candidate)
             self.peak_dependency_network.add_fit_dependence(candidate)
+            self._fit_count += 1
             results.discard(candidate)
 
         return i
 
+    def _start_budget(self):
+        self.degraded = False
+        self._degraded_peaks = None
+        self._fit_count = 0
+        self.peak_dependency_network.start_subgraph_budget()
+        if self.time_budget is not None:
+            self._deadline = time.time() + self.time_budget
+        else:
+            self._deadline = None
+
+    def _budget_exceeded(self):
+        if self.max_fits is not None and self._fit_count > self.max_fits:
+            return True
+        if self._deadline is not None and time.time() > self._deadline:
+            return True
+        return False
+
+    def _degrade(self):
+        """Switch to reduced search settings for the remainder of :meth:`deconvolute`,
+        only visiting the :attr:`degraded_peak_count` most intense peaks.
+        """
+        if not self.degraded:
+            logger.info("Deconvolution budget exceeded for %r, degrading search", self.peaklist)
+        self.degraded = True
+        peaks = sorted(self.peaklist, key=operator.attrgetter("intensity"), reverse=True)
+        self._degraded_peaks = {p.peak_count for p in peaks[:self.degraded_peak_count]}
+
     def populate_graph(self, error_tolerance=ERROR_TOLERANCE, charge_range=(1, 8), left_search_limit=1,
                        right_search_limit=0, use_charge_state_hint=False, charge_carrier=PROTON,
                        truncate_after=TRUNCATE_AFTER, ignore_below=IGNORE_BELOW):
@@ -1221,9 +1757,18 @@ class PeakDependenceGraphDeconvoluterBase(ExhaustivePeakSearchDeconvoluterBase):
             to be truncated, excluding trailing peaks which do not contribute substantially to
             the overall shape of the isotopic pattern.
         """
+        check_budget = self._deadline is not None or self.max_fits is not None
         for peak in self.peaklist:
             if peak in self._priority_map or peak.intensity < self.minimum_intensity:
                 continue
+            if check_budget:
+                if not self.degraded and self._budget_exceeded():
+                    self._degrade()
+                if self.degraded:
+                    if peak.peak_count not in self._degraded_peaks:
+                        continue
+                    left_search_limit = min(left_search_limit, 1)
+                    right_search_limit = 0
             out = self._explore_local(
                 peak, error_tolerance=error_tolerance, charge_range=charge_range,
                 left_search_limit=left_search_limit, right_search_limit=right_search_limit,
@@ -1251,6 +1796,7 @@ class PeakDependenceGraphDeconvoluterBase(ExhaustivePeakSearchDeconvoluterBase):
             back-out the neutral mass of the deconvoluted result
         """
         disjoint_envelopes = self.peak_dependency_network.find_non_overlapping_intervals()
+        self.cluster_sizes.extend([len(cluster) for cluster in disjoint_envelopes])
         i = 0
         for cluster in disjoint_envelopes:
             disjoint_best_fits = cluster.disjoint_best_fits()
@@ -1284,7 +1830,77 @@ class PeakDependenceGraphDeconvoluterBase(ExhaustivePeakSearchDeconvoluterBase):
                 self._deconvoluted_peaks.append(dpeak)
                 i += 1
                 if self.use_subtraction:
-                    self.subtraction(tid, error_tolerance)
+                    if self._subtraction_queue is not None:
+                        self._subtraction_queue.append(tid)
+                    else:
+                        self.subtraction(tid, error_tolerance)
+        if self.use_subtraction and self.fit_cache is not None:
+            self.fit_cache.advance()
+
+    def _prepare_batch_subtraction(self):
+        self._peak_mz_array = np.array([p.mz for p in self.peaklist], dtype=float)
+        self._peak_intensity_array = np.array([p.intensity for p in self.peaklist], dtype=float)
+        self._total_signal = self._peak_intensity_array.sum()
+        self._subtraction_queue = []
+
+    def _finish_batch_subtraction(self):
+        self._subtraction_queue = None
+        self._peak_mz_array = None
+        self._peak_intensity_array = None
+        self._total_signal = None
+
+    def apply_batch_subtraction(self, error_tolerance=ERROR_TOLERANCE):
+        """Subtract the signal of every isotopic pattern queued since the last call
+        from the intensity array mirroring :attr:`peaklist` in a single pass, then
+        write the new intensities back to the affected peaks.
+
+        Each theoretical peak is matched to the nearest experimental peak within
+        `error_tolerance`. All of the theoretical signal matched to the same experimental
+        peak is subtracted together, using the same rule as :meth:`subtraction`: if the
+        remainder is negative, or more than 70% of the peak would be removed, the peak's
+        intensity is set to 1.
+
+        Parameters
+        ----------
+        error_tolerance : float, optional
+            Parts-per-million mass accuracy error tolerance to permit when
+            finding matches for queued patterns
+
+        Returns
+        -------
+        float
+            The total signal remaining in :attr:`peaklist`
+        """
+        queue = self._subtraction_queue
+        if not queue:
+            return self._total_signal
+        mzs = np.array([p.mz for tid in queue for p in tid], dtype=float)
+        intensities = np.array([p.intensity for tid in queue for p in tid], dtype=float)
+        self._subtraction_queue = []
+
+        peak_mzs = self._peak_mz_array
+        if len(peak_mzs) == 0:
+            return self._total_signal
+        right = np.clip(np.searchsorted(peak_mzs, mzs), 0, len(peak_mzs) - 1)
+        left = np.clip(right - 1, 0, len(peak_mzs) - 1)
+        right_error = np.abs(peak_mzs[right] - mzs)
+        left_error = np.abs(peak_mzs[left] - mzs)
+        nearest = np.where(left_error < right_error, left, right)
+        matched = np.abs(peak_mzs[nearest] - mzs) / mzs <= error_tolerance
+        nearest = nearest[matched]
+        removed = np.bincount(nearest, weights=intensities[matched], minlength=len(peak_mzs))
+        touched = np.flatnonzero(removed)
+
+        existing = self._peak_intensity_array[touched]
+        remainder = existing - removed[touched]
+        remainder[(remainder < 0) | (removed[touched] > existing * 0.7)] = 1.
+        self._peak_intensity_array[touched] = remainder
+        self._total_signal -= (existing - remainder).sum()
+
+        peaks = self.peaklist.peaks
+        for i, intensity in zip(touched.tolist(), remainder.tolist()):
+            peaks[i].intensity = intensity
+        return self._total_signal
 
     def targeted_deconvolution(self, peak, error_tolerance=ERROR_TOLERANCE, charge_range=(1, 8), use_charge_state_hint=False,
                                left_search_limit=3, right_search_limit=3, charge_carrier=PROTON,
@@ -1375,8 +1991,19 @@ class PeakDependenceGraphDeconvoluterBase(ExhaustivePeakSearchDeconvoluterBase):
         if not self.use_subtraction:
             iterations = 1
 
-        begin_signal = sum([p.intensity for p in self.peaklist])
+        self._start_budget()
+        self.cluster_sizes = []
+        self.subtraction_iterations = 0
+        if self.fit_cache is not None:
+            self.fit_cache.advance()
+        batch = self.batch_subtraction and self.use_subtraction
+        if batch:
+            self._prepare_batch_subtraction()
+            begin_signal = self._total_signal
+        else:
+            begin_signal = sum([p.intensity for p in self.peaklist])
         for i in range(iterations):
+            self.subtraction_iterations = i + 1
             self.peak_dependency_network.reset()
             self.populate_graph(
                 error_tolerance=error_tolerance, charge_range=charge_range,
@@ -1389,12 +2016,92 @@ class PeakDependenceGraphDeconvoluterBase(ExhaustivePeakSearchDeconvoluterBase):
                 error_tolerance=error_tolerance)
             self.select_best_disjoint_subgraphs(error_tolerance, charge_carrier)
             self._slice_cache.clear()
-            end_signal = sum([p.intensity for p in self.peaklist]) + 1
+            if batch:
+                end_signal = self.apply_batch_subtraction(error_tolerance) + 1
+            else:
+                end_signal = sum([p.intensity for p in self.peaklist]) + 1
 
             if (begin_signal - end_signal) / end_signal < convergence:
                 break
+            # Once over budget, do not spend any more subtraction iterations
+            if self.degraded or self._budget_exceeded():
+                if not self.degraded:
+                    self._degrade()
+                break
             begin_signal = end_signal
 
+        if batch:
+            self._finish_batch_subtraction()
+
+        if self.merge_isobaric_peaks:
+            self._deconvoluted_peaks = self._merge_peaks(
+                self._deconvoluted_peaks)
+
+        return DeconvolutedPeakSet(list(self._deconvoluted_peaks))._reindex()
+
+    def deconvolute_targets(self, error_tolerance=ERROR_TOLERANCE, charge_range=(1, 8),
+                            use_charge_state_hint=False, left_search_limit=1,
+                            right_search_limit=0, charge_carrier=PROTON,
+                            truncate_after=TRUNCATE_AFTER, ignore_below=IGNORE_BELOW):
+        """Deconvolute only the neighborhoods of the peaks passed to :meth:`targeted_deconvolution`.
+
+        Every peak spanned by a fit already in :attr:`peak_dependency_network` is explored as
+        :meth:`populate_graph` would, so that the targeted fits compete with the fits of the
+        peaks around them, and then the graph is solved once with :meth:`select_best_disjoint_subgraphs`.
+        The rest of the spectrum is never visited and no subtraction iterations are performed,
+        so the solutions are those a single pass of :meth:`deconvolute` would find in these regions.
+
+        Parameters
+        ----------
+        error_tolerance : float, optional
+            The parts-per-million error tolerance in m/z to search with. Defaults to ERROR_TOLERANCE
+        charge_range : tuple, optional
+            The range of charge states to consider. Defaults to (1, 8)
+        left_search_limit : int, optional
+            The number of steps to search to the left of each neighboring peak. Defaults to 1
+        right_search_limit : int, optional
+            The number of steps to search to the right of each neighboring peak. Defaults to 0
+        use_charge_state_hint : bool, optional
+            Whether or not to try to estimate the upper limit of the charge states to consider
+            using :meth:`_update_charge_bounds_with_prediction`. Defaults to False
+        charge_carrier : float, optional
+            The mass of the charge carrier. Defaults to `PROTON`
+        truncate_after : float, optional
+            The percent of intensity to ensure is included in a theoretical isotopic pattern
+            starting from the monoisotopic peak.
+        ignore_below : float, optional
+            The minimum relative abundance to consider a peak in a theoretical isotopic
+            pattern
+
+        Returns
+        -------
+        DeconvolutedPeakSet
+        """
+        self._start_budget()
+        self.cluster_sizes = []
+        self.subtraction_iterations = 1
+        neighborhood = {}
+        for fit in list(self.peak_dependency_network.dependencies):
+            experimental = drop_placeholders(fit.experimental)
+            if not experimental:
+                continue
+            for peak in self.peaklist.between(experimental[0].mz, experimental[-1].mz):
+                neighborhood[peak.index] = peak
+        for index in sorted(neighborhood):
+            peak = neighborhood[index]
+            if peak in self._priority_map or peak.intensity < self.minimum_intensity:
+                continue
+            self._explore_local(
+                peak, error_tolerance=error_tolerance, charge_range=charge_range,
+                left_search_limit=left_search_limit, right_search_limit=right_search_limit,
+                use_charge_state_hint=use_charge_state_hint, charge_carrier=charge_carrier,
+                truncate_after=truncate_after, ignore_below=ignore_below)
+        self.postprocess_fits(
+            charge_range=charge_range,
+            charge_carrier=charge_carrier,
+            error_tolerance=error_tolerance)
+        self.select_best_disjoint_subgraphs(error_tolerance, charge_carrier)
+
         if self.merge_isobaric_peaks:
             self._deconvoluted_peaks = self._merge_peaks(
                 self._deconvoluted_peaks)
@@ -1430,10 +2137,46 @@ class CompositionListDeconvoluterBase(object):
     ----------
     composition_list : Sequence of Mapping
         A series of objects which represent elemental compositions and support
-        the Mapping interface to access their individual elements.
+        the Mapping interface to access their individual elements. If this is a
+        :class:`~.CompositionLibrary`, precomputed isotopic patterns are used and
+        only the compositions overlapping the spectrum's m/z range are searched.
     """
     def __init__(self, composition_list):
         self.composition_list = composition_list
+        self._library = None
+
+    def compositions_to_search(self, charge_range=(1, 8), charge_carrier=PROTON, truncate_after=TRUNCATE_AFTER):
+        """Select the compositions from :attr:`composition_list` to search against
+        this spectrum.
+
+        When :attr:`composition_list` is a :class:`~.CompositionLibrary` built with
+        compatible parameters, only those compositions with an isotopic pattern
+        overlapping the m/z range of :attr:`peaklist` are returned, and their precomputed
+        isotopic patterns are used by :meth:`generate_theoretical_isotopic_cluster`.
+
+        Parameters
+        ----------
+        charge_range : tuple
+            The charge state range to generate the isotopic patterns for
+        charge_carrier : float, optional
+            The mass of the charge carrier. Defaults to `PROTON`
+        truncate_after : float, optional
+            The percent of intensity to ensure is included in a theoretical isotopic pattern
+
+        Returns
+        -------
+        Sequence of Mapping
+        """
+        self._library = None
+        library = self.composition_list
+        if not isinstance(library, CompositionLibrary):
+            return library
+        if not library.is_compatible(charge_range, charge_carrier, truncate_after):
+            return library.compositions
+        self._library = library
+        if len(self.peaklist) == 0:
+            return []
+        return library.compositions_between(self.peaklist[0].mz, self.peaklist[-1].mz)
 
     def generate_theoretical_isotopic_cluster(self, composition, charge, truncate_after=TRUNCATE_AFTER,
                                               mass_shift=None, charge_carrier=PROTON):
@@ -1459,19 +2202,23 @@ class CompositionListDeconvoluterBase(object):
 
         Returns
         -------
-        list of TheoreticalPeak
+        TheoreticalIsotopicPattern
             The theoretical isotopic pattern generated
         """
-        cumsum = 0
-        result = []
-        for peak in isotopic_variants(composition, charge=charge, charge_carrier=charge_carrier):
-            cumsum += peak.intensity
-            result.append(peak)
-            if cumsum >= truncate_after:
-                break
+        result = None
+        if self._library is not None:
+            result = self._library.isotopic_cluster(composition, charge)
+        if result is None:
+            cumsum = 0
+            result = []
+            for peak in isotopic_variants(composition, charge=charge, charge_carrier=charge_carrier):
+                cumsum += peak.intensity
+                result.append(peak)
+                if cumsum >= truncate_after:
+                    break
         if mass_shift is not None:
             shift_isotopic_pattern(mass_shift / abs(charge), result)
-        return result
+        return TheoreticalIsotopicPattern(result, result)
 
     def recalibrate_theoretical_mz(self, theoretical_distribution, experimental_mz):
         shift_isotopic_pattern(experimental_mz, theoretical_distribution)
@@ -1514,7 +2261,7 @@ class CompositionListDeconvoluterBase(object):
         if monoisotopic_peak is not None:
             tid = self.recalibrate_theoretical_mz(tid, monoisotopic_peak.mz)
         eid = self.match_theoretical_isotopic_distribution(
-            tid, error_tolerance)
+            tid.truncated_tid, error_tolerance)
 
         missed_peaks = count_placeholders(eid)
 
@@ -1522,7 +2269,7 @@ class CompositionListDeconvoluterBase(object):
             return None
 
         self.scale_theoretical_distribution(tid, eid)
-        score = self.scorer.evaluate(self.peaklist, eid, tid)
+        score = self.scorer.evaluate(self.peaklist, eid, tid.truncated_tid)
         fit = IsotopicFitRecord(None, score, charge, tid, eid)
         fit.missed_peaks = missed_peaks
         return fit
@@ -1609,7 +2356,7 @@ class CompositionListDeconvoluter(CompositionListDeconvoluterBase, DeconvoluterB
 
     def deconvolute(self, error_tolerance=ERROR_TOLERANCE, charge_range=(1, 8), charge_carrier=PROTON,
                     truncate_after=TRUNCATE_AFTER, mass_shift=None, **kwargs):
-        for composition in self.composition_list:
+        for composition in self.compositions_to_search(charge_range, charge_carrier, truncate_after):
             self.deconvolute_composition(composition, error_tolerance=error_tolerance,
                                          charge_range=charge_range, charge_carrier=charge_carrier,
                                          truncate_after=truncate_after, mass_shift=mass_shift)
@@ -1622,12 +2369,16 @@ class CompositionListPeakDependenceGraphDeconvoluter(CompositionListDeconvoluter
                  use_subtraction=False, scale_method='sum',
                  verbose=False, **kwargs):
         max_missed_peaks = kwargs.get("max_missed_peaks", 1)
+        graph_type = kwargs.pop("peak_dependency_graph_type", PeakDependenceGraph)
+        selection_method = kwargs.pop("subgraph_selection_method", "greedy")
+        subgraph_time_budget = kwargs.pop("subgraph_time_budget", SUBGRAPH_TIME_BUDGET)
         super(CompositionListPeakDependenceGraphDeconvoluter, self).__init__(
             peaklist, composition_list, scorer, use_subtraction, scale_method,
             verbose)
 
-        self.peak_dependency_network = PeakDependenceGraph(
-            self.peaklist, maximize=self.scorer.is_maximizing(), **kwargs)
+        self.peak_dependency_network = graph_type(
+            self.peaklist, maximize=self.scorer.is_maximizing(),
+            selection_method=selection_method, subgraph_time_budget=subgraph_time_budget, **kwargs)
         self.max_missed_peaks = max_missed_peaks
 
     @property
@@ -1657,7 +2408,7 @@ class CompositionListPeakDependenceGraphDeconvoluter(CompositionListDeconvoluter
 
     def populate_graph(self, error_tolerance=ERROR_TOLERANCE, charge_range=(1, 8), truncate_after=TRUNCATE_AFTER,
                        charge_carrier=PROTON, mass_shift=None):
-        for composition in self.composition_list:
+        for composition in self.compositions_to_search(charge_range, charge_carrier, truncate_after):
             self.deconvolute_composition(composition, error_tolerance, charge_range,
                                          truncate_after=truncate_after, charge_carrier=charge_carrier,
                                          mass_shift=mass_shift)
@@ -1744,7 +2495,7 @@ class HybridAveragineCompositionListPeakDependenceGraphDeconvoluter(
     def populate_graph(self, error_tolerance=ERROR_TOLERANCE, charge_range=(1, 8), left_search_limit=1,
                        right_search_limit=0, use_charge_state_hint=False, charge_carrier=PROTON,
                        truncate_after=TRUNCATE_AFTER, mass_shift=None):
-        for composition in self.composition_list:
+        for composition in self.compositions_to_search(charge_range, charge_carrier, truncate_after):
             self.deconvolute_composition(
                 composition, error_tolerance, charge_range=charge_range,
                 truncate_after=truncate_after, charge_carrier=charge_carrier,
@@ -1762,12 +2513,485 @@ class HybridAveragineCompositionListPeakDependenceGraphDeconvoluter(
             isotopic_cluster, error_tolerance)
 
 
+def envelope_search_width(averagine, mz, charge_range=(1, 8), truncate_after=TRUNCATE_AFTER,
+                          search_steps=3):
+    """Estimate the widest span in m/z that a single isotopic fit seeded at or
+    below `mz` may cover, including the extra isotopic steps searched to either side
+    of the seed peak.
+
+    Parameters
+    ----------
+    averagine : Averagine, AveragineCache, or list
+        The model or models used to generate theoretical isotopic patterns
+    mz : float
+        The largest m/z a fit may be seeded at
+    charge_range : tuple, optional
+        The range of charge states to consider. Defaults to (1, 8)
+    truncate_after : float, optional
+        The percent of intensity to ensure is included in a theoretical isotopic pattern
+    search_steps : int, optional
+        The number of extra isotopic steps to allow for. Defaults to 3
+
+    Returns
+    -------
+    float
+    """
+    if not isinstance(averagine, (list, tuple)):
+        averagine = [averagine]
+    width = 0.
+    for model in averagine:
+        for charge in charge_range_(*charge_range):
+            charge = abs(charge)
+            tid = model.isotopic_cluster(mz, charge, truncate_after=truncate_after)
+            span = tid[len(tid) - 1].mz - tid[0].mz + isotopic_shift(charge) * search_steps
+            if span > width:
+                width = span
+    return width
+
+
+def partition_peak_index(peaklist, gap_width, n_chunks, margin=None):
+    """Split `peaklist` into `n_chunks` or fewer independent windows at gaps between
+    adjacent peaks wider than `gap_width`.
+
+    Each window owns the m/z interval between the midpoints of the gaps it was split at,
+    and holds copies of the peaks in that interval plus any peaks within `margin` of its
+    boundaries so that isotopic searches near the boundary see the same neighborhood.
+    If `peaklist` has signal arrays, each window keeps only the slice of them under its
+    peaks, and its peaks' :attr:`index` refer to positions in that slice.
+
+    Parameters
+    ----------
+    peaklist : ms_peak_picker.PeakIndex
+        The peaks to partition
+    gap_width : float
+        The smallest gap between adjacent peaks to split at
+    n_chunks : int
+        The largest number of windows to produce. Windows are balanced by peak count.
+    margin : float, optional
+        The width of the overlap region to include on either side of each window.
+        Defaults to `gap_width`
+
+    Returns
+    -------
+    list of tuple
+        Each window as `(lower_bound, upper_bound, PeakIndex)`
+    """
+    if margin is None:
+        margin = gap_width
+    peaks = list(peaklist)
+    n = len(peaks)
+    if n < 2 or n_chunks < 2:
+        return [(-float('inf'), float('inf'), peaklist)]
+    mzs = np.array([p.mz for p in peaks])
+    splits = np.flatnonzero(np.diff(mzs) > gap_width) + 1
+    target_size = float(n) / n_chunks
+    cuts = []
+    last = 0
+    for split in splits:
+        if split - last >= target_size and len(cuts) < n_chunks - 1:
+            cuts.append(split)
+            last = split
+    if not cuts:
+        return [(-float('inf'), float('inf'), peaklist)]
+    bounds = [-float('inf')] + [(mzs[c - 1] + mzs[c]) / 2. for c in cuts] + [float('inf')]
+    mz_array = peaklist.mz_array
+    intensity_array = peaklist.intensity_array
+    if mz_array is not None:
+        mz_array = np.asarray(mz_array)
+        intensity_array = np.asarray(intensity_array)
+    windows = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        start = np.searchsorted(mzs, lo - margin, side='left')
+        end = np.searchsorted(mzs, hi + margin, side='left')
+        window_peaks = [p.clone() for p in peaks[start:end]]
+        window_mz_array = window_intensity_array = None
+        if mz_array is not None and window_peaks:
+            # Keep only the signal under the window's peaks, and make each peak's `index`
+            # refer to its position in that slice of the signal arrays
+            half_width = max(p.full_width_at_half_max for p in window_peaks)
+            raw_start = np.searchsorted(mz_array, window_peaks[0].mz - half_width, side='left')
+            raw_end = np.searchsorted(mz_array, window_peaks[-1].mz + half_width, side='right')
+            window_mz_array = mz_array[raw_start:raw_end].copy()
+            window_intensity_array = intensity_array[raw_start:raw_end].copy()
+            for peak in window_peaks:
+                peak.index -= raw_start
+        peak_set = PeakSet(window_peaks)
+        peak_set.reindex()
+        windows.append((lo, hi, PeakIndex(window_mz_array, window_intensity_array, peak_set)))
+    return windows
+
+
+class DeconvolutionStatistics(Base):
+    """Timings and counters describing the work done by one call to :func:`deconvolute_peaks`.
+
+    Counters which a deconvoluter type does not keep are left at zero.
+
+    Attributes
+    ----------
+    peak_count : int
+        The number of peaks in the spectrum
+    priority_count : int
+        The number of entries in the priority list
+    deconvoluted_peak_count : int
+        The number of peaks in the deconvoluted peak set
+    scored_fits : int
+        The number of isotopic fits which were scored
+    pruned_fits : int
+        The number of isotopic fits discarded by their score bound without being scored
+    cluster_sizes : list of int
+        The number of fits in each connected cluster of the peak dependence graph,
+        over all subtraction iterations
+    subtraction_iterations : int
+        The number of times the peak dependence graph was populated and solved
+    averagine_cache_hits : int
+        The number of theoretical isotopic patterns served from an :class:`~.AveragineCache`
+    averagine_cache_misses : int
+        The number of theoretical isotopic patterns an :class:`~.AveragineCache` had to compute
+    degraded : bool
+        Whether the deconvoluter exceeded its budget
+    timings : dict
+        The seconds spent on each phase, ``"targeted"`` deconvolution of the priority
+        list, the full spectrum ``"deconvolute"`` step, and ``"extract"``-ing the priority
+        list's solutions
+    """
+    def __init__(self, peak_count=0, priority_count=0):
+        self.peak_count = peak_count
+        self.priority_count = priority_count
+        self.deconvoluted_peak_count = 0
+        self.scored_fits = 0
+        self.pruned_fits = 0
+        self.cluster_sizes = []
+        self.subtraction_iterations = 0
+        self.averagine_cache_hits = 0
+        self.averagine_cache_misses = 0
+        self.degraded = False
+        self.timings = OrderedDict()
+        self._cache_state = (0, 0)
+
+    @property
+    def fits_explored(self):
+        return self.scored_fits + self.pruned_fits
+
+    @property
+    def averagine_cache_hit_rate(self):
+        total = self.averagine_cache_hits + self.averagine_cache_misses
+        if total == 0:
+            return 0.0
+        return self.averagine_cache_hits / float(total)
+
+    @staticmethod
+    def _averagine_cache_state(deconvoluter):
+        caches = getattr(deconvoluter, "averagine", None)
+        if not isinstance(caches, (list, tuple)):
+            caches = [caches]
+        hits = 0
+        misses = 0
+        for cache in caches:
+            hits += getattr(cache, "hits", 0)
+            misses += getattr(cache, "misses", 0)
+        return hits, misses
+
+    def begin(self, deconvoluter):
+        """Note the state of `deconvoluter`'s averagine caches, which may be
+        shared with other deconvoluters, before it does any work.
+        """
+        self._cache_state = self._averagine_cache_state(deconvoluter)
+
+    def collect(self, deconvoluter):
+        """Read the counters of `deconvoluter` after it has finished.
+        """
+        self.scored_fits += getattr(deconvoluter, "scored_fits", 0)
+        self.pruned_fits += getattr(deconvoluter, "pruned_fits", 0)
+        self.cluster_sizes.extend(getattr(deconvoluter, "cluster_sizes", ()))
+        self.subtraction_iterations = max(
+            self.subtraction_iterations, getattr(deconvoluter, "subtraction_iterations", 0))
+        self.degraded |= getattr(deconvoluter, "degraded", False)
+        hits, misses = self._averagine_cache_state(deconvoluter)
+        self.averagine_cache_hits += hits - self._cache_state[0]
+        self.averagine_cache_misses += misses - self._cache_state[1]
+
+    def merge(self, other):
+        """Add the counters of `other`, which describes another part of the same
+        spectrum, to this instance. Timings are not merged.
+        """
+        self.scored_fits += other.scored_fits
+        self.pruned_fits += other.pruned_fits
+        self.cluster_sizes.extend(other.cluster_sizes)
+        self.subtraction_iterations = max(self.subtraction_iterations, other.subtraction_iterations)
+        self.averagine_cache_hits += other.averagine_cache_hits
+        self.averagine_cache_misses += other.averagine_cache_misses
+        self.degraded |= other.degraded
+
+    def to_dict(self):
+        """Summarize the statistics as a JSON-serializable :class:`dict`, reducing
+        :attr:`cluster_sizes` to their count, total, mean and maximum.
+
+        Returns
+        -------
+        dict
+        """
+        n_clusters = len(self.cluster_sizes)
+        graph_fits = sum(self.cluster_sizes)
+        return {
+            "peak_count": self.peak_count,
+            "priority_count": self.priority_count,
+            "deconvoluted_peak_count": self.deconvoluted_peak_count,
+            "scored_fits": self.scored_fits,
+            "pruned_fits": self.pruned_fits,
+            "fits_explored": self.fits_explored,
+            "cluster_count": n_clusters,
+            "graph_fits": graph_fits,
+            "mean_cluster_size": graph_fits / float(n_clusters) if n_clusters else 0.0,
+            "max_cluster_size": max(self.cluster_sizes) if n_clusters else 0,
+            "subtraction_iterations": self.subtraction_iterations,
+            "averagine_cache_hits": self.averagine_cache_hits,
+            "averagine_cache_misses": self.averagine_cache_misses,
+            "averagine_cache_hit_rate": self.averagine_cache_hit_rate,
+            "degraded": self.degraded,
+            "timings": dict(self.timings),
+        }
+
+    def __repr__(self):
+        return ("DeconvolutionStatistics(peak_count=%d, deconvoluted_peak_count=%d, fits_explored=%d, "
+                "subtraction_iterations=%d)") % (
+            self.peak_count, self.deconvoluted_peak_count, self.fits_explored,
+            self.subtraction_iterations)
+
+
+class _WindowPriorityTarget(object):
+    """A minimal stand-in for a priority target that can be cheaply sent
+    to a worker process, re-locating its peak by m/z in the worker's window.
+    """
+    def __init__(self, peak, charge_range):
+        self.peak = peak
+        self.charge_range = charge_range
+
+    def charge_range_hint(self, charge_range):
+        return self.charge_range
+
+
+def _deconvolute_window(task):
+    peaklist, decon_config, priority_list, kwargs = task
+    if isinstance(peaklist, ArrayBundle):
+        peaklist = peak_index_from_arrays(peaklist)
+    result = deconvolute_peaks(peaklist, decon_config, priority_list=priority_list, **kwargs)
+    for error in result.errors:
+        # Do not send the whole peak dependence graph back to the parent process
+        if hasattr(error, 'graph'):
+            error.graph = None
+    # Sending the peaks and the priority results in the same message preserves
+    # their shared identity
+    return list(result.peak_set), result.priorities, result.errors, result.degraded, result.statistics
+
+
+_partition_pool = None
+_partition_pool_size = 0
+
+
+def _get_partition_pool(n_processes):
+    """Get the process pool used to deconvolute the windows of a partitioned spectrum,
+    starting it on first use and re-using it for every following spectrum deconvoluted
+    with the same number of processes.
+    """
+    global _partition_pool, _partition_pool_size
+    if _partition_pool is not None and _partition_pool_size != n_processes:
+        close_partition_pool()
+    if _partition_pool is None:
+        _partition_pool = multiprocessing.Pool(n_processes)
+        _partition_pool_size = n_processes
+    return _partition_pool
+
+
+def close_partition_pool():
+    """Stop the worker processes started by :func:`deconvolute_peaks` to deconvolute
+    spectra with `n_processes` greater than 1. They are otherwise stopped when the
+    interpreter exits.
+    """
+    global _partition_pool, _partition_pool_size
+    if _partition_pool is not None:
+        _partition_pool.close()
+        _partition_pool.join()
+        _partition_pool = None
+        _partition_pool_size = 0
+
+
+atexit.register(close_partition_pool)
+
+
+def _deconvolute_peaks_partitioned(peaklist, decon_config, priority_list, n_processes, charge_range,
+                                   error_tolerance, truncate_after, left_search_limit, right_search_limit,
+                                   collect_statistics=False, **kwargs):
+    start = time.time()
+    if priority_list is None:
+        priority_list = []
+    search_steps = max(left_search_limit, right_search_limit,
+                       kwargs.get("left_search_limit_for_priorities") or 0,
+                       kwargs.get("right_search_limit_for_priorities") or 0) + 1
+    max_mz = max(p.mz for p in peaklist) if len(peaklist) else 0
+    width = envelope_search_width(
+        decon_config.get("averagine", peptide), max_mz, charge_range, truncate_after,
+        search_steps)
+    windows = partition_peak_index(peaklist, width, n_processes * 4)
+
+    # Route each priority target to the window which owns its m/z
+    routes = []
+    window_targets = [[] for _ in windows]
+    for p in priority_list:
+        try:
+            target_info = p
+            p = target_info.peak
+            hinted_charge_range = target_info.charge_range_hint(charge_range)
+        except AttributeError:
+            hinted_charge_range = charge_range
+        mz = p.mz if isinstance(p, FittedPeak) else p
+        for k, (lo, hi, _) in enumerate(windows):
+            if lo <= mz < hi:
+                break
+        routes.append((k, len(window_targets[k])))
+        window_targets[k].append(_WindowPriorityTarget(mz, hinted_charge_range))
+
+    kwargs.update(dict(
+        charge_range=charge_range, error_tolerance=error_tolerance, truncate_after=truncate_after,
+        left_search_limit=left_search_limit, right_search_limit=right_search_limit,
+        collect_statistics=collect_statistics))
+    if len(windows) == 1:
+        results = [_deconvolute_window((windows[0][2], dict(decon_config), window_targets[0], kwargs))]
+    else:
+        # The windows are sent as column arrays, as pickling a peak does not
+        # carry all of its attributes with every build of ms_peak_picker
+        tasks = [(ArrayBundle(peak_index_to_arrays(window)), dict(decon_config), targets, kwargs)
+                 for (_, _, window), targets in zip(windows, window_targets)]
+        results = _get_partition_pool(n_processes).map(_deconvolute_window, tasks)
+
+    # Keep the solutions each window owns. A solution reported for one of a window's
+    # priority targets is kept even if it lies in the overlap with a neighboring window.
+    owned = []
+    overlapping = []
+    errors = []
+    degraded = False
+    statistics = DeconvolutionStatistics(len(peaklist), len(priority_list)) if collect_statistics else None
+    for k, ((lo, hi, _), (window_peaks, priorities, window_errors, window_degraded, window_statistics)) in enumerate(
+            zip(windows, results)):
+        claimed = {id(pr) for pr in priorities if pr is not None}
+        for peak in window_peaks:
+            if lo <= peak.mz < hi:
+                owned.append((peak, k))
+            elif id(peak) in claimed:
+                overlapping.append((peak, k))
+        errors.extend(window_errors)
+        degraded |= window_degraded
+        if statistics is not None:
+            statistics.merge(window_statistics)
+
+    # Only a solution kept from the overlap can duplicate one found by the window
+    # owning its m/z, in which case the better of the two is kept
+    maximize = decon_config.get("scorer", penalized_msdeconv).is_maximizing()
+    by_charge = defaultdict(list)
+    for peak, k in owned:
+        by_charge[peak.charge].append((peak.neutral_mass, k, peak))
+    for entries in by_charge.values():
+        entries.sort(key=operator.itemgetter(0))
+    replaced = {}
+    for peak, k in overlapping:
+        entries = by_charge[peak.charge]
+        masses = [entry[0] for entry in entries]
+        i = bisect_left(masses, peak.neutral_mass * (1 - error_tolerance))
+        duplicate = None
+        while i < len(entries) and entries[i][0] <= peak.neutral_mass * (1 + error_tolerance):
+            if entries[i][1] != k and abs(
+                    entries[i][0] - peak.neutral_mass) / peak.neutral_mass < error_tolerance:
+                duplicate = i
+                break
+            i += 1
+        if duplicate is None:
+            entries.insert(bisect_left(masses, peak.neutral_mass), (peak.neutral_mass, k, peak))
+            continue
+        other = entries[duplicate][2]
+        if (peak.score > other.score) == maximize and peak.score != other.score:
+            replaced[id(other)] = peak
+            entries[duplicate] = (peak.neutral_mass, k, peak)
+        else:
+            replaced[id(peak)] = other
+    kept = [entry[2] for entries in by_charge.values() for entry in entries]
+
+    priority_list_results = []
+    for k, j in routes:
+        result = results[k][1][j]
+        if result is not None:
+            result = replaced.get(id(result), result)
+        priority_list_results.append(result)
+
+    peak_set = DeconvolutedPeakSet(kept)._reindex()
+    if statistics is not None:
+        statistics.deconvoluted_peak_count = len(peak_set)
+        statistics.timings["deconvolute"] = time.time() - start
+    return DeconvolutionProcessResult(
+        None, peak_set, priority_list_results, errors,
+        degraded=degraded, statistics=statistics)
+
+
 def deconvolute_peaks(peaklist,
                       decon_config=None, charge_range=(1, 8), error_tolerance=ERROR_TOLERANCE, priority_list=None,
                       use_charge_state_hint_for_priorities=False, left_search_limit=3, right_search_limit=3,
                       left_search_limit_for_priorities=None, right_search_limit_for_priorities=None,
                       verbose_priorities=False, verbose=False, charge_carrier=PROTON, truncate_after=TRUNCATE_AFTER,
-                      deconvoluter_type=AveraginePeakDependenceGraphDeconvoluter, **kwargs):
+                      deconvoluter_type=AveraginePeakDependenceGraphDeconvoluter, n_processes=1,
+                      targeted_only=False, collect_statistics=False, **kwargs):
+    """Deconvolute a centroided mass spectrum.
+
+    Constructs a deconvoluter of `deconvoluter_type` configured with `decon_config`, performs
+    targeted deconvolution of each entry in `priority_list`, and then deconvolutes the entire
+    spectrum.
+
+    When `n_processes` is greater than 1, `peaklist` is split into independent windows at gaps
+    between peaks wider than any isotopic pattern which may be fit (see :func:`envelope_search_width`
+    and :func:`partition_peak_index`), which are deconvoluted in parallel worker processes. The results
+    are stitched back together, keeping the best solution where windows overlap, and each priority target
+    is deconvoluted in the window which contains it. In this mode, :attr:`DeconvolutionProcessResult.deconvoluter`
+    is `None` because no single deconvoluter saw the whole spectrum.
+
+    Parameters
+    ----------
+    peaklist : ms_peak_picker.PeakIndex
+        The centroided peaks to deconvolute
+    decon_config : dict, optional
+        Keyword arguments to pass to `deconvoluter_type`
+    charge_range : tuple, optional
+        The range of charge states to consider. Defaults to (1, 8)
+    error_tolerance : float, optional
+        The parts-per-million error tolerance in m/z to search with. Defaults to ERROR_TOLERANCE
+    priority_list : list, optional
+        Peaks, m/z values, or :class:`~.PriorityTarget` instances to deconvolute before
+        the rest of the spectrum, whose solutions are returned separately. Entries which
+        resolve to the same peak with exactly the same charge range are deconvoluted once,
+        and share the same solution. Entries whose charge ranges differ are deconvoluted
+        separately, even when one range contains the other.
+    deconvoluter_type : type, optional
+        The deconvoluter type to use. Defaults to :class:`AveraginePeakDependenceGraphDeconvoluter`
+    n_processes : int, optional
+        The number of worker processes to split the spectrum across. Defaults to 1, which
+        deconvolutes the spectrum in the calling process.
+    targeted_only : bool, optional
+        Whether to deconvolute only the neighborhoods of the entries in `priority_list`
+        using the deconvoluter's `deconvolute_targets` method instead of the entire spectrum.
+        The returned peak set then contains only the solutions found in those neighborhoods.
+        Defaults to `False`.
+    collect_statistics : bool, optional
+        Whether to record the time spent in each phase and the deconvoluter's counters in a
+        :class:`DeconvolutionStatistics` instance stored in :attr:`DeconvolutionProcessResult.statistics`.
+        When `n_processes` is greater than 1, the counters of each window are summed and only the
+        total time is recorded. Defaults to `False`.
+    **kwargs
+        Merged into `decon_config`. Deconvoluters derived from :class:`PeakDependenceGraphDeconvoluterBase`
+        accept `time_budget` and `max_fits` to bound the work done on a single spectrum, after which
+        they continue with reduced search settings and :attr:`DeconvolutionProcessResult.degraded`
+        is set, and `subgraph_time_budget` to bound the time spent selecting disjoint fits when
+        `subgraph_selection_method` is `"branch_and_bound"`.
+
+    Returns
+    -------
+    DeconvolutionProcessResult
+    """
     if priority_list is None:
         priority_list = []
     if left_search_limit_for_priorities is None:
@@ -1779,12 +3003,38 @@ def deconvolute_peaks(peaklist,
     decon_config.update(kwargs)
     decon_config.setdefault("use_subtraction", True)
     decon_config.setdefault("scale_method", SCALE_METHOD)
+
+    if n_processes > 1:
+        return _deconvolute_peaks_partitioned(
+            peaklist, decon_config, priority_list, n_processes, charge_range=charge_range,
+            error_tolerance=error_tolerance, truncate_after=truncate_after,
+            left_search_limit=left_search_limit, right_search_limit=right_search_limit,
+            use_charge_state_hint_for_priorities=use_charge_state_hint_for_priorities,
+            left_search_limit_for_priorities=left_search_limit_for_priorities,
+            right_search_limit_for_priorities=right_search_limit_for_priorities,
+            verbose_priorities=verbose_priorities, verbose=verbose, charge_carrier=charge_carrier,
+            deconvoluter_type=deconvoluter_type, targeted_only=targeted_only,
+            collect_statistics=collect_statistics)
+
+    statistics = None
+    if collect_statistics:
+        statistics = DeconvolutionStatistics(len(peaklist), len(priority_list))
+        start = time.time()
+
     decon = deconvoluter_type(peaklist=peaklist, **decon_config)
 
+    if statistics is not None:
+        statistics.begin(decon)
+
     if verbose_priorities or verbose:
         decon.verbose = True
 
     priority_list_results = []
+    # Targets which resolve to the same peak with the same charge range share one
+    # targeted deconvolution, as when a precursor is selected for several MSn scans.
+    # Targets with different charge ranges are searched separately, even when one
+    # range contains the other, so each target's solution respects its own range.
+    coalesced_targets = {}
     for p in priority_list:
         try:
             target_info = p
@@ -1794,6 +3044,12 @@ def deconvolute_peaks(peaklist,
             hinted_charge_range = charge_range
         if not isinstance(p, FittedPeak):
             p = decon.peaklist.has_peak(p, error_tolerance)
+        key = None
+        if p is not None:
+            key = (p.index, tuple(hinted_charge_range))
+            if key in coalesced_targets:
+                priority_list_results.append(coalesced_targets[key])
+                continue
         priority_result = decon.targeted_deconvolution(
             p, error_tolerance=error_tolerance,
             charge_range=hinted_charge_range,
@@ -1802,27 +3058,53 @@ def deconvolute_peaks(peaklist,
             right_search_limit=right_search_limit_for_priorities,
             charge_carrier=charge_carrier,
             truncate_after=truncate_after)
+        if key is not None:
+            coalesced_targets[key] = priority_result
         priority_list_results.append(priority_result)
 
     if verbose_priorities and not verbose:
         decon.verbose = False
 
-    deconvoluted_peaks = decon.deconvolute(
-        error_tolerance=error_tolerance, charge_range=charge_range, left_search_limit=left_search_limit,
-        right_search_limit=right_search_limit, charge_carrier=charge_carrier, truncate_after=truncate_after)
+    if statistics is not None:
+        statistics.timings["targeted"] = time.time() - start
+        start = time.time()
+
+    if targeted_only:
+        deconvoluted_peaks = decon.deconvolute_targets(
+            error_tolerance=error_tolerance, charge_range=charge_range, left_search_limit=left_search_limit,
+            right_search_limit=right_search_limit, charge_carrier=charge_carrier, truncate_after=truncate_after)
+    else:
+        deconvoluted_peaks = decon.deconvolute(
+            error_tolerance=error_tolerance, charge_range=charge_range, left_search_limit=left_search_limit,
+            right_search_limit=right_search_limit, charge_carrier=charge_carrier, truncate_after=truncate_after)
+
+    if statistics is not None:
+        statistics.timings["deconvolute"] = time.time() - start
+        start = time.time()
 
     acc = []
     errors = []
+    solved = {}
     for pr in priority_list_results:
+        if id(pr) in solved:
+            acc.append(solved[id(pr)])
+            continue
         try:
             result = pr.get()
         except ValueError as e:
             result = None
             errors.append(e)
             logger.error("Could not extract a solution for %r", pr.query_peak, exc_info=True)
+        solved[id(pr)] = result
         acc.append(result)
 
     priority_list_results = acc
 
+    if statistics is not None:
+        statistics.timings["extract"] = time.time() - start
+        statistics.deconvoluted_peak_count = len(deconvoluted_peaks)
+        statistics.collect(decon)
+
     return DeconvolutionProcessResult(
-        decon, deconvoluted_peaks, priority_list_results, errors)
+        decon, deconvoluted_peaks, priority_list_results, errors,
+        degraded=getattr(decon, "degraded", False), statistics=statistics)
@@ -22,7 +22,7 @@ class map_coord(namedtuple("map_coord", ("mz", 'time'))):
 class LCMSFeatureSetFit(object):
     def __init__(self, features, theoretical, score, charge,
                  missing_features=0, supporters=None, data=None,
-                 neutral_mass=None, scores=None, times=None):
+                 neutral_mass=None, n_points=0, scores=None, times=None):
         if supporters is None:
             supporters = []
         if scores is None:
@@ -41,6 +41,7 @@ class LCMSFeatureSetFit(object):
         if neutral_mass is None:
             neutral_mass = neutral_mass(self.mz, self.charge)
         self.neutral_mass = neutral_mass
+        self.n_points = n_points
         self.scores = scores
         self.times = times
 
@@ -1,5 +1,5 @@
 from collections import defaultdict
-from itertools import product
+from heapq import heappop, heappush
 
 import numpy as np
 
@@ -49,22 +49,144 @@ def conform_envelopes(experimental, base_theoretical, minimum_theoretical_abunda
     return cleaned_eid, tid, n_missing
 
 
+# The most combinations of candidate features to evaluate for one theoretical isotopic pattern
+MAX_COMBINATIONS = 1000
+
+
+def _signal_within(feature, start_time, end_time):
+    signal = {}
+    for node in feature.nodes:
+        if start_time <= node.time <= end_time:
+            signal[node.time] = node.total_intensity()
+    return signal
+
+
+def _profile_similarity(signal, expected):
+    shared = 0.
+    total = 0.
+    for time in set(signal) | set(expected):
+        observed = signal.get(time, 0.)
+        predicted = expected.get(time, 0.)
+        shared += min(observed, predicted)
+        total += max(observed, predicted)
+    if total == 0:
+        return 0.
+    return shared / total
+
+
+def rank_feature_candidates(feature_groups, theoretical_distribution, interval=None):
+    """Score the candidate features for each isotopic peak independently of one another.
+
+    When `interval`, the feature being fit, is itself a candidate, every other candidate is
+    scored by how closely its signal within the time span of `interval` matches the signal of
+    `interval` scaled by their ratio in `theoretical_distribution`, from 0 to 1. Otherwise
+    candidates are scored by their signal within that span, or in total if `interval` is
+    :const:`None`. Candidates which score 0 are dropped, as a fit is only scored where all of its
+    features were observed. Scores are then made relative to the best candidate for the same peak.
+
+    Parameters
+    ----------
+    feature_groups : list of list of LCMSFeature
+        The candidates for each isotopic peak, as from
+        :meth:`LCMSFeatureProcessorBase.match_theoretical_isotopic_distribution`
+    theoretical_distribution : list of TheoreticalPeak
+        The isotopic pattern the candidates were matched to
+    interval : LCMSFeature, optional
+        The feature being fit
+
+    Returns
+    -------
+    list of list of tuple
+        For each isotopic peak, the score, original index and feature of each candidate
+        from best to worst, or a single :const:`None` placeholder if none remain
+    """
+    seed_signal = None
+    if interval is not None:
+        start_time = interval.start_time
+        end_time = interval.end_time
+        for seed_position, group in enumerate(feature_groups):
+            if any(f is interval for f in group):
+                seed_signal = _signal_within(interval, start_time, end_time)
+                seed_abundance = theoretical_distribution[seed_position].intensity
+                break
+    ranked_groups = []
+    for position, group in enumerate(feature_groups):
+        expected = None
+        if seed_signal is not None:
+            ratio = theoretical_distribution[position].intensity / seed_abundance
+            expected = {time: value * ratio for time, value in seed_signal.items()}
+        candidates = []
+        for i, feature in enumerate(group):
+            if feature is None:
+                continue
+            if interval is None:
+                score = feature.total_signal
+            elif expected is None:
+                score = sum(_signal_within(feature, start_time, end_time).values())
+            else:
+                score = _profile_similarity(_signal_within(feature, start_time, end_time), expected)
+            if score > 0:
+                candidates.append((score, i, feature))
+        if not candidates:
+            ranked_groups.append([(0., 0, None)])
+            continue
+        candidates.sort(key=lambda x: (-x[0], x[1]))
+        best = candidates[0][0]
+        ranked_groups.append([(score / best, i, feature) for score, i, feature in candidates])
+    return ranked_groups
+
+
+def best_first_combinations(ranked_groups, max_combinations=MAX_COMBINATIONS):
+    """Enumerate combinations of one candidate per isotopic peak in decreasing order
+    of the sum of their scores.
+
+    As each peak's candidates are ordered from best to worst, a combination's total
+    bounds that of every combination reached by replacing one of its candidates with
+    the next one for the same peak, so a combination is only queued once one of its
+    predecessors has been taken.
+
+    Parameters
+    ----------
+    ranked_groups : list of list of tuple
+        As from :func:`rank_feature_candidates`
+    max_combinations : int, optional
+        The most combinations to produce. If 0, all of them are produced.
+
+    Returns
+    -------
+    list of tuple of int
+        The position of the chosen candidate in each group, for each combination
+    """
+    n = len(ranked_groups)
+
+    def priority(indices):
+        return -sum(ranked_groups[i][j][0] for i, j in enumerate(indices))
+
+    start = (0,) * n
+    heap = [(priority(start), start)]
+    seen = {start}
+    combinations = []
+    while heap and (max_combinations == 0 or len(combinations) < max_combinations):
+        _, indices = heappop(heap)
+        combinations.append(indices)
+        for i in range(n):
+            if indices[i] + 1 < len(ranked_groups[i]):
+                successor = indices[:i] + (indices[i] + 1,) + indices[i + 1:]
+                if successor not in seen:
+                    seen.add(successor)
+                    heappush(heap, (priority(successor), successor))
+    return combinations
+
+
 class LCMSFeatureProcessorBase(object):
+    max_combinations = MAX_COMBINATIONS
+
     def create_theoretical_distribution(self, mz, charge, charge_carrier=PROTON, truncate_after=0.8,
                                         ignore_below=0.05):
         base_tid = self.averagine.isotopic_cluster(
-            mz, charge, truncate_after=truncate_after, charge_carrier=charge_carrier)
-        total = 0
-        kept_tid = []
-        for i, p in enumerate(base_tid):
-            if p.intensity < ignore_below and i > 1:
-                continue
-            else:
-                total += p.intensity
-                kept_tid.append(p)
-        for p in kept_tid:
-            p.intensity /= total
-        return kept_tid
+            mz, charge, truncate_after=truncate_after, ignore_below=ignore_below,
+            charge_carrier=charge_carrier)
+        return base_tid
 
     def find_all_features(self, mz, error_tolerance=2e-5):
         return self.feature_map.find_all(mz, error_tolerance)
@@ -82,30 +204,43 @@ class LCMSFeatureProcessorBase(object):
 
     def _find_thresholded_score(self, scores, percentage):
         scores = np.array(scores)
+        if len(scores) == 0:
+            return 0
         maximum = scores.max()
         threshold = maximum * percentage
-        return scores[scores > threshold].mean()
-
-    def _fit_feature_set(self, mz, error_tolerance, charge,
-                         charge_carrier=PROTON, truncate_after=0.8, max_missed_peaks=1,
-                         threshold_scale=0.3, feature=None):
-        base_tid = self.create_theoretical_distribution(mz, charge, charge_carrier, truncate_after)
-        feature_groups = self.match_theoretical_isotopic_distribution(base_tid, error_tolerance, interval=feature)
+        scores = scores[scores > threshold]
+        if len(scores) == 0:
+            return 0
+        return scores.mean()
+
+    def _fit_theoretical_distribution_on_features(self, mz, error_tolerance, charge, base_tid,
+                                                  charge_carrier=PROTON, truncate_after=0.8,
+                                                  max_missed_peaks=1, threshold_scale=0.3, feature=None):
+        feature_groups = self.match_theoretical_isotopic_distribution(
+            base_tid.truncated_tid, error_tolerance, interval=feature)
+        ranked_groups = rank_feature_candidates(feature_groups, base_tid.truncated_tid, feature)
+        combinations = best_first_combinations(ranked_groups, self.max_combinations)
+        # Evaluate in the order the features were found, as enumerating every combination would
+        combinations.sort(key=lambda indices: [ranked_groups[i][j][1] for i, j in enumerate(indices)])
         feature_fits = []
-        for features in product(*feature_groups):
+        for indices in combinations:
+            features = [ranked_groups[i][j][2] for i, j in enumerate(indices)]
             if all(f is None for f in features):
                 continue
             # If the monoisotopic feature wasn't actually observed, create a dummy feature
             # since the monoisotopic feature cannot be None
             if features[0] is None:
-                features = list(features)
                 features[0] = EmptyFeature(mz)
+                snapped_tid = base_tid.clone().shift(mz, True)
+            else:
+                snapped_tid = base_tid.clone().shift(features[0].mz, True)
             feat_iter = FeatureSetIterator(features)
             scores = []
             times = []
             counter = 0
             for eid in feat_iter:
-                cleaned_eid, tid, n_missing = self.conform_envelopes(eid, base_tid)
+                counter += 1
+                cleaned_eid, tid, n_missing = self.conform_envelopes(eid, snapped_tid.truncated_tid)
                 if n_missing > max_missed_peaks:
                     continue
                 score = self.scorer.evaluate(None, cleaned_eid, tid)
@@ -113,22 +248,28 @@ class LCMSFeatureProcessorBase(object):
                     continue
                 scores.append(score)
                 times.append(feat_iter.current_time)
-                counter += 1
             final_score = self._find_thresholded_score(scores, threshold_scale)
             missing_features = 0
             for f in features:
                 if f is None:
                     missing_features += 1
             fit = LCMSFeatureSetFit(
-                features, base_tid, final_score, charge, missing_features,
-                neutral_mass=neutral_mass(features[0].mz, charge, charge_carrier),
-                missing_features=missing_features,
-                scores=scores, times=times)
+                features, snapped_tid, final_score, charge, missing_features,
+                neutral_mass=neutral_mass(snapped_tid.monoisotopic_mz, charge, charge_carrier),
+                n_points=counter, scores=np.array(scores), times=np.array(times))
             if self.scorer.reject_score(fit.score):
                 continue
             feature_fits.append(fit)
         return feature_fits
 
+    def _fit_feature_set(self, mz, error_tolerance, charge, left_search=1, right_search=1,
+                         charge_carrier=PROTON, truncate_after=0.8, max_missed_peaks=1,
+                         threshold_scale=0.3, feature=None):
+        base_tid = self.create_theoretical_distribution(mz, charge, charge_carrier, truncate_after)
+        return self._fit_theoretical_distribution_on_features(
+            mz, error_tolerance, charge, base_tid, charge_carrier, truncate_after,
+            max_missed_peaks, threshold_scale, feature)
+
     def match_theoretical_isotopic_distribution(self, theoretical_distribution, error_tolerance=2e-5, interval=None):
         """Given a list of theoretical peaks, find their counterparts in :attr:`peaklist` within `error_tolerance`
         ppm error. If no experimental peak is found, a placeholder will be used in its stead.
@@ -273,7 +414,7 @@ class PrecursorMap(object):
 
 class LCMSFeatureProcessor(LCMSFeatureProcessorBase):
     def __init__(self, feature_map, averagine, scorer, precursor_map=None, minimum_size=3,
-                 maximum_time_gap=0.25):
+                 maximum_time_gap=0.25, max_combinations=MAX_COMBINATIONS):
         if precursor_map is None:
             precursor_map = PrecursorMap({})
         self.feature_map = LCMSFeatureMap([f.clone(deep=True) for f in feature_map])
@@ -282,6 +423,7 @@ class LCMSFeatureProcessor(LCMSFeatureProcessorBase):
         self.precursor_map = precursor_map
         self.minimum_size = minimum_size
         self.maximum_time_gap = maximum_time_gap
+        self.max_combinations = max_combinations
         self.dependence_network = FeatureDependenceGraph(self.feature_map)
         self.orphaned_nodes = []
 
@@ -80,6 +80,7 @@ class MzMLScanSerializer(ScanSerializerBase):
         self.n_spectra = n_spectra
         self.compression = compression
         self._has_started_writing_spectra = False
+        self.spectra_written = 0
 
         self.writer.__enter__()
         self._run_tag = None
@@ -286,6 +287,7 @@ class MzMLScanSerializer(ScanSerializerBase):
 
         descriptors = describe_spectrum(precursor_peaks)
 
+        self.spectra_written += 1
         self.writer.write_spectrum(
             [p.mz for p in precursor_peaks], [p.intensity for p in precursor_peaks], charge_array,
             id=bunch.precursor.id, params=[
@@ -320,6 +322,7 @@ class MzMLScanSerializer(ScanSerializerBase):
             else:
                 charge_array = None
 
+            self.spectra_written += 1
             self.writer.write_spectrum(
                 [p.mz for p in product_peaks], [p.intensity for p in product_peaks], charge_array,
                 id=prod.id, params=[
@@ -334,6 +337,20 @@ class MzMLScanSerializer(ScanSerializerBase):
         if self.indexer is not None:
             self.indexer.add_scan_bunch(bunch)
 
+    def flush(self):
+        """Write all of the spectra saved so far to :attr:`handle`, so that the file
+        ends just after the last complete spectrum.
+
+        Returns
+        -------
+        int
+            The number of bytes written to :attr:`handle`
+        """
+        if self._has_started_writing_spectra:
+            self.writer.writer.flush()
+        self.handle.flush()
+        return self.handle.tell()
+
     def save_chromatogram(self, chromatogram_dict, chromatogram_type, params=None, **kwargs):
         time_array, intensity_array = zip(*chromatogram_dict.items())
         self.writer.write_chromatogram(
@@ -366,6 +383,11 @@ class MzMLScanSerializer(ScanSerializerBase):
                     **chromatogram)
 
     def complete(self):
+        if not self._has_started_writing_spectra:
+            # No scan bunch was saved, so write an empty spectrum list
+            self.n_spectra = 0
+            self._add_spectrum_list()
+            self._has_started_writing_spectra = True
         self._spectrum_list_tag.__exit__(None, None, None)
         self._make_default_chromatograms()
         self.write_chromatograms()
@@ -655,3 +677,97 @@ try:
     from ms_deisotope._c.utils import deserialize_deconvoluted_peak_set
 except ImportError:
     has_c = False
+
+
+def read_partial_processed_mzml(path, offset, recovered_path=None):
+    """Read the spectra of a processed mzML file whose writing was interrupted.
+
+    The first `offset` bytes of `path`, as returned by :meth:`MzMLScanSerializer.flush`,
+    are copied to `recovered_path` and the elements still open at that point are closed,
+    discarding anything written after the last complete spectrum.
+
+    Parameters
+    ----------
+    path : str
+        The path of the unfinished mzML file
+    offset : int
+        The number of bytes of `path` to keep
+    recovered_path : str, optional
+        Where to write the repaired copy. Defaults to `path` with ``.recovered``
+        appended
+
+    Returns
+    -------
+    ProcessedMzMLDeserializer
+        A reader over the repaired copy, which should be removed once it is closed
+
+    Raises
+    ------
+    ValueError
+        If `path` does not end a spectrum after `offset` bytes
+    """
+    if recovered_path is None:
+        recovered_path = path + ".recovered"
+    end_tag = b"</spectrum>"
+    with open(path, 'rb') as source:
+        source.seek(max(offset - len(end_tag), 0))
+        if source.read(len(end_tag)) != end_tag:
+            raise ValueError("%s does not end a spectrum after %d bytes" % (path, offset))
+    with open(path, 'rb') as source, open(recovered_path, 'wb') as target:
+        remaining = offset
+        while remaining > 0:
+            chunk = source.read(min(remaining, 2 ** 20))
+            if not chunk:
+                raise ValueError("%s is shorter than %d bytes" % (path, offset))
+            target.write(chunk)
+            remaining -= len(chunk)
+        target.write(b"</spectrumList></run></mzML>\n")
+    return ProcessedMzMLDeserializer(recovered_path)
+
+
+def merge_processed_mzml(shard_paths, handle, sample_name=None):
+    """Concatenate processed mzML files written from disjoint scan ranges
+    of the same run into a single processed mzML file.
+
+    The scans are read with :class:`ProcessedMzMLDeserializer` and written
+    again without being deconvoluted a second time. The shards are written in
+    order of their first MS1 scan's time, so the total ion and base peak chromatograms
+    are rebuilt in acquisition order, as is the :class:`~.ExtendedScanIndex` written
+    alongside `handle`. Bunches which appear in more than one shard are written once.
+
+    Parameters
+    ----------
+    shard_paths : list of str
+        The paths of the processed mzML files to merge
+    handle : file-like
+        The file to write the merged mzML to
+    sample_name : str, optional
+        The sample name to record. Defaults to the first shard's
+
+    Returns
+    -------
+    MzMLScanSerializer
+        The completed serializer
+    """
+    readers = [ProcessedMzMLDeserializer(path) for path in shard_paths]
+
+    def first_scan_time(reader):
+        if reader.extended_index is not None and reader.extended_index.ms1_ids:
+            return min(entry['scan_time'] for entry in reader.extended_index.ms1_ids.values())
+        return reader.get_scan_by_index(0).scan_time
+
+    readers.sort(key=first_scan_time)
+    if sample_name is None and readers:
+        sample_name = readers[0].sample_run.name
+    n_spectra = sum(len(reader.index) for reader in readers)
+    serializer = MzMLScanSerializer(handle, n_spectra=n_spectra, sample_name=sample_name)
+    seen = set()
+    for reader in readers:
+        for bunch in reader:
+            if bunch.precursor.id in seen:
+                continue
+            seen.add(bunch.precursor.id)
+            serializer.save_scan_bunch(bunch)
+        reader.close()
+    serializer.complete()
+    return serializer
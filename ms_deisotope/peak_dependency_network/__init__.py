@@ -1,12 +1,15 @@
-from . import peak_network, intervals, subgraph, utils
+from . import peak_network, array_network, intervals, subgraph, utils
 
 from .peak_network import (
     PeakNode, DependenceCluster, PeakDependenceGraph,
     NetworkedTargetedDeconvolutionResult, NoIsotopicClustersError)
 
+from .array_network import ArrayPeakDependenceGraph
+
 from .subgraph import (
     ConnectedSubgraph, FitNode,
-    GreedySubgraphSelection)
+    GreedySubgraphSelection, BranchAndBoundSubgraphSelection,
+    SubgraphTimeBudget)
 
 from .intervals import (
     Interval, IntervalTreeNode, SpanningMixin)
@@ -21,13 +24,17 @@ __all__ = [
     "PeakNode",
     "DependenceCluster",
     "PeakDependenceGraph",
+    "ArrayPeakDependenceGraph",
     "FitNode",
     "ConnectedSubgraph",
     "GreedySubgraphSelection",
+    "BranchAndBoundSubgraphSelection",
+    "SubgraphTimeBudget",
     "Interval",
     "IntervalTreeNode",
     "SpanningMixin",
     "peak_network",
+    "array_network",
     "intervals",
     "subgraph",
     "utils",
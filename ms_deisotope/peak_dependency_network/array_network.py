@@ -0,0 +1,343 @@
+import operator
+from array import array
+
+import numpy as np
+
+from .peak_network import PeakDependenceGraphBase, DependenceCluster
+from .subgraph import SubgraphTimeBudget, SUBGRAPH_TIME_BUDGET
+
+try:
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+    has_scipy = True
+except ImportError:  # pragma: no cover
+    has_scipy = False
+
+
+def _union_find_components(fit_ids, peak_ids, n_fits):
+    """Label the connected components of the bipartite fit-peak graph
+    described by the parallel arrays `fit_ids` and `peak_ids` using a
+    disjoint set forest over the fits.
+
+    Parameters
+    ----------
+    fit_ids : np.ndarray
+        The fit index of each edge
+    peak_ids : np.ndarray
+        The peak index of each edge
+    n_fits : int
+        The total number of fits, including those without edges
+
+    Returns
+    -------
+    np.ndarray
+        The component label of each fit
+    """
+    parent = list(range(n_fits))
+
+    def find(i):
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    owner = {}
+    for fit_id, peak_id in zip(fit_ids.tolist(), peak_ids.tolist()):
+        try:
+            other = owner[peak_id]
+        except KeyError:
+            owner[peak_id] = fit_id
+            continue
+        a = find(fit_id)
+        b = find(other)
+        if a != b:
+            parent[a] = b
+    return np.array([find(i) for i in range(n_fits)], dtype=np.intp)
+
+
+def _connected_fit_components(fit_ids, peak_ids, n_fits, n_peaks):
+    if not has_scipy:
+        return _union_find_components(fit_ids, peak_ids, n_fits)
+    n = n_fits + n_peaks
+    adjacency = coo_matrix(
+        (np.ones(len(fit_ids), dtype=np.int8), (fit_ids, peak_ids + n_fits)),
+        shape=(n, n))
+    _, labels = connected_components(adjacency, directed=False)
+    return labels[:n_fits]
+
+
+class ArrayPeakDependenceGraph(PeakDependenceGraphBase):
+    """An implementation of :class:`~.PeakDependenceGraph` which stores the dependence
+    of fits on peaks as flat integer arrays instead of one :class:`~.PeakNode` per peak.
+
+    Each fit's peak positions (:attr:`FittedPeak.peak_count`) are appended to a single
+    array, with a parallel offset array marking where each fit's peaks begin, giving a
+    compressed sparse row (CSR) layout from fits to peaks. The reverse peak-to-fit
+    adjacency is derived from these arrays on demand. Fit scores, charges and missed peak
+    counts are kept in parallel arrays so that the filtering steps run as whole-array
+    operations.
+
+    This representation uses a fraction of the memory of the object graph for spectra with
+    many peaks, and is interchangeable with :class:`~.PeakDependenceGraph` for the
+    deconvoluters.
+
+    Attributes
+    ----------
+    fits : list of IsotopicFitRecord
+        Every unique fit added to the graph in insertion order
+    max_missed_peaks : int
+        The maximum number of missing peaks to tolerate in an isotopic fit
+    maximize : bool
+        Whether the objective is to maximize or minimize the isotopic fit score
+    peaklist : ms_peak_picker.PeakIndex
+        The peaks the fits depend upon
+    selection_method : str
+        The strategy used to choose the disjoint fits of each cluster
+    subgraph_budget : SubgraphTimeBudget
+        The time limit on choosing the disjoint fits of all of the clusters of one spectrum
+    use_monoisotopic_superceded_filtering : bool
+        Whether to apply :meth:`drop_superceded_fits` when solving the graph
+    """
+
+    def __init__(self, peaklist, max_missed_peaks=1, use_monoisotopic_superceded_filtering=True,
+                 maximize=True, selection_method="greedy", subgraph_time_budget=SUBGRAPH_TIME_BUDGET,
+                 **kwargs):
+        self.peaklist = peaklist
+        self.max_missed_peaks = max_missed_peaks
+        self.use_monoisotopic_superceded_filtering = use_monoisotopic_superceded_filtering
+        self.maximize = maximize
+        self.selection_method = selection_method
+        self.subgraph_budget = SubgraphTimeBudget(subgraph_time_budget)
+        self._clear_fits()
+        self.clusters = None
+        self._interval_tree = None
+        self._solution_map = {}
+        self._all_clusters = []
+
+    def _clear_fits(self):
+        self.fits = []
+        self._fit_index = {}
+        self._fit_peaks = array('q')
+        self._placeholder_mzs = array('d')
+        self._fit_offsets = array('q', [0])
+        self._scores = array('d')
+        self._charges = array('q')
+        self._missed_peaks = array('q')
+        self._alive = np.zeros(0, dtype=bool)
+        self._peak_offsets = None
+        self._peak_fits = None
+
+    def reset(self):
+        self._reset_solutions()
+        self._clear_fits()
+
+    def __len__(self):
+        return len(self.fits)
+
+    def _index_of(self, fit_record):
+        return self._fit_index[fit_record]
+
+    def _sync_alive(self):
+        n = len(self.fits)
+        k = len(self._alive)
+        if k < n:
+            self._alive = np.concatenate([self._alive, np.ones(n - k, dtype=bool)])
+        return self._alive
+
+    def _invalidate(self):
+        self._peak_offsets = None
+        self._peak_fits = None
+
+    def add_fit_dependence(self, fit_record):
+        if fit_record in self._fit_index:
+            return
+        self._fit_index[fit_record] = len(self.fits)
+        self.fits.append(fit_record)
+        for peak in fit_record.experimental:
+            if peak.peak_count >= 0:
+                self._fit_peaks.append(peak.peak_count)
+                self._placeholder_mzs.append(0.0)
+            else:
+                self._fit_peaks.append(-1)
+                self._placeholder_mzs.append(peak.mz)
+        self._fit_offsets.append(len(self._fit_peaks))
+        self._scores.append(fit_record.score)
+        self._charges.append(fit_record.charge)
+        self._missed_peaks.append(fit_record.missed_peaks)
+        self._invalidate()
+
+    def drop_fit_dependence(self, fit_record):
+        alive = self._sync_alive()
+        try:
+            alive[self._index_of(fit_record)] = False
+        except KeyError:
+            pass
+        self._invalidate()
+
+    @property
+    def dependencies(self):
+        alive = self._sync_alive()
+        fits = self.fits
+        return {fits[i] for i in np.flatnonzero(alive)}
+
+    def _edges(self):
+        """Build the flattened fit-peak edge list for all live fits, excluding
+        placeholder peaks.
+
+        Returns
+        -------
+        fit_ids : np.ndarray
+            The fit index of each edge
+        peak_ids : np.ndarray
+            The peak index of each edge
+        positions : np.ndarray
+            The position of the edge's peak within its fit's experimental peak list
+        """
+        alive = self._sync_alive()
+        offsets = np.array(self._fit_offsets, dtype=np.int64)
+        peaks = np.array(self._fit_peaks, dtype=np.int64)
+        lengths = np.diff(offsets)
+        fit_ids = np.repeat(np.arange(len(lengths)), lengths)
+        positions = np.arange(len(peaks)) - offsets[fit_ids]
+        mask = (peaks >= 0) & alive[fit_ids]
+        return fit_ids[mask], peaks[mask], positions[mask]
+
+    def _build_peak_index(self):
+        fit_ids, peak_ids, _ = self._edges()
+        order = np.argsort(peak_ids, kind='stable')
+        n_peaks = len(self.peaklist)
+        if len(peak_ids):
+            n_peaks = max(n_peaks, int(peak_ids.max()) + 1)
+        counts = np.bincount(peak_ids, minlength=n_peaks)
+        self._peak_offsets = np.concatenate([[0], np.cumsum(counts)])
+        self._peak_fits = fit_ids[order]
+
+    def fits_for_peak(self, peak):
+        if self._peak_offsets is None:
+            self._build_peak_index()
+        i = peak.peak_count
+        if i < 0 or i + 1 >= len(self._peak_offsets):
+            return []
+        fits = self.fits
+        return [fits[j] for j in self._peak_fits[self._peak_offsets[i]:self._peak_offsets[i + 1]]]
+
+    def peaks_for(self, fit_record):
+        """Get the indices of the real peaks `fit_record` depends upon
+
+        Parameters
+        ----------
+        fit_record : IsotopicFitRecord
+
+        Returns
+        -------
+        np.ndarray
+        """
+        i = self._index_of(fit_record)
+        row = np.array(self._fit_peaks[self._fit_offsets[i]:self._fit_offsets[i + 1]], dtype=np.intp)
+        return row[row >= 0]
+
+    def claimed_peaks(self):
+        """Get the indices of all peaks depended upon by at least one fit
+
+        Returns
+        -------
+        np.ndarray
+        """
+        _, peak_ids, _ = self._edges()
+        return np.unique(peak_ids)
+
+    def drop_gapped_fits(self, n=None):
+        if n is None:
+            n = self.max_missed_peaks
+        alive = self._sync_alive()
+        alive &= np.array(self._missed_peaks, dtype=np.int64) <= n
+        self._invalidate()
+
+    def best_exact_fits(self):
+        alive = self._sync_alive()
+        live = np.flatnonzero(alive)
+        if len(live) < 2:
+            return
+        offsets = np.array(self._fit_offsets, dtype=np.int64)
+        peaks = np.array(self._fit_peaks, dtype=np.int64)
+        lengths = np.diff(offsets)[live]
+        width = lengths.max()
+        # Lay each live fit's peak list out as a row of a padded matrix so that
+        # fits which claim the exact same peaks collapse onto the same unique row.
+        # Placeholder peaks are told apart by their m/z in the second half of the row.
+        rows = np.repeat(np.arange(len(live)), lengths)
+        starts = offsets[live]
+        columns = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        edges = np.repeat(starts, lengths) + columns
+        matrix = np.full((len(live), 2 * width), -2, dtype=np.float64)
+        matrix[rows, columns] = peaks[edges]
+        matrix[rows, columns + width] = np.array(self._placeholder_mzs, dtype=np.float64)[edges]
+        _, groups = np.unique(matrix, axis=0, return_inverse=True)
+        groups = groups.ravel()
+        scores = np.array(self._scores, dtype=np.float64)[live]
+        if not self.maximize:
+            scores = -scores
+        order = np.lexsort((scores, groups))
+        ordered_groups = groups[order]
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = ordered_groups[1:] != ordered_groups[:-1]
+        alive[live] = False
+        alive[live[order[last]]] = True
+        self._invalidate()
+
+    def drop_superceded_fits(self):
+        alive = self._sync_alive()
+        fit_ids, peak_ids, positions = self._edges()
+        if len(fit_ids) == 0:
+            return
+        charges = np.array(self._charges, dtype=np.int64)[fit_ids]
+        scores = np.array(self._scores, dtype=np.float64)[fit_ids]
+        if not self.maximize:
+            scores = -scores
+        # The best score achieved by any fit at each (peak, charge) pair
+        _, groups = np.unique(np.vstack([peak_ids, charges]), axis=1, return_inverse=True)
+        groups = groups.ravel()
+        best = np.full(groups.max() + 1, -np.inf)
+        np.maximum.at(best, groups, scores)
+        # A fit is superceded when another fit of the same charge which also
+        # contains its monoisotopic peak scores better than it does
+        is_monoisotopic = positions == 0
+        superceded = scores[is_monoisotopic] < best[groups[is_monoisotopic]]
+        alive[fit_ids[is_monoisotopic][superceded]] = False
+        self._invalidate()
+
+    def find_non_overlapping_intervals(self):
+        self.drop_gapped_fits()
+        self.best_exact_fits()
+        if self.use_monoisotopic_superceded_filtering:
+            self.drop_superceded_fits()
+
+        fit_ids, peak_ids, _ = self._edges()
+        n_fits = len(self.fits)
+        n_peaks = len(self.peaklist)
+        if len(peak_ids):
+            n_peaks = max(n_peaks, int(peak_ids.max()) + 1)
+        labels = _connected_fit_components(fit_ids, peak_ids, n_fits, n_peaks)
+
+        # Only fits which depend upon at least one real peak participate in a cluster
+        members = np.unique(fit_ids)
+        member_labels = labels[members]
+        order = np.argsort(member_labels, kind='stable')
+        members = members[order]
+        member_labels = member_labels[order]
+        boundaries = np.flatnonzero(np.diff(member_labels)) + 1
+
+        fits = self.fits
+        clusters = [
+            DependenceCluster(dependencies=[fits[i] for i in group], maximize=self.maximize,
+                              selection_method=self.selection_method,
+                              selection_budget=self.subgraph_budget)
+            for group in np.split(members, boundaries) if len(group)]
+        clusters = sorted(clusters, key=operator.attrgetter("start"))
+        self.clusters = clusters
+        return clusters
+
+    def __repr__(self):
+        return "ArrayPeakDependenceGraph(%s, %d)" % (self.peaklist, int(self._sync_alive().sum()))
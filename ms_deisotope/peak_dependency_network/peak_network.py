@@ -2,7 +2,7 @@ import operator
 import warnings
 from collections import defaultdict
 
-from .subgraph import ConnectedSubgraph
+from .subgraph import ConnectedSubgraph, SubgraphTimeBudget, SUBGRAPH_TIME_BUDGET
 from .intervals import SpanningMixin, IntervalTreeNode
 from ..utils import Base, TargetedDeconvolutionResultBase
 
@@ -65,9 +65,16 @@ class DependenceCluster(SpanningMixin):
     maximize: bool
         Whether the objective is to maximize or minimize the
         isotopic fit score
+    selection_method: str
+        The name of the method passed to :meth:`ConnectedSubgraph.find_heaviest_path`
+        to select the best disjoint fits
+    selection_budget: SubgraphTimeBudget
+        The time limit shared with the other clusters of the same spectrum when
+        selecting the best disjoint fits, or :const:`None`
     """
 
-    def __init__(self, parent=None, dependencies=None, maximize=True):
+    def __init__(self, parent=None, dependencies=None, maximize=True, selection_method="greedy",
+                 selection_budget=None):
         if parent is None:
             parent = self
         if dependencies is None:
@@ -78,12 +85,15 @@ class DependenceCluster(SpanningMixin):
         self.dependencies = dependencies
         self.rank = 0
         self.maximize = maximize
+        self.selection_method = selection_method
+        self.selection_budget = selection_budget
         self._reset()
 
     def _reset(self):
         self.start = self._start()
         self.end = self._end()
         self.best_fit = self._best_fit()
+        self._disjoint_best_fits = None
 
     def add(self, fit):
         """
@@ -102,7 +112,10 @@ class DependenceCluster(SpanningMixin):
 
     def disjoint_subset(self):
         graph = ConnectedSubgraph(self.dependencies, maximize=self.maximize)
-        return graph.find_heaviest_path()
+        deadline = None
+        if self.selection_budget is not None:
+            deadline = self.selection_budget.deadline()
+        return graph.find_heaviest_path(self.selection_method, deadline=deadline)
 
     def _best_fit(self):
         """
@@ -123,9 +136,11 @@ class DependenceCluster(SpanningMixin):
         -------
         list of IsotopicFitRecord
         """
-        fit_sets = tuple(self.disjoint_subset())
-        best_fits = fit_sets
-        return [node.fit for node in best_fits]
+        if self._disjoint_best_fits is None:
+            fit_sets = tuple(self.disjoint_subset())
+            best_fits = fit_sets
+            self._disjoint_best_fits = [node.fit for node in best_fits]
+        return list(self._disjoint_best_fits)
 
     def _start(self):
         """
@@ -170,34 +185,29 @@ class DependenceCluster(SpanningMixin):
         return self.dependencies[i]
 
 
-class PeakDependenceGraph(object):
-    def __init__(self, peaklist, nodes=None, dependencies=None, max_missed_peaks=1,
-                 use_monoisotopic_superceded_filtering=True, maximize=True):
-        if nodes is None:
-            nodes = {}
-        if dependencies is None:
-            dependencies = set()
-        self.peaklist = peaklist
-        self.nodes = nodes
-        self.dependencies = dependencies
-        self.max_missed_peaks = max_missed_peaks
-        self.use_monoisotopic_superceded_filtering = use_monoisotopic_superceded_filtering
-        self.maximize = maximize
-        if len(self.nodes) == 0:
-            self._populate_initial_graph()
-        self.clusters = None
-        self._interval_tree = None
-        self._solution_map = {}
-        self._all_clusters = []
+class PeakDependenceGraphBase(object):
+    """Common machinery shared by all peak dependence graph implementations
+    for tracking solved clusters and mapping query peaks back to the solution
+    which claimed them.
 
-    def reset(self):
+    Subclasses must implement :meth:`reset`, :meth:`add_fit_dependence`,
+    :meth:`find_non_overlapping_intervals` and :meth:`fits_for_peak`, and provide
+    a :attr:`selection_method` naming the strategy used to choose the disjoint fits
+    of each :class:`DependenceCluster`, either `"greedy"` or `"branch_and_bound"`,
+    and a :attr:`subgraph_budget` bounding the time spent on that selection over
+    all of the clusters of one spectrum.
+    """
+
+    def start_subgraph_budget(self):
+        """Restart :attr:`subgraph_budget` for a new spectrum.
+        """
+        self.subgraph_budget.reset()
+
+    def _reset_solutions(self):
         # Keep a record of all clusters from previous iterations
         self._all_clusters.extend(
             self.clusters if self.clusters is not None else [])
-        self.nodes = dict()
-        self.dependencies = set()
         self._interval_tree = None
-        self._populate_initial_graph()
 
     def add_solution(self, key, solution):
         self._solution_map[key] = solution
@@ -215,6 +225,19 @@ class PeakDependenceGraph(object):
                         self.clusters), self)
         return self._interval_tree
 
+    def fits_for_peak(self, peak):
+        """Retrieve the collection of fits which currently depend upon `peak`
+
+        Parameters
+        ----------
+        peak : FittedPeak
+
+        Returns
+        -------
+        Iterable of IsotopicFitRecord
+        """
+        raise NotImplementedError()
+
     def _deep_fuzzy_solution_for(self, peak, shift=0.5):
         pass
 
@@ -243,7 +266,7 @@ class PeakDependenceGraph(object):
             return self._solution_map[fit]
 
     def find_solution_for(self, peak):
-        peak_node = self.nodes[peak.index]
+        links = self.fits_for_peak(peak)
         tree = self.interval_tree
         clusters = tree.contains_point(peak.mz)
         if len(clusters) == 0:
@@ -256,7 +279,7 @@ class PeakDependenceGraph(object):
         best_fits = acc
 
         # Extract only fits that use the query peak
-        common = tuple(set(best_fits) & set(peak_node.links))
+        common = tuple(set(best_fits) & set(links))
 
         if len(common) > 1 or len(common) == 0:
             if len(common) > 1:
@@ -279,6 +302,45 @@ class PeakDependenceGraph(object):
             fit = common[0]
         return self._solution_map[fit]
 
+    def __iter__(self):
+        return iter(self.clusters)
+
+    def __getitem__(self, i):
+        return self.clusters[i]
+
+
+class PeakDependenceGraph(PeakDependenceGraphBase):
+    def __init__(self, peaklist, nodes=None, dependencies=None, max_missed_peaks=1,
+                 use_monoisotopic_superceded_filtering=True, maximize=True,
+                 selection_method="greedy", subgraph_time_budget=SUBGRAPH_TIME_BUDGET):
+        if nodes is None:
+            nodes = {}
+        if dependencies is None:
+            dependencies = set()
+        self.peaklist = peaklist
+        self.nodes = nodes
+        self.dependencies = dependencies
+        self.max_missed_peaks = max_missed_peaks
+        self.use_monoisotopic_superceded_filtering = use_monoisotopic_superceded_filtering
+        self.maximize = maximize
+        self.selection_method = selection_method
+        self.subgraph_budget = SubgraphTimeBudget(subgraph_time_budget)
+        if len(self.nodes) == 0:
+            self._populate_initial_graph()
+        self.clusters = None
+        self._interval_tree = None
+        self._solution_map = {}
+        self._all_clusters = []
+
+    def reset(self):
+        self._reset_solutions()
+        self.nodes = dict()
+        self.dependencies = set()
+        self._populate_initial_graph()
+
+    def fits_for_peak(self, peak):
+        return self.nodes[peak.index].links
+
     def _populate_initial_graph(self):
         for peak in self.peaklist:
             self.nodes[peak.index] = PeakNode(peak)
@@ -402,18 +464,14 @@ class PeakDependenceGraph(object):
 
         # Use an `id` keyed dictionary over these copied sets to ensure we have exactly one reference
         # to each set of inter-dependent fits, and then convert each set into an instance of `DependenceCluster`
-        clusters = [DependenceCluster(dependencies=c, maximize=self.maximize) for c in {
+        clusters = [DependenceCluster(dependencies=c, maximize=self.maximize,
+                                      selection_method=self.selection_method,
+                                      selection_budget=self.subgraph_budget) for c in {
             id(v): v for v in clusters.values() if v}.values()]
         clusters = sorted(clusters, key=operator.attrgetter("start"))
         self.clusters = clusters
         return clusters
 
-    def __iter__(self):
-        return iter(self.clusters)
-
-    def __getitem__(self, i):
-        return self.clusters[i]
-
     def __repr__(self):
         return "PeakDependenceNetwork(%s, %d)" % (self.peaklist, len(self.dependencies))
 
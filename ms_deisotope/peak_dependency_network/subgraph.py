@@ -1,7 +1,13 @@
+import time
+
 from .utils import GeneratorQueue
 from .intervals import SpanningMixin
 
 
+# The default number of seconds to spend selecting disjoint fits for one spectrum
+SUBGRAPH_TIME_BUDGET = 0.5
+
+
 def ident(x):
     return x
 
@@ -114,6 +120,264 @@ class GreedySubgraphSelection(object):
         return solution
 
 
+def partition_by_span(nodes):
+    """Split `nodes` into runs whose m/z spans chain together. Nodes in different
+    runs cannot share peaks, so each run may be solved independently.
+
+    Parameters
+    ----------
+    nodes : Iterable of FitNode
+
+    Returns
+    -------
+    list of list of FitNode
+    """
+    segments = []
+    current = []
+    current_end = -float('inf')
+    for node in sorted(nodes, key=lambda x: (x.start, x.end)):
+        if current and node.start > current_end:
+            segments.append(current)
+            current = []
+            current_end = -float('inf')
+        current.append(node)
+        if node.end > current_end:
+            current_end = node.end
+    if current:
+        segments.append(current)
+    return segments
+
+
+def weighted_interval_schedule(nodes):
+    """Solve maximum weight interval scheduling over the m/z spans of `nodes`
+    by dynamic programming.
+
+    Nodes whose spans do not overlap cannot share peaks, so the result is always
+    a valid disjoint selection, though it may be weaker than the best selection
+    by shared peaks because fits may interleave.
+
+    Parameters
+    ----------
+    nodes : Sequence of FitNode
+
+    Returns
+    -------
+    score : float
+    solution : list of FitNode
+    """
+    ordered = sorted(nodes, key=lambda x: x.end)
+    ends = [node.end for node in ordered]
+    n = len(ordered)
+    best = [0.0] * (n + 1)
+    take = [False] * (n + 1)
+    previous = [0] * (n + 1)
+    for j in range(1, n + 1):
+        node = ordered[j - 1]
+        # Find the number of nodes which end strictly before this node starts
+        lo, hi = 0, j - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ends[mid] < node.start:
+                lo = mid + 1
+            else:
+                hi = mid
+        previous[j] = lo
+        with_node = best[lo] + node.score
+        if with_node > best[j - 1]:
+            best[j] = with_node
+            take[j] = True
+        else:
+            best[j] = best[j - 1]
+    solution = []
+    j = n
+    while j > 0:
+        if take[j]:
+            solution.append(ordered[j - 1])
+            j = previous[j]
+        else:
+            j -= 1
+    return best[n], solution
+
+
+class BranchAndBoundSubgraphSelection(object):
+    """Select the set of mutually disjoint fits with the largest total score.
+
+    The fits are first partitioned into runs of chained m/z spans, which are solved
+    independently. Within each run, the best of the greedy layering used by
+    :class:`GreedySubgraphSelection` and a weighted interval schedule over the fit
+    spans seeds a depth-first branch-and-bound search over the fit conflict graph,
+    which prunes any branch whose score plus the scores of all still-available fits
+    cannot beat the incumbent.
+
+    The search is bounded by :attr:`time_budget`, shared across all runs, or by an
+    absolute :attr:`deadline` shared with other selections, such as that of a
+    :class:`SubgraphTimeBudget` covering every cluster of a spectrum. When it is
+    exhausted the best solution found so far is used, which is never worse than
+    the greedy solution, and any runs not yet searched use the greedy solution.
+
+    When minimizing, total score is not a meaningful objective, so the greedy
+    solution is used directly.
+
+    Attributes
+    ----------
+    intervals : list of FitNode
+        The fits to select from. Their :attr:`FitNode.overlap_edges` must be populated,
+        as by :meth:`ConnectedSubgraph.populate_edges`.
+    maximize : bool
+        Whether the objective is to maximize or minimize the isotopic fit score
+    time_budget : float
+        The maximum number of seconds to spend searching, if :attr:`deadline` is not given
+    deadline : float
+        The value of :func:`time.time` after which to stop searching, or :const:`None`
+        to stop :attr:`time_budget` seconds after :meth:`select` is called
+    timed_out : bool
+        Whether the time budget was exhausted before the search completed
+    """
+    time_budget = 0.05
+    check_interval = 256
+
+    def __init__(self, subgraph, maximize=True, overlap_fn=peak_overlap, time_budget=None, deadline=None):
+        if time_budget is None:
+            time_budget = self.time_budget
+        self.intervals = list(subgraph)
+        self.maximize = maximize
+        self.overlap_fn = overlap_fn
+        self.time_budget = time_budget
+        self.deadline = deadline
+        self.timed_out = False
+        self._deadline = None
+
+    def _greedy(self, nodes):
+        return layout_layers(list(nodes), overlap_fn=self.overlap_fn, maximize=self.maximize)[0]
+
+    def _solve_segment(self, segment):
+        if len(segment) == 1:
+            return segment
+        greedy = self._greedy(segment)
+        greedy_score = sum(node.score for node in greedy)
+        schedule_score, schedule = weighted_interval_schedule(segment)
+        if schedule_score > greedy_score:
+            best_score, incumbent = schedule_score, schedule
+        else:
+            best_score, incumbent = greedy_score, greedy
+
+        ordered = sorted(segment, key=lambda x: x.score, reverse=True)
+        weights = [max(node.score, 0.0) for node in ordered]
+        position = {node: i for i, node in enumerate(ordered)}
+        conflicts = []
+        for node in ordered:
+            mask = 0
+            for other in node.overlap_edges:
+                j = position.get(other)
+                if j is not None:
+                    mask |= 1 << j
+            conflicts.append(mask)
+
+        best_mask = None
+        stack = [((1 << len(ordered)) - 1, 0.0, 0)]
+        steps = 0
+        while stack:
+            steps += 1
+            if steps % self.check_interval == 0 and time.time() > self._deadline:
+                self.timed_out = True
+                break
+            available, score, chosen = stack.pop()
+            if available == 0:
+                if score > best_score:
+                    best_score = score
+                    best_mask = chosen
+                continue
+            # The upper bound assumes every still-available fit can be added
+            bound = score
+            rest = available
+            while rest:
+                low = rest & -rest
+                bound += weights[low.bit_length() - 1]
+                rest ^= low
+            if bound <= best_score:
+                continue
+            # Branch on the highest scoring available fit, exploring its inclusion first
+            low = available & -available
+            i = low.bit_length() - 1
+            stack.append((available ^ low, score, chosen))
+            stack.append((available & ~low & ~conflicts[i], score + weights[i], chosen | low))
+
+        if best_mask is None:
+            return incumbent
+        solution = []
+        while best_mask:
+            low = best_mask & -best_mask
+            solution.append(ordered[low.bit_length() - 1])
+            best_mask ^= low
+        return solution
+
+    def select(self):
+        if not self.maximize:
+            return self._greedy(self.intervals)
+        if self.deadline is not None:
+            self._deadline = self.deadline
+        else:
+            self._deadline = time.time() + self.time_budget
+        solution = []
+        for segment in partition_by_span(self.intervals):
+            if not self.timed_out and len(segment) > 1 and time.time() > self._deadline:
+                self.timed_out = True
+            if self.timed_out:
+                solution.extend(self._greedy(segment))
+            else:
+                solution.extend(self._solve_segment(segment))
+        return solution
+
+    @classmethod
+    def solve(cls, nodes, maximize=True, overlap_fn=peak_overlap, time_budget=None, deadline=None):
+        solver = cls(nodes, maximize=maximize, overlap_fn=overlap_fn, time_budget=time_budget,
+                     deadline=deadline)
+        solution = solver.select()
+        return solution
+
+
+class SubgraphTimeBudget(object):
+    """A time limit on selecting the disjoint fits of every cluster of one spectrum,
+    so that the total time spent is bounded no matter how many clusters there are.
+
+    The clock starts when the first cluster asks for its :meth:`deadline`, and is
+    restarted for the next spectrum by :meth:`reset`.
+
+    Attributes
+    ----------
+    time_budget : float
+        The number of seconds all selections may take together. If :const:`None`,
+        each selection uses its own default limit.
+    """
+    def __init__(self, time_budget=None):
+        self.time_budget = time_budget
+        self._deadline = None
+
+    def reset(self):
+        self._deadline = None
+
+    def deadline(self):
+        """The value of :func:`time.time` after which selections should fall back
+        to the greedy solution, starting the clock if it is not running.
+
+        Returns
+        -------
+        float
+        """
+        if self.time_budget is None:
+            return None
+        if self._deadline is None:
+            self._deadline = time.time() + self.time_budget
+        return self._deadline
+
+    @property
+    def exhausted(self):
+        return self._deadline is not None and time.time() > self._deadline
+
+    def __repr__(self):
+        return "SubgraphTimeBudget(%r)" % (self.time_budget,)
+
+
 class ExhaustiveDisjointSolutionSelection(object):  # pragma: no cover
     shard_size = 7
 
@@ -238,19 +502,29 @@ class ConnectedSubgraph(object):
         return len(self.nodes)
 
     def populate_edges(self):
-        for i in range(len(self.nodes)):
-            node = self.nodes[i]
-            for j in range(len(self.nodes)):
-                if i == j:
-                    continue
-                other = self.nodes[j]
+        """Connect every pair of nodes whose m/z spans overlap, using a sweep
+        over the nodes ordered by their starting m/z.
+
+        Nodes whose spans do not overlap cannot share any peaks, so they are
+        never compared, and only pairs of nodes within overlapping spans are recorded
+        in :attr:`FitNode.edges` or :attr:`FitNode.overlap_edges`.
+        """
+        active = []
+        for node in sorted(self.nodes, key=lambda x: x.start):
+            active = [other for other in active if other.end >= node.start]
+            for other in active:
                 node.visit(other)
+            active.append(node)
 
-    def find_heaviest_path(self, method="greedy"):
+    def find_heaviest_path(self, method="greedy", **kwargs):
         if len(self) == 1:
             return set(self.nodes)
         if method == "greedy":
             solution = GreedySubgraphSelection.solve(tuple(self), maximize=self.maximize)
             return solution
+        elif method == "branch_and_bound":
+            solution = BranchAndBoundSubgraphSelection.solve(
+                tuple(self), maximize=self.maximize, **kwargs)
+            return solution
         else:
             raise NotImplementedError(method)
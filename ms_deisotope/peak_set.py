@@ -241,8 +241,7 @@ class DeconvolutedPeakSet(Base):
         self.peaks = tuple(sorted(self.peaks, key=operator.attrgetter("neutral_mass")))
         self._mz_ordered = tuple(sorted(self.peaks, key=operator.attrgetter("mz")))
         for i, peak in enumerate(self.peaks):
-            peak.index = _Index()
-            peak.index.neutral_mass = i
+            peak.index = _Index(i, 0)
         for i, peak in enumerate(self._mz_ordered):
             peak.index.mz = i
         return self
@@ -1,10 +1,15 @@
+import json
 import logging
+import time
+from collections import OrderedDict
 
 from ms_peak_picker import pick_peaks
 
+from .averagine import isotopic_shift, mass_charge_ratio
+from .constants import ERROR_TOLERANCE
 from .deconvolution import deconvolute_peaks
 from .data_source.infer_type import MSFileLoader
-from .data_source.common import ScanBunch
+from .data_source.common import ScanBunch, ChargeNotProvided
 from .utils import Base
 from .feature_map import ScanIntervalTree
 from .peak_dependency_network import NoIsotopicClustersError
@@ -41,15 +46,19 @@ class PriorityTarget(Base):
         The m/z of :attr:`peak`
     charge : int
         The charge state hint from :attr:`info`
+    prior_charge : int
+        The charge state of a previous solution for the same precursor ion
+        which was confirmed in this scan, if any. See :class:`PrecursorSolutionCache`
     """
 
     def __init__(self, peak, info, trust_charge_hint=True, precursor_scan_id=None,
-                 product_scan_id=None):
+                 product_scan_id=None, prior_charge=None):
         self.peak = peak
         self.info = info
         self.trust_charge_hint = trust_charge_hint
         self.precursor_scan_id = precursor_scan_id
         self.product_scan_id = product_scan_id
+        self.prior_charge = prior_charge
 
     def __iter__(self):
         yield self.peak
@@ -69,7 +78,8 @@ class PriorityTarget(Base):
         At the moment, this only amounts to either returning the charge
         range unchanged or returning a charge range that only contains
         the hinted charge state, depending upon whether :attr:`trust_charge_hint`
-        is `False` or not.
+        is `False` or not. If a :attr:`prior_charge` is set, the range contains
+        only that charge state.
 
         Parameters
         ----------
@@ -81,7 +91,9 @@ class PriorityTarget(Base):
         tuple
             The updated charge range
         """
-        if self.trust_charge_hint:
+        if self.prior_charge is not None:
+            return (self.prior_charge, self.prior_charge)
+        elif self.trust_charge_hint:
             return (self.charge, self.charge)
         else:
             return charge_range
@@ -91,6 +103,383 @@ class PriorityTarget(Base):
             self.mz, self.peak.intensity, self.charge)
 
 
+def _reported_charge(charge):
+    # A precursor reported without a charge is kept apart from every charge state
+    if charge is None or charge is ChargeNotProvided:
+        return None
+    return int(charge)
+
+
+class PrecursorSolution(Base):
+    """A precursor ion's charge state and monoisotopic m/z as solved in
+    one MS^1 scan.
+
+    Attributes
+    ----------
+    mz : float
+        The precursor m/z reported by the data source
+    charge_hint : int
+        The precursor charge reported by the data source, or :const:`None` if
+        it was not reported
+    scan_time : float
+        The time of the MS^1 scan the solution was found in
+    charge : int
+        The solved charge state
+    monoisotopic_mz : float
+        The solved monoisotopic m/z
+    """
+
+    def __init__(self, mz, charge_hint, scan_time, charge, monoisotopic_mz):
+        self.mz = mz
+        self.charge_hint = charge_hint
+        self.scan_time = scan_time
+        self.charge = charge
+        self.monoisotopic_mz = monoisotopic_mz
+
+    def __repr__(self):
+        return "PrecursorSolution(mz=%0.4f, charge=%d, monoisotopic_mz=%0.4f, scan_time=%0.3f)" % (
+            self.mz, self.charge, self.monoisotopic_mz, self.scan_time)
+
+
+class PrecursorSolutionCache(Base):
+    """Remember the solutions for precursor ions across MS^1 scans so that an
+    ion selected again in a nearby scan, as happens between dynamic exclusion
+    windows, may reuse its earlier charge state and monoisotopic peak.
+
+    Solutions are keyed by the reported precursor m/z, binned by :attr:`mz_window`,
+    and the reported charge state. A solution is only reused when it was found within
+    :attr:`rt_window` of the current scan and the current scan still contains its
+    monoisotopic peak and the next isotopic peak at its charge state.
+
+    Attributes
+    ----------
+    mz_window : float
+        The largest difference between reported precursor m/z values which
+        are considered the same precursor ion
+    rt_window : float
+        The largest difference in scan time a solution may be reused across
+    error_tolerance : float
+        The PPM error tolerance used to confirm a solution's peaks are present
+    solutions : dict
+        The most recent :class:`PrecursorSolution` for each key
+    hits : int
+        The number of solutions reused
+    misses : int
+        The number of lookups with no usable solution
+    """
+
+    def __init__(self, mz_window=0.01, rt_window=1.0, error_tolerance=ERROR_TOLERANCE):
+        self.mz_window = mz_window
+        self.rt_window = rt_window
+        self.error_tolerance = error_tolerance
+        self.solutions = {}
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.solutions.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.solutions)
+
+    def _key(self, mz, charge_hint):
+        return (int(round(mz / self.mz_window)), _reported_charge(charge_hint))
+
+    def _confirm(self, solution, peaks):
+        peak = peaks.has_peak(solution.monoisotopic_mz, self.error_tolerance)
+        if peak is None:
+            return None
+        next_peak = peaks.has_peak(
+            solution.monoisotopic_mz + isotopic_shift(abs(solution.charge)), self.error_tolerance)
+        if next_peak is None:
+            return None
+        return peak
+
+    def lookup(self, precursor_information, scan_time, peaks):
+        """Find a solution for `precursor_information` which is confirmed by `peaks`
+
+        Parameters
+        ----------
+        precursor_information : PrecursorInformation
+            The precursor ion to look up
+        scan_time : float
+            The time of the MS^1 scan `peaks` were picked from
+        peaks : ms_peak_picker.PeakIndex
+            The peaks of the current MS^1 scan
+
+        Returns
+        -------
+        solution : PrecursorSolution
+            The confirmed solution, or :const:`None`
+        peak : FittedPeak
+            The peak in `peaks` matching the solution's monoisotopic peak, or :const:`None`
+        """
+        mz = precursor_information.mz
+        bin_index, charge_hint = self._key(mz, precursor_information.charge)
+        for offset in (0, -1, 1):
+            solution = self.solutions.get((bin_index + offset, charge_hint))
+            if solution is None:
+                continue
+            if abs(solution.mz - mz) > self.mz_window or abs(
+                    solution.scan_time - scan_time) > self.rt_window:
+                continue
+            peak = self._confirm(solution, peaks)
+            if peak is not None:
+                self.hits += 1
+                return solution, peak
+        self.misses += 1
+        return None, None
+
+    def store(self, precursor_information, scan_time, peak):
+        """Record the solved `peak` for `precursor_information`
+
+        Parameters
+        ----------
+        precursor_information : PrecursorInformation
+            The precursor ion which was solved
+        scan_time : float
+            The time of the MS^1 scan the solution was found in
+        peak : DeconvolutedPeak
+            The precursor ion's solution
+        """
+        key = self._key(precursor_information.mz, precursor_information.charge)
+        self.solutions[key] = PrecursorSolution(
+            precursor_information.mz, _reported_charge(precursor_information.charge), scan_time,
+            int(peak.charge), mass_charge_ratio(peak.neutral_mass, peak.charge))
+
+    def discard(self, precursor_information):
+        """Forget any solution for `precursor_information`
+        """
+        self.solutions.pop(self._key(precursor_information.mz, precursor_information.charge), None)
+
+    def __repr__(self):
+        return "PrecursorSolutionCache(%d solutions, hits=%d, misses=%d)" % (
+            len(self), self.hits, self.misses)
+
+
+class ScanStatistics(Base):
+    """The time spent processing one scan and the work done to deconvolute it.
+
+    Attributes
+    ----------
+    scan_id : str
+        The scan's identifier
+    ms_level : int
+        The scan's MS level
+    scan_time : float
+        The scan's acquisition time
+    timings : OrderedDict
+        The seconds spent in each stage of processing the scan, in the order they
+        were first entered. Stages which apply to a whole :class:`~.ScanBunch`, like
+        ``"read"`` and ``"write"``, are recorded on the MS^1 scan.
+    peak_count : int
+        The number of peaks picked
+    deconvolution : ms_deisotope.deconvolution.DeconvolutionStatistics
+        The statistics reported by :func:`~.deconvolute_peaks`, if the scan was deconvoluted
+    """
+
+    def __init__(self, scan_id, ms_level=None, scan_time=None):
+        self.scan_id = scan_id
+        self.ms_level = ms_level
+        self.scan_time = scan_time
+        self.timings = OrderedDict()
+        self.peak_count = None
+        self.deconvolution = None
+
+    def add_time(self, stage, seconds):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    @property
+    def total_time(self):
+        return sum(self.timings.values())
+
+    def to_dict(self):
+        """Convert the statistics into a JSON-serializable :class:`dict`
+
+        Returns
+        -------
+        dict
+        """
+        return {
+            "scan_id": self.scan_id,
+            "ms_level": self.ms_level,
+            "scan_time": self.scan_time,
+            "timings": dict(self.timings),
+            "total_time": self.total_time,
+            "peak_count": self.peak_count,
+            "deconvolution": self.deconvolution.to_dict() if self.deconvolution is not None else None,
+        }
+
+    def __repr__(self):
+        return "ScanStatistics(%r, ms_level=%r, total_time=%0.4f)" % (
+            self.scan_id, self.ms_level, self.total_time)
+
+
+class _StageTimer(object):
+    def __init__(self, record, stage):
+        self.record = record
+        self.stage = stage
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self.record
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.record.add_time(self.stage, time.time() - self.start)
+
+
+class _NullTimer(object):
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_null_timer = _NullTimer()
+
+
+class ProcessingStatistics(Base):
+    """Collects a :class:`ScanStatistics` record for each scan processed by a
+    :class:`ScanProcessor`.
+
+    The records of a :class:`~.ScanBunch` are held in :attr:`pending` until the next
+    bunch is read or :meth:`flush` is called, so that stages performed by the caller
+    after processing, like writing the bunch out, may still be timed with :meth:`measure`.
+    Each record is then passed to :attr:`callback`, if any, and appended to :attr:`records`
+    if :attr:`keep_records` is `True`.
+
+    Attributes
+    ----------
+    callback : callable
+        Called with each :class:`ScanStatistics` once it is complete, such as a
+        :class:`JSONLinesStatisticsWriter`
+    keep_records : bool
+        Whether to retain completed records in :attr:`records`
+    records : list of ScanStatistics
+        The completed records
+    pending : OrderedDict
+        The records of the bunch currently being processed, by scan id
+    """
+
+    def __init__(self, callback=None, keep_records=True):
+        self.callback = callback
+        self.keep_records = keep_records
+        self.records = []
+        self.pending = OrderedDict()
+
+    def record_for(self, scan):
+        """Get the pending record for `scan`, creating it if needed.
+
+        Parameters
+        ----------
+        scan : Scan or str
+            The scan, or its id
+
+        Returns
+        -------
+        ScanStatistics
+        """
+        scan_id = getattr(scan, "id", scan)
+        try:
+            return self.pending[scan_id]
+        except KeyError:
+            record = self.pending[scan_id] = ScanStatistics(
+                scan_id, getattr(scan, "ms_level", None), getattr(scan, "scan_time", None))
+            return record
+
+    def measure(self, scan, stage):
+        """A context manager which adds the time spent inside it to `stage` of
+        the record for `scan`.
+
+        Parameters
+        ----------
+        scan : Scan or str
+            The scan, or its id
+        stage : str
+            The name of the stage
+
+        Returns
+        -------
+        context manager
+        """
+        return _StageTimer(self.record_for(scan), stage)
+
+    def flush(self):
+        """Complete all pending records, passing them to :attr:`callback`
+        """
+        pending = list(self.pending.values())
+        self.pending.clear()
+        for record in pending:
+            if self.callback is not None:
+                self.callback(record)
+            if self.keep_records:
+                self.records.append(record)
+
+    def summary(self):
+        """Aggregate the completed records by MS level.
+
+        Returns
+        -------
+        dict
+            Maps each MS level to the number of scans, the total seconds spent in each
+            stage, and the total peaks, fits explored and averagine cache hit rate
+        """
+        levels = {}
+        for record in self.records:
+            level = levels.setdefault(record.ms_level, {
+                "scans": 0, "timings": {}, "peak_count": 0, "fits_explored": 0,
+                "averagine_cache_hits": 0, "averagine_cache_misses": 0})
+            level["scans"] += 1
+            for stage, seconds in record.timings.items():
+                level["timings"][stage] = level["timings"].get(stage, 0.0) + seconds
+            level["peak_count"] += record.peak_count or 0
+            if record.deconvolution is not None:
+                level["fits_explored"] += record.deconvolution.fits_explored
+                level["averagine_cache_hits"] += record.deconvolution.averagine_cache_hits
+                level["averagine_cache_misses"] += record.deconvolution.averagine_cache_misses
+        for level in levels.values():
+            total = level["averagine_cache_hits"] + level["averagine_cache_misses"]
+            level["averagine_cache_hit_rate"] = level["averagine_cache_hits"] / float(total) if total else 0.0
+        return levels
+
+    def write_json_lines(self, handle):
+        """Write each completed record to `handle` as a line of JSON
+        """
+        writer = JSONLinesStatisticsWriter(handle)
+        for record in self.records:
+            writer(record)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __repr__(self):
+        return "ProcessingStatistics(%d records, %d pending)" % (len(self.records), len(self.pending))
+
+
+class JSONLinesStatisticsWriter(object):
+    """A :attr:`ProcessingStatistics.callback` which writes each :class:`ScanStatistics`
+    to a text file as a line of JSON, flushing after each record so the file may be
+    followed while processing is running.
+
+    Attributes
+    ----------
+    handle : file-like
+        The text file to write to
+    """
+
+    def __init__(self, handle):
+        self.handle = handle
+
+    def __call__(self, record):
+        self.handle.write(json.dumps(record.to_dict(), sort_keys=True))
+        self.handle.write("\n")
+        self.handle.flush()
+
+
 class ScanProcessor(Base):
     """Orchestrates the deconvolution of a `ScanIterator` scan by scan. This process will
     apply different rules for MS^1 scans and MS^n scans. This type itself is an Iterator,
@@ -138,6 +527,23 @@ class ScanProcessor(Base):
         the charge state of precursor isotopic patterns. Defaults to `True`
     terminate_on_error: bool
         Whether or not  to stop processing on an error. Defaults to `True`
+    targeted_ms1_only : bool
+        Whether to deconvolute only the neighborhoods of the precursor ions chosen for
+        MS^n in each MS^1 scan, skipping full-spectrum deconvolution. The MS^1 scan's
+        :attr:`deconvoluted_peak_set` then contains only those solutions. Defaults to `False`
+    precursor_cache : PrecursorSolutionCache
+        Remembers precursor ion solutions across MS^1 scans to narrow the search for
+        precursors selected again in nearby scans. Only populated when `use_precursor_cache`
+        is `True`, otherwise `None`.
+    statistics : ProcessingStatistics
+        Records the time spent reading, picking peaks and deconvoluting each scan, along
+        with the deconvoluter's counters. `statistics` may be passed as a :class:`ProcessingStatistics`
+        instance, or `True` to create one. Defaults to `None`, which records nothing.
+    slow_scan_hook : callable
+        Called with the scan, its peaks, its priority targets, the arguments given to
+        :func:`~.deconvolute_peaks` and the number of seconds it took after each scan
+        is deconvoluted, such as a :class:`~.SlowScanCapture` to save the inputs of slow
+        scans for replay. Defaults to `None`.
     """
 
     def __init__(self, data_source, ms1_peak_picking_args=None,
@@ -147,7 +553,11 @@ class ScanProcessor(Base):
                  trust_charge_hint=True,
                  loader_type=None,
                  envelope_selector=None,
-                 terminate_on_error=True):
+                 terminate_on_error=True,
+                 use_precursor_cache=False,
+                 targeted_ms1_only=False,
+                 statistics=None,
+                 slow_scan_hook=None):
         if loader_type is None:
             loader_type = MSFileLoader
 
@@ -167,11 +577,35 @@ class ScanProcessor(Base):
         self._signal_source = self.loader_type(data_source)
         self.envelope_selector = envelope_selector
         self.terminate_on_error = terminate_on_error
+        self.precursor_cache = PrecursorSolutionCache() if use_precursor_cache else None
+        self.targeted_ms1_only = targeted_ms1_only
+        if statistics is True:
+            statistics = ProcessingStatistics()
+        elif statistics is False:
+            statistics = None
+        self.statistics = statistics
+        self.slow_scan_hook = slow_scan_hook
 
     @property
     def reader(self):
         return self._signal_source
 
+    def _measure(self, scan, stage):
+        if self.statistics is None:
+            return _null_timer
+        return self.statistics.measure(scan, stage)
+
+    def _after_deconvolution(self, scan, priorities, deconvolution_args, elapsed):
+        if self.slow_scan_hook is not None:
+            self.slow_scan_hook(scan, scan.peak_set, priorities, deconvolution_args, elapsed)
+
+    def _record_deconvolution(self, scan, decon_result):
+        if self.statistics is None:
+            return
+        record = self.statistics.record_for(scan)
+        record.peak_count = len(scan.peak_set)
+        record.deconvolution = decon_result.statistics
+
     def pick_precursor_scan_peaks(self, precursor_scan):
         logger.info("Picking Precursor Scan Peaks: %r", precursor_scan)
         if precursor_scan.is_profile:
@@ -246,7 +680,8 @@ class ScanProcessor(Base):
         product_scans: list of Scan
             As Parameter
         """
-        prec_peaks = self.pick_precursor_scan_peaks(precursor_scan)
+        with self._measure(precursor_scan, "pick_peaks"):
+            prec_peaks = self.pick_precursor_scan_peaks(precursor_scan)
         priorities = []
 
         for scan in product_scans:
@@ -263,10 +698,22 @@ class ScanProcessor(Base):
                         precursor_ion, scan.id,
                         precursor_scan.id))
             else:
+                if self.precursor_cache is not None:
+                    self._apply_precursor_prior(precursor_scan, target)
                 priorities.append(target)
 
         return precursor_scan, priorities, product_scans
 
+    def _apply_precursor_prior(self, precursor_scan, target):
+        solution, peak = self.precursor_cache.lookup(
+            target.info, precursor_scan.scan_time, precursor_scan.peak_set)
+        if solution is None:
+            return
+        if self.trust_charge_hint and solution.charge_hint is not None and solution.charge != target.charge:
+            return
+        target.peak = peak
+        target.prior_charge = solution.charge
+
     def deconvolute_precursor_scan(self, precursor_scan, priorities=None):
         if priorities is None:
             priorities = []
@@ -280,10 +727,15 @@ class ScanProcessor(Base):
             polarity = precursor_scan.polarity
             ms1_deconvolution_args['charge_range'] = tuple(
                 polarity * abs(c) for c in ms1_deconvolution_args['charge_range'])
+        ms1_deconvolution_args['targeted_only'] = self.targeted_ms1_only
         try:
-            decon_result = deconvolute_peaks(
-                precursor_scan.peak_set, priority_list=priorities,
-                **ms1_deconvolution_args)
+            start = time.time()
+            with self._measure(precursor_scan, "deconvolute"):
+                decon_result = deconvolute_peaks(
+                    precursor_scan.peak_set, priority_list=priorities,
+                    collect_statistics=self.statistics is not None,
+                    **ms1_deconvolution_args)
+            self._after_deconvolution(precursor_scan, priorities, ms1_deconvolution_args, time.time() - start)
         except NoIsotopicClustersError as e:
             logger.info("No isotopic clusters found in %r" % precursor_scan.id)
             e.scan_id = precursor_scan.id
@@ -291,10 +743,14 @@ class ScanProcessor(Base):
                 raise e
 
         dec_peaks, priority_results = decon_result
+        self._record_deconvolution(precursor_scan, decon_result)
 
         if decon_result.errors:
             logger.error("Errors occurred during deconvolution of %s, %r" % (
                 precursor_scan.id, decon_result.errors))
+        if decon_result.degraded:
+            logger.info("Deconvolution of %s exceeded its budget and was degraded" % (
+                precursor_scan.id,))
 
         for pr in priority_results:
             if pr is None:
@@ -311,7 +767,7 @@ class ScanProcessor(Base):
         for product_scan in precursor_scan.product_scans:
             precursor_information = product_scan.precursor_information
 
-            i = get_nearest_index(precursor_information.mz, priorities)
+            i = self._find_priority_index(precursor_information, priorities)
 
             # If no peak is found in the priority list, it means the priority list is empty.
             # This should never happen in the current implementation. If it did, then we forgot
@@ -321,6 +777,7 @@ class ScanProcessor(Base):
                     "Could not find deconvolution for %r (No nearby peak in the priority list)",
                     precursor_information)
                 precursor_information.default()
+                self._discard_precursor_solution(precursor_information)
                 continue
 
             peak = priority_results[i]
@@ -330,6 +787,7 @@ class ScanProcessor(Base):
                     "Could not find deconvolution for %r (No solution was found for this region)",
                     precursor_information)
                 precursor_information.default()
+                self._discard_precursor_solution(precursor_information)
 
                 continue
             elif peak.charge == 1 or (peak.charge != precursor_information.charge and self.trust_charge_hint):
@@ -337,12 +795,25 @@ class ScanProcessor(Base):
                     "Could not find deconvolution for %r (Unacceptable solution was proposed: %r)",
                     precursor_information, peak)
                 precursor_information.default()
+                self._discard_precursor_solution(precursor_information)
                 continue
 
             precursor_information.extract(peak)
+            if self.precursor_cache is not None:
+                self.precursor_cache.store(precursor_information, precursor_scan.scan_time, peak)
         precursor_scan.deconvoluted_peak_set = dec_peaks
         return dec_peaks, priority_results
 
+    def _discard_precursor_solution(self, precursor_information):
+        if self.precursor_cache is not None:
+            self.precursor_cache.discard(precursor_information)
+
+    def _find_priority_index(self, precursor_information, priorities):
+        for i, target in enumerate(priorities):
+            if target.info is precursor_information:
+                return i
+        return get_nearest_index(precursor_information.mz, priorities)
+
     def deconvolute_product_scan(self, product_scan):
         logger.info("Deconvoluting Product Scan %r", product_scan)
         precursor_ion = product_scan.precursor_information
@@ -361,7 +832,14 @@ class ScanProcessor(Base):
                 polarity * abs(c) for c in deconargs["charge_range"]]
 
         try:
-            dec_peaks, _ = deconvolute_peaks(product_scan.peak_set, **deconargs)
+            start = time.time()
+            with self._measure(product_scan, "deconvolute"):
+                decon_result = deconvolute_peaks(
+                    product_scan.peak_set, collect_statistics=self.statistics is not None,
+                    **deconargs)
+            self._after_deconvolution(product_scan, [], deconargs, time.time() - start)
+            dec_peaks, _ = decon_result
+            self._record_deconvolution(product_scan, decon_result)
         except NoIsotopicClustersError as e:
             logger.info("No Isotopic Clusters found in %r" % product_scan.id)
             e.scan_id = product_scan.id
@@ -372,12 +850,18 @@ class ScanProcessor(Base):
         return dec_peaks
 
     def _get_next_scans(self):
+        if self.statistics is not None:
+            # The previous bunch is complete once the next one is requested
+            self.statistics.flush()
+            start = time.time()
         precursor, products = next(self.reader)
 
         if self.pick_only_tandem_envelopes:
             while len(products) == 0:
                 precursor, products = next(self.reader)
 
+        if self.statistics is not None and precursor is not None:
+            self.statistics.record_for(precursor).add_time("read", time.time() - start)
         return precursor, products
 
     def process(self, precursor, products):
@@ -402,7 +886,8 @@ class ScanProcessor(Base):
         self.deconvolute_precursor_scan(precursor_scan, priorities)
 
         for product_scan in product_scans:
-            self.pick_product_scan_peaks(product_scan)
+            with self._measure(product_scan, "pick_peaks"):
+                self.pick_product_scan_peaks(product_scan)
             self.deconvolute_product_scan(product_scan)
 
         return precursor_scan, product_scans
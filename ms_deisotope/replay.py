@@ -0,0 +1,237 @@
+"""Capture the inputs of scans whose deconvolution is slow, and replay them
+in isolation under :mod:`cProfile`.
+
+A :class:`SlowScanCapture` may be passed to :class:`~.ScanProcessor` as its
+`slow_scan_hook`. Whenever deconvoluting a scan takes longer than its threshold,
+the picked peaks, the priority targets and the arguments given to
+:func:`~.deconvolute_peaks` are written to a replay file, which :func:`load_replay`
+reads back as a :class:`DeconvolutionReplay`.
+
+Usage::
+
+    python -m ms_deisotope.replay scan.replay [--sort cumulative] [--limit 40] [--dump PATH]
+"""
+import argparse
+import cProfile
+import gzip
+import logging
+import os
+import pickle
+import pstats
+import re
+import sys
+import time
+
+from .deconvolution import deconvolute_peaks
+from .utils import Base
+
+logger = logging.getLogger("ms_deisotope.replay")
+
+
+class ReplayTarget(Base):
+    """A priority target reduced to what :func:`~.deconvolute_peaks` uses
+    of it, so it can be stored without its scan.
+
+    Attributes
+    ----------
+    mz : float
+        The m/z of the peak the targeted deconvolution started from
+    charge_range : tuple
+        The charge range the target's :meth:`~.PriorityTarget.charge_range_hint`
+        produced
+    precursor_scan_id : str
+        The id of the scan the target was selected in, if known
+    product_scan_id : str
+        The id of the scan the target was selected for, if known
+    """
+
+    def __init__(self, mz, charge_range, precursor_scan_id=None, product_scan_id=None):
+        self.mz = mz
+        self.charge_range = tuple(charge_range)
+        self.precursor_scan_id = precursor_scan_id
+        self.product_scan_id = product_scan_id
+
+    @property
+    def peak(self):
+        return self.mz
+
+    def charge_range_hint(self, charge_range):
+        return self.charge_range
+
+    @classmethod
+    def from_target(cls, target, charge_range):
+        try:
+            mz = target.peak.mz
+            hinted_charge_range = target.charge_range_hint(charge_range)
+        except AttributeError:
+            mz = getattr(target, "mz", target)
+            hinted_charge_range = charge_range
+        return cls(mz, hinted_charge_range, getattr(target, "precursor_scan_id", None),
+                   getattr(target, "product_scan_id", None))
+
+    def __repr__(self):
+        return "ReplayTarget(%0.4f, %r)" % (self.mz, self.charge_range)
+
+
+class DeconvolutionReplay(Base):
+    """Everything needed to repeat one call to :func:`~.deconvolute_peaks`.
+
+    Attributes
+    ----------
+    scan_id : str
+        The id of the scan the peaks were picked from
+    ms_level : int
+        The MS level of the scan
+    peaklist : ms_peak_picker.PeakIndex
+        The picked peaks which were deconvoluted
+    priority_targets : list of ReplayTarget
+        The priority targets which were deconvoluted
+    deconvolution_args : dict
+        The keyword arguments passed to :func:`~.deconvolute_peaks`
+    elapsed : float
+        The number of seconds the original deconvolution took
+    """
+
+    def __init__(self, scan_id, ms_level, peaklist, priority_targets, deconvolution_args, elapsed=None):
+        self.scan_id = scan_id
+        self.ms_level = ms_level
+        self.peaklist = peaklist
+        self.priority_targets = priority_targets
+        self.deconvolution_args = deconvolution_args
+        self.elapsed = elapsed
+
+    @classmethod
+    def from_scan(cls, scan, peaklist, priorities, deconvolution_args, elapsed=None):
+        """Build a replay from the inputs a :class:`~.ScanProcessor` gave to
+        :func:`~.deconvolute_peaks` for `scan`.
+        """
+        charge_range = deconvolution_args.get("charge_range", (1, 8))
+        targets = [ReplayTarget.from_target(target, charge_range) for target in (priorities or [])]
+        return cls(scan.id, scan.ms_level, peaklist, targets, dict(deconvolution_args), elapsed)
+
+    def _arguments(self):
+        args = dict(self.deconvolution_args)
+        # deconvolute_peaks updates `decon_config` in place
+        if args.get("decon_config") is not None:
+            args["decon_config"] = dict(args["decon_config"])
+        return args
+
+    def run(self):
+        """Repeat the deconvolution
+
+        Returns
+        -------
+        DeconvolutionProcessResult
+        """
+        return deconvolute_peaks(
+            self.peaklist, priority_list=list(self.priority_targets), **self._arguments())
+
+    def profile(self):
+        """Repeat the deconvolution under :mod:`cProfile`
+
+        Returns
+        -------
+        result : DeconvolutionProcessResult
+            The result of :meth:`run`
+        stats : pstats.Stats
+            The profile
+        """
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            result = self.run()
+        finally:
+            profiler.disable()
+        return result, pstats.Stats(profiler)
+
+    def save(self, path):
+        with gzip.open(path, 'wb') as fh:
+            pickle.dump(self, fh, pickle.HIGHEST_PROTOCOL)
+        return path
+
+    def __repr__(self):
+        return "DeconvolutionReplay(%r, ms_level=%r, %d peaks, %d targets, elapsed=%r)" % (
+            self.scan_id, self.ms_level, len(self.peaklist), len(self.priority_targets), self.elapsed)
+
+
+def load_replay(path):
+    """Read a :class:`DeconvolutionReplay` written by :meth:`DeconvolutionReplay.save`
+
+    Parameters
+    ----------
+    path : str
+
+    Returns
+    -------
+    DeconvolutionReplay
+    """
+    with gzip.open(path, 'rb') as fh:
+        return pickle.load(fh)
+
+
+class SlowScanCapture(Base):
+    """A :attr:`~.ScanProcessor.slow_scan_hook` which saves a :class:`DeconvolutionReplay`
+    for each scan whose deconvolution takes at least :attr:`threshold` seconds.
+
+    Attributes
+    ----------
+    directory : str
+        The directory replay files are written to, named after their scan ids
+    threshold : float
+        The number of seconds a deconvolution must take to be captured
+    max_captures : int
+        The most replay files to write, or :const:`None` for no limit
+    captured : list of str
+        The paths of the replay files written
+    """
+
+    def __init__(self, directory, threshold=5.0, max_captures=None):
+        self.directory = directory
+        self.threshold = threshold
+        self.max_captures = max_captures
+        self.captured = []
+
+    def path_for(self, scan_id):
+        return os.path.join(self.directory, "%s.replay" % (re.sub(r"[^\w.-]+", "_", str(scan_id)),))
+
+    def __call__(self, scan, peaklist, priorities, deconvolution_args, elapsed):
+        if elapsed < self.threshold:
+            return None
+        if self.max_captures is not None and len(self.captured) >= self.max_captures:
+            return None
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        replay = DeconvolutionReplay.from_scan(scan, peaklist, priorities, deconvolution_args, elapsed)
+        path = replay.save(self.path_for(scan.id))
+        self.captured.append(path)
+        logger.warning("Deconvolution of %s took %0.2f seconds, saved replay to %s", scan.id, elapsed, path)
+        return path
+
+    def __repr__(self):
+        return "SlowScanCapture(%r, threshold=%r, %d captured)" % (
+            self.directory, self.threshold, len(self.captured))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the deconvolution of a captured slow scan")
+    parser.add_argument("path", help="The replay file to load")
+    parser.add_argument("--sort", default="cumulative", help="The key to sort the profile by")
+    parser.add_argument("--limit", type=int, default=40, help="The number of functions to show")
+    parser.add_argument("--dump", default=None, help="Also write the raw profile to this path")
+    args = parser.parse_args(argv)
+
+    replay = load_replay(args.path)
+    print(replay)
+    start = time.time()
+    result, stats = replay.profile()
+    print("Replayed in %0.2f seconds (originally %s), %d deconvoluted peaks" % (
+        time.time() - start, "%0.2f seconds" % replay.elapsed if replay.elapsed is not None else "unknown",
+        len(result.peak_set)))
+    stats.sort_stats(args.sort).print_stats(args.limit)
+    if args.dump:
+        stats.dump_stats(args.dump)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -231,9 +231,30 @@ class IsotopicFitterBase(Base):
     def reject(self, fit):
         return self.select.reject(fit)
 
+    def reject_score(self, score):
+        return self.select.reject_score(score)
+
     def is_maximizing(self):
         return self.select.is_maximizing()
 
+    def score_bound(self, observed):
+        """Compute an optimistic bound on the score any theoretical isotopic pattern
+        scaled to `observed` could receive, without scaling or scoring it.
+
+        Scorers which cannot bound their scores return positive infinity if they
+        are maximizing and negative infinity otherwise, so no fit is ever pruned.
+
+        Parameters
+        ----------
+        observed : list of FittedPeak
+            The experimental peaks matched for the isotopic pattern
+
+        Returns
+        -------
+        float
+        """
+        return float('inf') if self.is_maximizing() else -float('inf')
+
     def configure(self, deconvoluter, **kwargs):
         return self
 
@@ -348,6 +369,26 @@ class MSDeconVFitter(IsotopicFitterBase):
             score += inc
         return score
 
+    def score_bound(self, observed):
+        """Bound the score of a fit on `observed`. Each peak's contribution
+        is largest when the theoretical intensity equals the observed intensity
+        and the m/z matches exactly, giving the square root of its intensity.
+
+        Parameters
+        ----------
+        observed : list of FittedPeak
+
+        Returns
+        -------
+        float
+        """
+        bound = 0
+        for obs in observed:
+            if obs.signal_to_noise < 1:
+                continue
+            bound += math.sqrt(obs.intensity)
+        return bound
+
 
 class PenalizedMSDeconVFitter(IsotopicFitterBase):
 
@@ -363,6 +404,12 @@ class PenalizedMSDeconVFitter(IsotopicFitterBase):
         penalty = abs(self.penalizer.evaluate(peaklist, observed, expected))
         return score * (1 - penalty * self.penalty_factor)
 
+    def score_bound(self, observed):
+        # The penalty can only reduce the MSDeconV score
+        if self.penalty_factor < 0:
+            return float('inf')
+        return self.msdeconv.score_bound(observed)
+
 
 def decon2ls_chisqr_test(peaklist, observed, expected, **kwargs):
     fit_total = 0
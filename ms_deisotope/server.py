@@ -0,0 +1,462 @@
+"""A long-lived local deconvolution service, so that interactive tools need not pay
+for importing the library, building averagine caches and loading file indices on
+every request.
+
+:class:`DeconvolutionService` holds an :class:`~.AveragineCache` for each model in
+:data:`~.cli.AVERAGINES`, which may be filled ahead of time with
+:meth:`~DeconvolutionService.warm_up`, and keeps the most recently used readers
+open. :class:`DeconvolutionServer` serves it over HTTP, handling each connection
+on its own thread, and either deconvoluting in that thread or handing the request
+to a pool of worker processes which each hold their own warm service.
+
+Requests are POSTed to ``/deconvolute`` as a JSON object, giving either the centroided
+peaks to deconvolute as ``mz`` and ``intensity`` lists, or the ``path`` of a file and the
+``scan_id`` of a scan to pick peaks from, along with any of ``averagine``, ``scorer``,
+``score_threshold``, ``charge_range``, ``error_tolerance`` and ``truncate_after``. The
+:class:`~.DeconvolutedPeakSet` is returned in the columns of
+:func:`~.deconvoluted_peak_set_to_arrays`, either as JSON or, when ``format`` is
+``"binary"``, packed by :meth:`~.ArrayBundle.to_packed_bytes`. :func:`decode_response`
+rebuilds the peak set from either form, and :func:`request_deconvolution` sends a
+request and decodes its response. A GET of ``/status`` describes the service.
+
+The server will open any file its user can read, so it should only listen on
+the loopback interface, as it does by default::
+
+    ms-deisotope serve --port 8765 --workers 2 --warm-up 200 2000
+"""
+import json
+import logging
+import multiprocessing
+import os
+import threading
+
+from collections import OrderedDict
+
+import numpy as np
+
+from ms_peak_picker import pick_peaks
+
+from .averagine import AveragineCache
+from .cli import AVERAGINES, make_scorer
+from .constants import ERROR_TOLERANCE, TRUNCATE_AFTER
+from .data_source.infer_type import MSFileLoader
+from .deconvolution import deconvolute_peaks
+from .transfer import ArrayBundle, deconvoluted_peak_set_from_arrays, deconvoluted_peak_set_to_arrays
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.request import ProxyHandler, Request, build_opener
+    from urllib.error import HTTPError
+except ImportError:  # pragma: no cover
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib2 import ProxyHandler, Request, build_opener, HTTPError
+
+logger = logging.getLogger("ms_deisotope.server")
+
+
+JSON_CONTENT_TYPE = "application/json"
+BINARY_CONTENT_TYPE = "application/octet-stream"
+
+# The server is local, so requests to it should not go through any configured proxy
+_opener = build_opener(ProxyHandler({}))
+
+
+class DeconvolutionService(object):
+    """Deconvolutes peak lists and scans on request, reusing averagine caches
+    and readers between requests.
+
+    Requests may be handled from several threads at once. The averagine caches are
+    shared by all of them, while each reader is used by one thread at a time.
+
+    Attributes
+    ----------
+    averagine_caches : dict
+        Maps the name of each averagine model to its :class:`~.AveragineCache`
+    readers : OrderedDict
+        Maps the absolute path of each open file to its reader and the lock guarding it,
+        from least to most recently used
+    max_readers : int
+        The number of readers to keep open, after which the least recently used is closed
+    requests_handled : int
+        The number of requests deconvoluted so far
+    """
+
+    def __init__(self, averagines=None, max_readers=8, cache_truncation=1.0):
+        if averagines is None:
+            averagines = sorted(AVERAGINES)
+        self.averagine_caches = {
+            name: AveragineCache(AVERAGINES[name], dict(), cache_truncation)
+            for name in averagines}
+        self.readers = OrderedDict()
+        self.max_readers = max_readers
+        self.requests_handled = 0
+        self._lock = threading.Lock()
+
+    def warm_up(self, mz_range=(200., 2000.), charge_range=(1, 4), step=1.0, averagines=None):
+        """Fill the averagine caches with the isotopic patterns of every `step` m/z
+        in `mz_range` at each charge state in `charge_range`.
+
+        Returns
+        -------
+        int
+            The number of patterns computed
+        """
+        if averagines is None:
+            averagines = sorted(self.averagine_caches)
+        low, high = charge_range
+        charges = [z for z in range(low, high + 1) if z != 0]
+        mzs = np.arange(mz_range[0], mz_range[1] + step, step)
+        count = 0
+        for name in averagines:
+            cache = self.averagine_caches[name]
+            for charge in charges:
+                for mz in mzs:
+                    cache.isotopic_cluster(float(mz), charge, truncate_after=TRUNCATE_AFTER)
+                    count += 1
+        logger.info("Warmed up %d isotopic patterns for %s", count, ", ".join(averagines))
+        return count
+
+    def get_reader(self, path):
+        """Get the open reader for `path`, opening it if needed
+
+        Returns
+        -------
+        reader : RandomAccessScanSource
+        lock : threading.Lock
+            Must be held while using `reader`
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            try:
+                entry = self.readers.pop(path)
+            except KeyError:
+                if not os.path.exists(path):
+                    raise KeyError("No such file %r" % (path,))
+                entry = (MSFileLoader(path), threading.Lock())
+            self.readers[path] = entry
+            while len(self.readers) > self.max_readers:
+                _, (reader, lock) = self.readers.popitem(last=False)
+                with lock:
+                    reader.close()
+        return entry
+
+    def _peaks_from_scan(self, path, scan_id):
+        reader, lock = self.get_reader(path)
+        with lock:
+            try:
+                scan = reader.get_scan_by_id(scan_id)
+            except Exception:
+                # Readers differ in how they fail on an unknown id
+                logger.debug("Failed to read %r from %r", scan_id, path, exc_info=True)
+                scan = None
+            if scan is None:
+                raise KeyError("No scan %r in %r" % (scan_id, path))
+            peaks = scan.pick_peaks().peak_set
+        return peaks
+
+    def peaks_for(self, request):
+        """Get the peaks to deconvolute for `request`
+
+        Returns
+        -------
+        ms_peak_picker.PeakIndex
+        """
+        if "path" in request:
+            if "scan_id" not in request:
+                raise ValueError("A request for a file must give a scan_id")
+            return self._peaks_from_scan(request["path"], request["scan_id"])
+        if "mz" not in request or "intensity" not in request:
+            raise ValueError("A request must give either mz and intensity or path and scan_id")
+        mz = np.asarray(request["mz"], dtype=np.float64)
+        intensity = np.asarray(request["intensity"], dtype=np.float64)
+        if mz.shape != intensity.shape or mz.ndim != 1:
+            raise ValueError("mz and intensity must be lists of the same length")
+        order = np.argsort(mz, kind="mergesort")
+        return pick_peaks(mz[order], intensity[order], peak_mode="centroid")
+
+    def deconvolution_arguments(self, request):
+        """Translate the configuration of `request` into keyword arguments
+        for :func:`~.deconvolute_peaks`
+
+        Returns
+        -------
+        dict
+        """
+        name = request.get("averagine", "peptide")
+        try:
+            averagine = self.averagine_caches[name]
+        except KeyError:
+            raise ValueError("Unknown averagine %r" % (name,))
+        charge_range = tuple(int(z) for z in request.get("charge_range", (1, 8)))
+        if len(charge_range) != 2:
+            raise ValueError("charge_range must have two values")
+        return {
+            "decon_config": {
+                "averagine": averagine,
+                "scorer": make_scorer(
+                    request.get("scorer", "penalized-msdeconv"), float(request.get("score_threshold", 10.))),
+            },
+            "charge_range": charge_range,
+            "error_tolerance": float(request.get("error_tolerance", ERROR_TOLERANCE)),
+            "truncate_after": float(request.get("truncate_after", TRUNCATE_AFTER)),
+        }
+
+    def deconvolute(self, request):
+        """Deconvolute the peaks given by `request`
+
+        Returns
+        -------
+        DeconvolutedPeakSet
+        """
+        arguments = self.deconvolution_arguments(request)
+        peaks = self.peaks_for(request)
+        result = deconvolute_peaks(peaks, **arguments)
+        with self._lock:
+            self.requests_handled += 1
+        return result.peak_set
+
+    def handle(self, request):
+        """Deconvolute `request` and encode the response
+
+        Returns
+        -------
+        content_type : str
+        body : bytes
+        """
+        peak_set = self.deconvolute(request)
+        return encode_response(peak_set, request.get("format", "json"), request.get("scan_id"))
+
+    def status(self):
+        return {
+            "requests_handled": self.requests_handled,
+            "readers": list(self.readers),
+            "averagine": {
+                name: {"patterns": len(cache.backend), "hits": cache.hits, "misses": cache.misses}
+                for name, cache in self.averagine_caches.items()},
+        }
+
+    def close(self):
+        with self._lock:
+            while self.readers:
+                _, (reader, lock) = self.readers.popitem()
+                with lock:
+                    reader.close()
+
+
+def encode_response(peak_set, format="json", scan_id=None):
+    """Encode `peak_set` as the body of a response
+
+    Parameters
+    ----------
+    peak_set : DeconvolutedPeakSet
+    format : str
+        Either ``"json"`` or ``"binary"``
+    scan_id : str, optional
+        The id of the scan deconvoluted, which is included in the JSON form
+
+    Returns
+    -------
+    content_type : str
+    body : bytes
+    """
+    arrays = deconvoluted_peak_set_to_arrays(peak_set)
+    if format == "binary":
+        return BINARY_CONTENT_TYPE, ArrayBundle(arrays).to_packed_bytes()
+    elif format != "json":
+        raise ValueError("Unknown format %r" % (format,))
+    columns = OrderedDict()
+    for name, array in arrays.items():
+        values = array.tolist()
+        if array.dtype.kind == 'f':
+            # NaN is not valid JSON
+            values = [None if v != v else v for v in values]
+        columns[name] = values
+    body = json.dumps({"scan_id": scan_id, "peaks": columns}, allow_nan=False)
+    return JSON_CONTENT_TYPE, body.encode("utf8")
+
+
+def decode_response(body, content_type=JSON_CONTENT_TYPE):
+    """Rebuild the :class:`~.DeconvolutedPeakSet` encoded by :func:`encode_response`
+
+    Returns
+    -------
+    DeconvolutedPeakSet
+    """
+    if content_type == BINARY_CONTENT_TYPE:
+        arrays = ArrayBundle.from_packed_bytes(body).arrays
+    else:
+        columns = json.loads(body.decode("utf8"))["peaks"]
+        arrays = {
+            name: np.array(values, dtype=np.float64 if name not in ("charge", "chosen_for_msms", "envelope_offsets")
+                           else None)
+            for name, values in columns.items()}
+        arrays["charge"] = arrays["charge"].astype(np.int64)
+        arrays["envelope_offsets"] = arrays["envelope_offsets"].astype(np.int64)
+        arrays["chosen_for_msms"] = arrays["chosen_for_msms"].astype(np.bool_)
+    return deconvoluted_peak_set_from_arrays(arrays)
+
+
+def request_deconvolution(url, request, format="binary", timeout=None):
+    """Send `request` to the :class:`DeconvolutionServer` at `url`
+
+    Parameters
+    ----------
+    url : str
+        The address of the server, such as ``"http://127.0.0.1:8765"``
+    request : dict
+        The request, as described in the module documentation
+    format : str
+        The form of the response to ask for
+    timeout : float, optional
+        The number of seconds to wait for the response
+
+    Returns
+    -------
+    DeconvolutedPeakSet
+
+    Raises
+    ------
+    ValueError
+        If the server rejected the request
+    """
+    request = dict(request, format=format)
+    message = Request(url.rstrip("/") + "/deconvolute", data=json.dumps(request).encode("utf8"),
+                      headers={"Content-Type": JSON_CONTENT_TYPE})
+    try:
+        response = _opener.open(message, timeout=timeout)
+    except HTTPError as err:
+        try:
+            reason = json.loads(err.read().decode("utf8"))["error"]
+        except (ValueError, KeyError):
+            reason = str(err)
+        raise ValueError("%d: %s" % (err.code, reason))
+    try:
+        return decode_response(response.read(), response.headers.get("Content-Type"))
+    finally:
+        response.close()
+
+
+_worker_service = None
+
+
+def _initialize_worker(service_args, warm_up_args):
+    global _worker_service
+    _worker_service = DeconvolutionService(**service_args)
+    if warm_up_args is not None:
+        _worker_service.warm_up(**warm_up_args)
+
+
+def _handle_in_worker(request):
+    return _worker_service.handle(request)
+
+
+class DeconvolutionRequestHandler(BaseHTTPRequestHandler):
+    def _send(self, code, content_type, body):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, code, payload):
+        self._send(code, JSON_CONTENT_TYPE, json.dumps(payload).encode("utf8"))
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/status":
+            self._send_json(404, {"error": "Not found"})
+            return
+        self._send_json(200, self.server.status())
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/deconvolute":
+            self._send_json(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length).decode("utf8"))
+            if not isinstance(request, dict):
+                raise ValueError("The request must be a JSON object")
+            content_type, body = self.server.handle_deconvolution(request)
+        except KeyError as err:
+            self._send_json(404, {"error": str(err.args[0]) if err.args else "Not found"})
+        except (ValueError, TypeError) as err:
+            self._send_json(400, {"error": str(err)})
+        except Exception as err:
+            logger.exception("An error occurred while handling %r", self.path)
+            self._send_json(500, {"error": "%s: %s" % (type(err).__name__, err)})
+        else:
+            self._send(200, content_type, body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class DeconvolutionServer(ThreadingMixIn, HTTPServer):
+    """Serves a :class:`DeconvolutionService` over HTTP.
+
+    Each connection is handled on its own thread. With no workers, those threads
+    share one service. Otherwise each request is passed to a pool of `n_workers`
+    processes, each with its own service, so that requests are deconvoluted in parallel.
+
+    Attributes
+    ----------
+    service : DeconvolutionService
+        The service handling requests when there are no workers
+    pool : multiprocessing.Pool
+        The worker processes, if any
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), service_args=None, n_workers=0, warm_up_args=None):
+        service_args = dict(service_args or {})
+        self.n_workers = n_workers
+        self.service = None
+        self.pool = None
+        if n_workers > 0:
+            self.pool = multiprocessing.Pool(n_workers, _initialize_worker, (service_args, warm_up_args))
+        else:
+            self.service = DeconvolutionService(**service_args)
+            if warm_up_args is not None:
+                self.service.warm_up(**warm_up_args)
+        HTTPServer.__init__(self, address, DeconvolutionRequestHandler)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+    def handle_deconvolution(self, request):
+        if self.pool is not None:
+            return self.pool.apply(_handle_in_worker, (request,))
+        return self.service.handle(request)
+
+    def status(self):
+        status = {"workers": self.n_workers}
+        if self.service is not None:
+            status.update(self.service.status())
+        return status
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        if self.service is not None:
+            self.service.close()
+
+
+def serve(host="127.0.0.1", port=8765, n_workers=0, service_args=None, warm_up_args=None):
+    """Run a :class:`DeconvolutionServer` until interrupted
+    """
+    server = DeconvolutionServer((host, port), service_args, n_workers, warm_up_args)
+    logger.info("Serving deconvolution requests at %s", server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
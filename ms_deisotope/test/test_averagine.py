@@ -1,10 +1,11 @@
+import pickle
 import unittest
 
 from ms_deisotope.averagine import (
     peptide, calculate_mass, average_compositions,
     _Averagine, Averagine, add_compositions,
     AveragineCache, _AveragineCache, TheoreticalIsotopicPattern,
-    _TheoreticalIsotopicPattern)
+    _TheoreticalIsotopicPattern, InterpolatedAveragineCache)
 
 
 tid1 = [
@@ -60,6 +61,32 @@ TestPurePythonAveragine = make_averagine_suite(_Averagine)
 TestAveragine = make_averagine_suite(Averagine)
 TestAveragineCache = make_averagine_suite(AveragineCache)
 TestPurePythonAveragineCache = make_averagine_suite(_AveragineCache)
+TestInterpolatedAveragineCache = make_averagine_suite(
+    lambda composition: InterpolatedAveragineCache(composition, max_mass=10000.))
+
+
+class TestInterpolatedAveragineTables(unittest.TestCase):
+    def test_accuracy(self):
+        interpolated = InterpolatedAveragineCache(peptide, max_mass=10000.)
+        self.assertLess(interpolated.max_error, interpolated.tolerance)
+        exact = AveragineCache(peptide)
+        for mz, charge in [(1234.5, 3), (900.0, 8), (50.0, 1)]:
+            tid = interpolated.isotopic_cluster(mz, charge)
+            reference = exact.isotopic_cluster(mz, charge)
+            self.assertEqual(len(tid), len(reference))
+            for peak, match in zip(tid, reference):
+                self.assertAlmostEqual(peak.mz, match.mz, 3)
+                self.assertAlmostEqual(peak.intensity, match.intensity, 2)
+
+    def test_pickle(self):
+        interpolated = InterpolatedAveragineCache(peptide, max_mass=2000.)
+        duplicate = pickle.loads(pickle.dumps(interpolated))
+        self.assertEqual(duplicate.max_error, interpolated.max_error)
+        a = interpolated.isotopic_cluster(800.0, 2)
+        b = duplicate.isotopic_cluster(800.0, 2)
+        for peak, match in zip(a, b):
+            self.assertAlmostEqual(peak.mz, match.mz)
+            self.assertAlmostEqual(peak.intensity, match.intensity)
 
 
 class TestSupportMethods(unittest.TestCase):
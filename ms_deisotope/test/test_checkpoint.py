@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ms_deisotope import checkpoint, cli
+
+from ms_deisotope.test.common import datafile
+
+try:
+    from psims.mzml import writer as _writer
+    has_mzml_writer = True
+except ImportError:
+    has_mzml_writer = False
+
+
+class TestCheckpoint(unittest.TestCase):
+    mzxml_path = datafile("microscans.mzXML")
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_save_load(self):
+        output_path = os.path.join(self.directory, "out.mzML")
+        point = checkpoint.Checkpoint(self.mzxml_path, output_path, "211", 1, 0.5, 2, 1024)
+        path = point.save()
+        self.assertEqual(path, checkpoint.Checkpoint.path_for(output_path))
+        self.assertEqual(checkpoint.Checkpoint.load(path).to_dict(), point.to_dict())
+
+    def test_next_bunch_id(self):
+        ids = cli.list_bunches(self.mzxml_path, cli.ScanRange())
+        self.assertEqual(checkpoint.next_bunch_id(self.mzxml_path, ids[0]), ids[1])
+        self.assertIsNone(checkpoint.next_bunch_id(self.mzxml_path, ids[-1]))
+
+    def run_deconvolute(self, output_path, *extra):
+        return cli.main(["deconvolute", self.mzxml_path, output_path, "-a", "glycopeptide"] + list(extra))
+
+    def read(self, path):
+        from ms_deisotope.output.mzml import ProcessedMzMLDeserializer
+        reader = ProcessedMzMLDeserializer(path)
+        result = [(bunch.precursor.id, [(p.neutral_mass, p.charge) for p in bunch.precursor.deconvoluted_peak_set])
+                  for bunch in reader]
+        reader.close()
+        return result
+
+    @unittest.skipIf(not has_mzml_writer, "Requires psims")
+    def test_empty_range(self):
+        output_path = os.path.join(self.directory, "out.mzML")
+        self.run_deconvolute(output_path, "--end-time", "0")
+        self.assertEqual(self.read(output_path), [])
+
+    @unittest.skipIf(not has_mzml_writer, "Requires psims")
+    def test_resume(self):
+        expected_path = os.path.join(self.directory, "expected.mzML")
+        self.run_deconvolute(expected_path)
+        expected = self.read(expected_path)
+        self.assertEqual(len(expected), 4)
+
+        output_path = os.path.join(self.directory, "out.mzML")
+        process_sequential = cli.process_sequential
+
+        def fail_after_two(*args, **kwargs):
+            for i, item in enumerate(process_sequential(*args, **kwargs)):
+                if i == 2:
+                    raise RuntimeError("Interrupted")
+                yield item
+
+        cli.process_sequential = fail_after_two
+        try:
+            self.assertRaises(RuntimeError, self.run_deconvolute, output_path, "--checkpoint-interval", "0")
+        finally:
+            cli.process_sequential = process_sequential
+        point = checkpoint.Checkpoint.load(checkpoint.Checkpoint.path_for(output_path))
+        self.assertEqual((point.scan_id, point.bunches), (expected[1][0], 2))
+        with open(output_path, 'ab') as handle:
+            # A spectrum torn by the failure
+            handle.write(b'<spectrum index="2" id="212"')
+
+        self.run_deconvolute(output_path, "--resume")
+        self.assertEqual(self.read(output_path), expected)
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted([
+            "expected.mzML", "expected.mzML-idx.json", "out.mzML", "out.mzML-idx.json"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
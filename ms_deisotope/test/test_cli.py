@@ -0,0 +1,83 @@
+import unittest
+
+from ms_deisotope import cli, transfer
+
+from ms_deisotope.test.common import datafile
+
+
+class TestDeconvoluteCommand(unittest.TestCase):
+    mzml_path = datafile("three_test_scans.mzML")
+
+    def parse(self, *extra):
+        return cli.make_parser().parse_args(
+            ["deconvolute", self.mzml_path, "out.mzML", "--targeted-ms1-only", "-a", "glycopeptide",
+             "-t", "5"] + list(extra))
+
+    def solutions(self, bunches):
+        return [(bunch.precursor.id, [(p.id, p.precursor_information.extracted_charge,
+                                       p.precursor_information.extracted_neutral_mass,
+                                       len(p.deconvoluted_peak_set)) for p in bunch.products])
+                for bunch, _ in bunches]
+
+    def test_processor_arguments(self):
+        args = self.parse("-z", "2", "6", "--ignore-charge-hint")
+        processor_args = cli.processor_arguments(args)
+        self.assertEqual(processor_args["ms1_deconvolution_args"]["charge_range"], (2, 6))
+        self.assertEqual(processor_args["ms1_deconvolution_args"]["scorer"].select.minimum_score, 5.)
+        self.assertFalse(processor_args["trust_charge_hint"])
+        self.assertTrue(processor_args["targeted_ms1_only"])
+
+    def test_parallel_matches_sequential(self):
+        processor_args = cli.processor_arguments(self.parse())
+        scan_range = cli.ScanRange()
+        sequential = list(cli.process_sequential(self.mzml_path, scan_range, processor_args))
+        parallel = list(cli.process_parallel(self.mzml_path, scan_range, processor_args, 2))
+        self.assertEqual(len(sequential), 1)
+        self.assertEqual(self.solutions(sequential), self.solutions(parallel))
+        if transfer.has_shared_memory:
+            shared = list(cli.process_parallel(
+                self.mzml_path, scan_range, processor_args, 2, shared_memory=True))
+            self.assertEqual(self.solutions(sequential), self.solutions(shared))
+
+    def test_scan_range(self):
+        processor_args = cli.processor_arguments(self.parse())
+        self.assertEqual(list(cli.process_sequential(
+            self.mzml_path, cli.ScanRange(end_time=1.0), processor_args)), [])
+        self.assertEqual(cli.list_bunches(self.mzml_path, cli.ScanRange(
+            end_scan="controllerType=0 controllerNumber=1 scan=10015")),
+            ["controllerType=0 controllerNumber=1 scan=10014"])
+
+
+class TestServeCommand(unittest.TestCase):
+    def test_arguments(self):
+        args = cli.make_parser().parse_args(
+            ["serve", "--workers", "2", "-a", "glycan", "-a", "peptide", "--warm-up", "200", "1000"])
+        self.assertEqual((args.host, args.workers, args.averagine), ("127.0.0.1", 2, ["glycan", "peptide"]))
+        self.assertEqual(args.warm_up, [200., 1000.])
+        self.assertIs(args.func, cli.serve)
+
+
+class TestShards(unittest.TestCase):
+    mzxml_path = datafile("microscans.mzXML")
+
+    def test_plan_shards(self):
+        everything = cli.list_bunches(self.mzxml_path, cli.ScanRange())
+        for n_shards in (1, 2, 3, 8):
+            shards = cli.plan_shards(self.mzxml_path, n_shards)
+            self.assertEqual(len(shards), min(n_shards, len(everything)))
+            self.assertIsNone(shards[0].start_scan)
+            self.assertIsNone(shards[-1].stop_scan)
+            parts = [cli.list_bunches(self.mzxml_path, shard) for shard in shards]
+            self.assertTrue(all(parts))
+            self.assertEqual(sum(parts, []), everything)
+
+    def test_shard_argument(self):
+        args = cli.make_parser().parse_args(["deconvolute", self.mzxml_path, "out.mzML", "--shard", "2", "2"])
+        scan_range = cli._scan_range(args)
+        self.assertEqual((scan_range.start_scan, scan_range.stop_scan), ("212", None))
+        args.shard = (3, 2)
+        self.assertRaises(ValueError, cli._scan_range, args)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import io
+import unittest
+
+import numpy as np
+
+from brainpy import isotopic_variants
+from ms_peak_picker import pick_peaks
+
+from ms_deisotope.composition_library import CompositionLibrary
+from ms_deisotope.deconvolution import (
+    deconvolute_peaks, CompositionListDeconvoluter,
+    CompositionListPeakDependenceGraphDeconvoluter)
+from ms_deisotope.scoring import PenalizedMSDeconVFitter
+
+
+compositions = [
+    {"C": c, "H": c * 2, "O": c // 3, "N": c // 5} for c in range(20, 120, 3)
+]
+
+
+def make_peaks(composition, charge):
+    tid = isotopic_variants(composition, charge=charge)
+    mz = np.linspace(tid[0].mz - 2, tid[-1].mz + 2, 5000)
+    intensity = np.zeros_like(mz)
+    for peak in tid:
+        intensity += peak.intensity * 1e5 * np.exp(-((mz - peak.mz) ** 2) / (2 * 0.01 ** 2))
+    return pick_peaks(mz, intensity)
+
+
+class TestCompositionLibrary(unittest.TestCase):
+    def test_build(self):
+        library = CompositionLibrary(compositions, (1, 3))
+        self.assertEqual(len(library), len(compositions))
+        self.assertEqual(len(library.charges), len(compositions) * 3)
+        self.assertTrue(np.all(np.diff(library.monoisotopic_mz) >= 0))
+        tid = library.isotopic_cluster(compositions[4], 2)
+        reference = isotopic_variants(compositions[4], charge=2)
+        for a, b in zip(tid, reference):
+            self.assertAlmostEqual(a.mz, b.mz, 5)
+            self.assertAlmostEqual(a.intensity, b.intensity, 5)
+        self.assertIsNone(library.isotopic_cluster(compositions[4], 5))
+
+    def test_query(self):
+        library = CompositionLibrary(compositions, (1, 3))
+        tid = isotopic_variants(compositions[10], charge=2)
+        found = library.compositions_between(tid[0].mz, tid[-1].mz)
+        self.assertIn(compositions[10], found)
+        self.assertLess(len(found), len(compositions))
+
+    def test_persistence(self):
+        library = CompositionLibrary(compositions, (1, 3))
+        buffer = io.BytesIO()
+        library.dump(buffer)
+        buffer.seek(0)
+        duplicate = CompositionLibrary.load(buffer)
+        self.assertTrue(np.allclose(duplicate.peak_mz, library.peak_mz))
+        self.assertIsNotNone(duplicate.isotopic_cluster(duplicate.compositions[3], 1))
+
+    def test_deconvolution(self):
+        library = CompositionLibrary(compositions, (1, 3))
+        peaks = make_peaks(compositions[10], 2)
+        for deconvoluter_type in (CompositionListDeconvoluter, CompositionListPeakDependenceGraphDeconvoluter):
+            results = []
+            for composition_list in (compositions, library):
+                result = deconvolute_peaks(peaks, {
+                    "composition_list": composition_list,
+                    "scorer": PenalizedMSDeconVFitter(5., 1.)
+                }, charge_range=(1, 3), deconvoluter_type=deconvoluter_type)
+                results.append([(p.neutral_mass, p.charge) for p in result.peak_set])
+            self.assertEqual(len(results[0]), 1)
+            self.assertEqual(results[0], results[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,36 +1,46 @@
+import time
 import unittest
 
 import numpy as np
 
 from ms_deisotope.data_source import common, mzml
-from ms_deisotope.averagine import peptide
+from ms_deisotope.averagine import peptide, glycopeptide, glycan
 from ms_deisotope.deconvolution import (
     deconvolute_peaks, AveragineDeconvoluter,
-    AveraginePeakDependenceGraphDeconvoluter)
+    AveraginePeakDependenceGraphDeconvoluter,
+    MultiAveraginePeakDependenceGraphDeconvoluter,
+    partition_peak_index, envelope_search_width)
 from ms_deisotope.scoring import PenalizedMSDeconVFitter
+from ms_deisotope.peak_dependency_network import (
+    PeakDependenceGraph, ArrayPeakDependenceGraph, BranchAndBoundSubgraphSelection,
+    ConnectedSubgraph, DependenceCluster, SubgraphTimeBudget)
+from ms_peak_picker import FittedPeak
 from brainpy import neutral_mass
+from ms_deisotope.test.common import datafile
 from ms_deisotope.test.test_scan import make_profile, points, fwhm
 
 
+def make_scan():
+    mz, intensity = make_profile(points, fwhm)
+    scan = common.Scan(
+        {
+            "id": "test-scan",
+            "index": 0,
+            "m/z array": mz,
+            "ms level": 1,
+            "scan time": 0.0,
+            "intensity array": intensity,
+            "profile spectrum": "",
+            "positive scan": "",
+        },
+        mzml.MzMLDataInterface())
+    return scan
+
+
 class TestDeconvolution(unittest.TestCase):
-    def make_scan(self):
-        mz, intensity = make_profile(points, fwhm)
-        scan = common.Scan(
-            {
-                "id": "test-scan",
-                "index": 0,
-                "m/z array": mz,
-                "ms level": 1,
-                "scan time": 0.0,
-                "intensity array": intensity,
-                "profile spectrum": "",
-                "positive scan": "",
-            },
-            mzml.MzMLDataInterface())
-        return scan
 
     def test_deconvolution(self):
-        scan = self.make_scan()
+        scan = make_scan()
         scan.pick_peaks()
         self.assertIsNotNone(scan.peak_set)
         algorithm_type = AveragineDeconvoluter
@@ -46,7 +56,7 @@ class TestDeconvolution(unittest.TestCase):
             self.assertIsNotNone(peak)
 
     def test_graph_deconvolution(self):
-        scan = self.make_scan()
+        scan = make_scan()
         scan.pick_peaks()
         self.assertIsNotNone(scan.peak_set)
         algorithm_type = AveraginePeakDependenceGraphDeconvoluter
@@ -65,6 +75,291 @@ class TestDeconvolution(unittest.TestCase):
                 deconvoluter.peak_dependency_network.find_solution_for(fp).mz,
                 peak.mz, 3)
 
+    def deconvolute(self, scan, deconvoluter_type=AveraginePeakDependenceGraphDeconvoluter, priority_list=None,
+                    n_processes=1, **config):
+        """Deconvolute `scan` with the default configuration updated by `config`,
+        checking that every one of `points` is found
+        """
+        decon_config = {
+            "averagine": peptide,
+            "scorer": PenalizedMSDeconVFitter(5., 1.)
+        }
+        decon_config.update(config)
+        deconresult = deconvolute_peaks(
+            scan.peak_set, decon_config, deconvoluter_type=deconvoluter_type,
+            priority_list=priority_list, n_processes=n_processes)
+        for point in points:
+            self.assertIsNotNone(deconresult.peak_set.has_peak(neutral_mass(point[0], point[1])))
+        return deconresult
+
+    def deconvolute_each(self, option, values, signature, **config):
+        """Deconvolute a fresh scan once for each of `values` of the `option` setting, and
+        check that every run produces the same `signature` of its result
+        """
+        results = []
+        for value in values:
+            scan = make_scan()
+            scan.pick_peaks()
+            config[option] = value
+            deconresult = self.deconvolute(scan, **config)
+            results.append(signature(deconresult))
+        for result in results[1:]:
+            self.assertEqual(result, results[0])
+        return deconresult
+
+    def test_array_graph_deconvolution(self):
+        scan = make_scan()
+        scan.pick_peaks()
+        deconresult = self.deconvolute(scan, peak_dependency_graph_type=ArrayPeakDependenceGraph)
+        deconvoluter = deconresult.deconvoluter
+        self.assertIsInstance(deconvoluter.peak_dependency_network, ArrayPeakDependenceGraph)
+        for point in points:
+            peak = deconresult.peak_set.has_peak(neutral_mass(point[0], point[1]))
+            fp = scan.has_peak(peak.mz)
+            self.assertAlmostEqual(
+                deconvoluter.peak_dependency_network.find_solution_for(fp).mz,
+                peak.mz, 3)
+
+    def test_branch_and_bound_graph_deconvolution(self):
+        scan = make_scan()
+        scan.pick_peaks()
+        self.deconvolute(scan, subgraph_selection_method="branch_and_bound")
+        deconresult = self.deconvolute(
+            scan, subgraph_selection_method="branch_and_bound", subgraph_time_budget=0.0)
+        self.assertEqual(deconresult.deconvoluter.peak_dependency_network.subgraph_budget.time_budget, 0.0)
+
+    def test_partitioned_deconvolution(self):
+        scan = make_scan()
+        scan.pick_peaks()
+        windows = partition_peak_index(scan.peak_set, 10., 2)
+        self.assertEqual(len(windows), 2)
+        self.assertTrue(windows[0][1] > points[0][0])
+        self.assertTrue(windows[1][0] < points[1][0])
+        deconresult = self.deconvolute(scan, priority_list=[points[1][0]], n_processes=2)
+        self.assertIsNone(deconresult.deconvoluter)
+        self.assertIn(deconresult.priorities[0], deconresult.peak_set)
+        self.assertEqual(deconresult.priorities[0].charge, points[1][1])
+
+    def test_partitioned_deconvolution_matches_sequential(self):
+        bunch = next(mzml.MzMLLoader(datafile("three_test_scans.mzML")))
+        scan = bunch.precursor
+        scan.pick_peaks()
+        priority_list = [product.precursor_information.mz for product in bunch.products]
+        solutions = []
+        for n_processes in (1, 2):
+            deconresult = deconvolute_peaks(
+                scan.peak_set, {"averagine": glycopeptide, "scorer": PenalizedMSDeconVFitter(20., 2.)},
+                charge_range=(1, 8), priority_list=priority_list, n_processes=n_processes)
+            solutions.append((
+                sorted((p.neutral_mass, p.charge, p.intensity, p.score) for p in deconresult.peak_set),
+                [(p.neutral_mass, p.charge) if p is not None else None for p in deconresult.priorities]))
+        width = envelope_search_width(glycopeptide, max(p.mz for p in scan.peak_set), (1, 8), 0.95, 4)
+        self.assertGreater(len(partition_peak_index(scan.peak_set, width, 8)), 1)
+        self.assertEqual(solutions[0], solutions[1])
+
+    def test_budgeted_deconvolution(self):
+        scan = make_scan()
+        scan.pick_peaks()
+        self.assertFalse(self.deconvolute(scan).degraded)
+        self.assertTrue(self.deconvolute(scan, time_budget=0.0).degraded)
+        self.assertTrue(self.deconvolute(scan, max_fits=1).degraded)
+
+    def test_shared_multiaveragine_deconvolution(self):
+        deconresult = self.deconvolute_each(
+            "shared_averagine_matching", (False, True),
+            lambda result: sorted((p.neutral_mass, p.charge, p.score) for p in result.peak_set),
+            averagine=[peptide, glycopeptide, glycan],
+            deconvoluter_type=MultiAveraginePeakDependenceGraphDeconvoluter)
+        self.assertTrue(deconresult.deconvoluter.use_shared_matching)
+
+    def test_batch_subtraction_deconvolution(self):
+        residuals = []
+
+        def signature(result):
+            residuals.append([p.intensity for p in result.deconvoluter.peaklist])
+            return sorted((p.neutral_mass, p.charge, p.intensity) for p in result.peak_set)
+
+        self.deconvolute_each("batch_subtraction", (False, True), signature)
+        self.assertTrue(np.allclose(residuals[0], residuals[1]))
+
+    def test_fit_cache_deconvolution(self):
+        deconresult = self.deconvolute_each(
+            "use_fit_cache", (False, True),
+            lambda result: sorted((p.neutral_mass, p.charge, p.intensity) for p in result.peak_set))
+        stats = deconresult.deconvoluter.fit_cache.statistics()
+        self.assertGreater(stats['hits'], 0)
+        self.assertGreater(stats['hit_rate'], 0)
+        self.assertLessEqual(stats['size'], stats['misses'])
+
+    def test_score_bound_pruning(self):
+        scan = make_scan()
+        scan.pick_peaks()
+        scorer = PenalizedMSDeconVFitter(5., 1.)
+        deconresult = self.deconvolute(
+            scan, deconvoluter_type=AveragineDeconvoluter, scorer=scorer, use_subtraction=False)
+        deconvoluter = deconresult.deconvoluter
+        for point in points:
+            fit = deconresult.peak_set.has_peak(neutral_mass(point[0], point[1])).fit
+            self.assertGreaterEqual(scorer.score_bound(fit.experimental), fit.score)
+        self.assertGreater(deconvoluter.pruned_fits, 0)
+        self.assertGreater(deconvoluter.scored_fits, 0)
+
+    def test_coalesced_priority_targets(self):
+        scan = make_scan()
+        scan.pick_peaks()
+        targets = [scan.has_peak(point[0]) for point in points]
+        targets = targets + targets
+        for algorithm_type in (AveragineDeconvoluter, AveraginePeakDependenceGraphDeconvoluter):
+            results = self.deconvolute(scan, deconvoluter_type=algorithm_type, priority_list=targets).priorities
+            n = len(points)
+            self.assertEqual(len(results), 2 * n)
+            for i, point in enumerate(points):
+                self.assertIsNotNone(results[i])
+                self.assertIs(results[i], results[i + n])
+                self.assertAlmostEqual(results[i].neutral_mass, neutral_mass(point[0], point[1]), 2)
+
+    def test_coalesced_charge_hints_must_match(self):
+        scan = make_scan()
+        scan.pick_peaks()
+        peak = scan.has_peak(points[0][0])
+        targets = [HintedTarget(peak, (1, 1)), HintedTarget(peak, (1, 8)), HintedTarget(peak, (1, 1))]
+        deconresult = deconvolute_peaks(
+            scan.peak_set, {
+                "averagine": peptide,
+                "scorer": PenalizedMSDeconVFitter(5., 1.)
+            }, priority_list=targets, deconvoluter_type=RecordingTargetsDeconvoluter)
+        # The charge 1 hint lies within 1 to 8, but the wider search finds a different
+        # solution so the two must not share a result
+        self.assertEqual(deconresult.deconvoluter.targeted_charge_ranges, [(1, 1), (1, 8)])
+        results = deconresult.priorities
+        self.assertEqual(results[0].charge, 1)
+        self.assertEqual(results[1].charge, points[0][1])
+        self.assertIs(results[2], results[0])
+
+
+class RecordingTargetsDeconvoluter(AveragineDeconvoluter):
+    def __init__(self, *args, **kwargs):
+        AveragineDeconvoluter.__init__(self, *args, **kwargs)
+        self.targeted_charge_ranges = []
+
+    def targeted_deconvolution(self, peak, *args, **kwargs):
+        self.targeted_charge_ranges.append(tuple(kwargs["charge_range"]))
+        return AveragineDeconvoluter.targeted_deconvolution(self, peak, *args, **kwargs)
+
+
+class HintedTarget(object):
+    def __init__(self, peak, charge_range):
+        self.peak = peak
+        self.charge_range = charge_range
+
+    def charge_range_hint(self, charge_range):
+        return self.charge_range
+
+
+def fit_signature(fit):
+    # Fits of the same peaks with the same score are interchangeable, and which
+    # of them survives a filter depends on set iteration order
+    return (tuple((p.peak_count, p.mz) for p in fit.experimental), fit.charge, fit.score)
+
+
+class TestArrayPeakDependenceGraph(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        scan = make_scan()
+        scan.pick_peaks()
+        deconvoluter = AveraginePeakDependenceGraphDeconvoluter(
+            scan.peak_set, averagine=peptide, scorer=PenalizedMSDeconVFitter(5., 1.))
+        deconvoluter.populate_graph(charge_range=(1, 8), left_search_limit=3, right_search_limit=3)
+        cls.peaklist = deconvoluter.peaklist
+        cls.fits = sorted(deconvoluter.peak_dependency_network.dependencies, key=fit_signature)
+
+    def make_graphs(self, **kwargs):
+        graphs = []
+        for graph_type in (PeakDependenceGraph, ArrayPeakDependenceGraph):
+            graph = graph_type(self.peaklist, **kwargs)
+            for fit in self.fits:
+                graph.add_fit_dependence(fit)
+            graphs.append(graph)
+        return graphs
+
+    def assert_same_fits(self, method, **kwargs):
+        surviving = []
+        for graph in self.make_graphs(**kwargs):
+            getattr(graph, method)()
+            surviving.append(sorted(map(fit_signature, graph.dependencies)))
+        self.assertLess(len(surviving[0]), len(self.fits))
+        self.assertEqual(surviving[0], surviving[1])
+
+    def test_drop_gapped_fits(self):
+        self.assert_same_fits("drop_gapped_fits", max_missed_peaks=0)
+
+    def test_best_exact_fits(self):
+        self.assert_same_fits("best_exact_fits")
+
+    def test_drop_superceded_fits(self):
+        self.assert_same_fits("drop_superceded_fits")
+
+    def test_find_non_overlapping_intervals(self):
+        solutions = []
+        for graph in self.make_graphs():
+            clusters = graph.find_non_overlapping_intervals()
+            solutions.append([
+                (sorted(map(fit_signature, cluster)),
+                 sorted(map(fit_signature, cluster.disjoint_best_fits())))
+                for cluster in clusters])
+        self.assertGreater(len(solutions[0]), 1)
+        self.assertEqual(solutions[0], solutions[1])
+
+    def test_fits_for_peak(self):
+        graphs = self.make_graphs()
+        for peak in self.peaklist:
+            self.assertEqual(*[sorted(map(fit_signature, graph.fits_for_peak(peak))) for graph in graphs])
+
+
+class FakeFit(object):
+    def __init__(self, peaks, score):
+        self.experimental = peaks
+        self.score = score
+
+    def __repr__(self):
+        return "FakeFit(%r, %r)" % ([p.peak_count for p in self.experimental], self.score)
+
+
+class TestSubgraphSelection(unittest.TestCase):
+    def make_fits(self):
+        peaks = [FittedPeak(500. + i, 100., 10., i, i, 0.01, 1.) for i in range(2)]
+        # The best single fit claims both peaks, but the two fits of one peak each score more together
+        return [FakeFit(peaks, 10.), FakeFit(peaks[:1], 6.), FakeFit(peaks[1:], 6.)]
+
+    def select(self, fits, deadline=None):
+        solver = BranchAndBoundSubgraphSelection(ConnectedSubgraph(fits), deadline=deadline)
+        return solver, sorted(node.score for node in solver.select())
+
+    def test_branch_and_bound(self):
+        solver, scores = self.select(self.make_fits())
+        self.assertFalse(solver.timed_out)
+        self.assertEqual(scores, [6., 6.])
+
+    def test_greedy_fallback_when_budget_exhausted(self):
+        solver, scores = self.select(self.make_fits(), deadline=time.time() - 1)
+        self.assertTrue(solver.timed_out)
+        self.assertEqual(scores, [10.])
+
+    def test_budget_shared_across_clusters(self):
+        budget = SubgraphTimeBudget(0.0)
+        clusters = [DependenceCluster(dependencies=self.make_fits(), selection_method="branch_and_bound",
+                                      selection_budget=budget) for _ in range(2)]
+        budget.deadline()
+        time.sleep(0.01)
+        self.assertTrue(budget.exhausted)
+        for cluster in clusters:
+            self.assertEqual([fit.score for fit in cluster.disjoint_best_fits()], [10.])
+        budget.reset()
+        self.assertFalse(budget.exhausted)
+        cluster = DependenceCluster(dependencies=self.make_fits(), selection_method="branch_and_bound",
+                                    selection_budget=SubgraphTimeBudget(None))
+        self.assertEqual(sorted(fit.score for fit in cluster.disjoint_best_fits()), [6., 6.])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,68 @@
+import random
+import unittest
+
+import numpy as np
+
+from ms_peak_picker import FittedPeak
+
+from ms_deisotope.averagine import Averagine, peptide
+from ms_deisotope.scoring import MSDeconVFitter
+from ms_deisotope.feature_map import feature_processor
+from ms_deisotope.feature_map.lcms_feature import LCMSFeature
+
+
+def make_feature(mz, times, profile, index):
+    feature = LCMSFeature()
+    for time, intensity in zip(times, profile):
+        if intensity > 0:
+            feature.insert(FittedPeak(mz, intensity, intensity, 0, index, 0.01, intensity), time)
+    return feature
+
+
+def make_features(n_decoys, seed=1):
+    """An isotopic pattern eluting over one minute, with `n_decoys` features of unrelated
+    shape within a few ppm of each of its peaks
+    """
+    rng = random.Random(seed)
+    times = np.round(np.arange(10.0, 11.0, 0.05), 3)
+    elution = 1e6 * np.exp(-((times - 10.5) ** 2) / 0.02)
+    features = []
+    for peak in Averagine(peptide).isotopic_cluster(800.0, 2, truncate_after=0.95):
+        features.append(make_feature(peak.mz, times, elution * peak.intensity, len(features)))
+        for _ in range(n_decoys):
+            profile = rng.uniform(1e4, 8e5) * np.exp(
+                -((times - rng.uniform(10.2, 10.8)) ** 2) / rng.uniform(0.005, 0.05))
+            features.append(make_feature(
+                peak.mz * (1 + rng.uniform(-8e-6, 8e-6)), times, profile, len(features)))
+    return features
+
+
+class TestFeatureCombinationSearch(unittest.TestCase):
+    def test_best_first_combinations(self):
+        ranked_groups = [[(1.0, 0, "a"), (0.5, 1, "b")], [(1.0, 0, "c"), (0.9, 1, "d"), (0.1, 2, "e")]]
+        combinations = feature_processor.best_first_combinations(ranked_groups, 0)
+        self.assertEqual(len(combinations), 6)
+        totals = [sum(ranked_groups[i][j][0] for i, j in enumerate(c)) for c in combinations]
+        self.assertEqual(totals, sorted(totals, reverse=True))
+        self.assertEqual(feature_processor.best_first_combinations(ranked_groups, 2), [(0, 0), (0, 1)])
+
+    def test_capped_search_keeps_best_fit(self):
+        features = make_features(6)
+        best = []
+        for max_combinations in (0, 40):
+            processor = feature_processor.LCMSFeatureProcessor(
+                features, peptide, MSDeconVFitter(10.), max_combinations=max_combinations)
+            seed = [f for f in processor.feature_map if f.feature_id == features[0].feature_id][0]
+            fits = processor._fit_feature_set(seed.mz, 2e-5, 2, truncate_after=0.95, feature=seed)
+            if max_combinations:
+                self.assertEqual(len(fits), max_combinations)
+            else:
+                # The compiled implementation also drops candidates overlapping the seed only briefly
+                self.assertTrue(40 < len(fits) <= 7 ** 4)
+            best.append(max(fits, key=lambda fit: fit.score))
+        self.assertEqual(best[0].score, best[1].score)
+        self.assertEqual([f.feature_id for f in best[0].features], [f.feature_id for f in best[1].features])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,10 @@
+import json
 import unittest
 
+from io import StringIO
+
 from ms_deisotope import processor
+from ms_deisotope.data_source.common import ChargeNotProvided, PrecursorInformation
 from ms_deisotope.averagine import glycopeptide
 from ms_deisotope.scoring import PenalizedMSDeconVFitter
 
@@ -20,6 +24,79 @@ class TestScanProcessor(unittest.TestCase):
             self.assertIsNotNone(scan_bunch.precursor)
             self.assertIsNotNone(scan_bunch.products)
 
+    def test_precursor_cache(self):
+        proc = processor.ScanProcessor(self.mzml_path, ms1_deconvolution_args={
+            "averagine": glycopeptide,
+            "scorer": PenalizedMSDeconVFitter(5., 2.)
+        }, trust_charge_hint=False, use_precursor_cache=True)
+        bunch = next(proc.reader)
+        solutions = []
+        for _ in range(2):
+            precursor, priorities, products = proc.process_scan_group(bunch.precursor, bunch.products)
+            proc.deconvolute_precursor_scan(precursor, priorities)
+            solutions.append([(p.precursor_information.extracted_charge,
+                               p.precursor_information.extracted_neutral_mass) for p in products])
+        self.assertEqual(proc.precursor_cache.hits, len(bunch.products))
+        self.assertTrue(all(t.prior_charge is not None for t in priorities))
+        self.assertEqual(solutions[0], solutions[1])
+        self.assertEqual(len(proc.precursor_cache), len(bunch.products))
+
+    def test_precursor_cache_without_charge(self):
+        proc = processor.ScanProcessor(self.mzml_path, ms1_deconvolution_args={
+            "averagine": glycopeptide,
+            "scorer": PenalizedMSDeconVFitter(5., 2.)
+        }, trust_charge_hint=False, use_precursor_cache=True)
+        bunch = next(proc.reader)
+        for product in bunch.products:
+            product.precursor_information.charge = ChargeNotProvided
+        solutions = []
+        for _ in range(2):
+            precursor, priorities, products = proc.process_scan_group(bunch.precursor, bunch.products)
+            proc.deconvolute_precursor_scan(precursor, priorities)
+            solutions.append([(p.precursor_information.extracted_charge,
+                               p.precursor_information.extracted_neutral_mass) for p in products])
+        self.assertEqual(proc.precursor_cache.hits, len(bunch.products))
+        self.assertEqual(solutions[0], solutions[1])
+        self.assertTrue(all(s.charge_hint is None for s in proc.precursor_cache.solutions.values()))
+        cache = processor.PrecursorSolutionCache()
+        self.assertEqual(cache.lookup(PrecursorInformation(500., 100., ChargeNotProvided), 1.0, None), (None, None))
+
+    def test_targeted_ms1_only(self):
+        solutions = []
+        for targeted_ms1_only in (False, True):
+            proc = processor.ScanProcessor(self.mzml_path, ms1_deconvolution_args={
+                "averagine": glycopeptide,
+                "scorer": PenalizedMSDeconVFitter(5., 2.)
+            }, targeted_ms1_only=targeted_ms1_only)
+            bunch = next(proc)
+            solutions.append([(p.precursor_information.extracted_charge,
+                               p.precursor_information.extracted_neutral_mass) for p in bunch.products])
+            if targeted_ms1_only:
+                self.assertLess(len(bunch.precursor.deconvoluted_peak_set), 10)
+        self.assertEqual(solutions[0], solutions[1])
+
+    def test_statistics(self):
+        buffer = StringIO()
+        statistics = processor.ProcessingStatistics(processor.JSONLinesStatisticsWriter(buffer))
+        proc = processor.ScanProcessor(self.mzml_path, ms1_deconvolution_args={
+            "averagine": glycopeptide,
+            "scorer": PenalizedMSDeconVFitter(5., 2.)
+        }, targeted_ms1_only=True, statistics=statistics)
+        bunches = list(proc)
+        self.assertEqual(len(statistics), 1 + len(bunches[0].products))
+        precursor = statistics.records[0]
+        self.assertEqual(precursor.ms_level, 1)
+        self.assertEqual(list(precursor.timings), ["read", "pick_peaks", "deconvolute"])
+        self.assertGreater(precursor.deconvolution.fits_explored, 0)
+        self.assertGreater(len(precursor.deconvolution.cluster_sizes), 0)
+        for record in statistics.records[1:]:
+            self.assertEqual(record.ms_level, 2)
+            self.assertGreater(record.deconvolution.subtraction_iterations, 0)
+            self.assertGreater(record.deconvolution.averagine_cache_hits, 0)
+        lines = [json.loads(line) for line in buffer.getvalue().splitlines()]
+        self.assertEqual([line["scan_id"] for line in lines], [r.scan_id for r in statistics.records])
+        self.assertEqual(statistics.summary()[2]["scans"], len(bunches[0].products))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,45 @@
+import shutil
+import tempfile
+import unittest
+
+from ms_deisotope import processor, replay
+from ms_deisotope.averagine import glycopeptide
+from ms_deisotope.scoring import PenalizedMSDeconVFitter
+
+from ms_deisotope.test.common import datafile
+
+
+class TestSlowScanCapture(unittest.TestCase):
+    mzml_path = datafile("three_test_scans.mzML")
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_capture_and_replay(self):
+        capture = replay.SlowScanCapture(self.directory, threshold=0.0)
+        proc = processor.ScanProcessor(self.mzml_path, ms1_deconvolution_args={
+            "averagine": glycopeptide,
+            "scorer": PenalizedMSDeconVFitter(5., 2.)
+        }, targeted_ms1_only=True, slow_scan_hook=capture)
+        bunch = next(proc)
+        self.assertEqual(len(capture.captured), 1 + len(bunch.products))
+
+        precursor_replay = replay.load_replay(capture.captured[0])
+        self.assertEqual(precursor_replay.scan_id, bunch.precursor.id)
+        self.assertEqual(len(precursor_replay.priority_targets), len(bunch.products))
+        result, stats = precursor_replay.profile()
+        self.assertEqual(
+            [(p.neutral_mass, p.charge) for p in result.peak_set],
+            [(p.neutral_mass, p.charge) for p in bunch.precursor.deconvoluted_peak_set])
+        self.assertGreater(stats.total_calls, 0)
+
+        product_replay = replay.load_replay(capture.captured[1])
+        result = product_replay.run()
+        self.assertEqual(len(result.peak_set), len(bunch.products[0].deconvoluted_peak_set))
+
+
+if __name__ == '__main__':
+    unittest.main()
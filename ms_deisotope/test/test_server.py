@@ -0,0 +1,93 @@
+import json
+import threading
+import unittest
+
+import numpy as np
+
+from ms_peak_picker import pick_peaks
+
+from ms_deisotope import server
+from ms_deisotope.averagine import AveragineCache, glycopeptide
+from ms_deisotope.data_source import MSFileLoader
+from ms_deisotope.deconvolution import deconvolute_peaks
+from ms_deisotope.scoring import PenalizedMSDeconVFitter
+
+from ms_deisotope.test.common import datafile
+from ms_deisotope.test.test_transfer import deconvoluted_signature
+
+
+class TestDeconvolutionServer(unittest.TestCase):
+    mzml_path = datafile("three_test_scans.mzML")
+    scan_id = "controllerType=0 controllerNumber=1 scan=10015"
+
+    @classmethod
+    def setUpClass(cls):
+        reader = MSFileLoader(cls.mzml_path)
+        cls.peaks = reader.get_scan_by_id(cls.scan_id).pick_peaks().peak_set
+        reader.close()
+        cls.expected = cls.deconvolute(cls.peaks)
+
+    @staticmethod
+    def deconvolute(peaks):
+        return deconvoluted_signature(deconvolute_peaks(peaks, {
+            "averagine": AveragineCache(glycopeptide, dict()),
+            "scorer": PenalizedMSDeconVFitter(10., 2.)}, charge_range=(1, 8)).peak_set)
+
+    def start(self, **kwargs):
+        instance = server.DeconvolutionServer(**kwargs)
+        thread = threading.Thread(target=instance.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(instance.server_close)
+        self.addCleanup(instance.shutdown)
+        return instance
+
+    def request(self, instance, format="binary", **request):
+        request.setdefault("averagine", "glycopeptide")
+        return deconvoluted_signature(server.request_deconvolution(instance.url, request, format=format))
+
+    def test_scan_request(self):
+        instance = self.start()
+        self.assertEqual(self.request(instance, path=self.mzml_path, scan_id=self.scan_id), self.expected)
+        self.assertEqual(self.request(instance, "json", path=self.mzml_path, scan_id=self.scan_id), self.expected)
+        status = json.loads(server._opener.open(instance.url + "/status").read().decode("utf8"))
+        self.assertEqual(status["requests_handled"], 2)
+        self.assertEqual(len(status["readers"]), 1)
+        self.assertGreater(status["averagine"]["glycopeptide"]["hits"], 0)
+
+    def test_peak_list_request(self):
+        instance = self.start()
+        mz = [p.mz for p in self.peaks]
+        intensity = [p.intensity for p in self.peaks]
+        # Peaks given as a list are centroided again, with default widths
+        expected = self.deconvolute(pick_peaks(np.array(mz), np.array(intensity), peak_mode="centroid"))
+        self.assertEqual(self.request(instance, mz=mz[::-1], intensity=intensity[::-1]), expected)
+
+    def test_workers(self):
+        instance = self.start(n_workers=1)
+        results = []
+
+        def send():
+            results.append(self.request(instance, path=self.mzml_path, scan_id=self.scan_id))
+
+        threads = [threading.Thread(target=send) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [self.expected] * 2)
+
+    def assert_rejected(self, instance, code, **request):
+        with self.assertRaises(ValueError) as context:
+            self.request(instance, **request)
+        self.assertTrue(str(context.exception).startswith(code), context.exception)
+
+    def test_errors(self):
+        instance = self.start()
+        self.assert_rejected(instance, "404", path=self.mzml_path, scan_id="not a scan")
+        self.assert_rejected(instance, "400", mz=[100.0])
+        self.assert_rejected(instance, "400", averagine="unknown", mz=[100.0], intensity=[1.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import pickle
+import unittest
+
+from ms_peak_picker import PeakIndex
+
+from ms_deisotope import processor, transfer
+from ms_deisotope.averagine import glycopeptide
+from ms_deisotope.scoring import PenalizedMSDeconVFitter
+
+from ms_deisotope.test.common import datafile
+
+
+def peak_index_signature(peak_index):
+    return [(p.mz, p.intensity, p.signal_to_noise, p.peak_count, p.index, p.full_width_at_half_max)
+            for p in peak_index]
+
+
+def deconvoluted_signature(peak_set):
+    return [(p.neutral_mass, p.intensity, p.charge, p.score, p.chosen_for_msms, p.index.mz,
+             [tuple(pair) for pair in p.envelope]) for p in peak_set]
+
+
+class TestScanBunchTransfer(unittest.TestCase):
+    mzml_path = datafile("three_test_scans.mzML")
+
+    @classmethod
+    def setUpClass(cls):
+        proc = processor.ScanProcessor(cls.mzml_path, ms1_deconvolution_args={
+            "averagine": glycopeptide,
+            "scorer": PenalizedMSDeconVFitter(5., 2.)
+        }, targeted_ms1_only=True)
+        cls.bunch = proc.pack_next()
+
+    def check_round_trip(self, shared):
+        packed = pickle.dumps(transfer.ScanBunchTransfer.from_bunch(self.bunch, shared=shared), -1)
+        bunch = pickle.loads(packed).to_bunch()
+        self.assertEqual(len(bunch.products), len(self.bunch.products))
+        for original, copy in zip([self.bunch.precursor] + self.bunch.products,
+                                  [bunch.precursor] + bunch.products):
+            self.assertEqual(original.id, copy.id)
+            self.assertEqual(original.scan_time, copy.scan_time)
+            self.assertEqual(peak_index_signature(original.peak_set), peak_index_signature(copy.peak_set))
+            self.assertEqual(deconvoluted_signature(original.deconvoluted_peak_set),
+                             deconvoluted_signature(copy.deconvoluted_peak_set))
+        self.assertEqual(bunch.products[0].precursor_information.extracted_neutral_mass,
+                         self.bunch.products[0].precursor_information.extracted_neutral_mass)
+        self.assertTrue(any(p.chosen_for_msms for p in bunch.precursor.deconvoluted_peak_set))
+
+    def test_round_trip(self):
+        self.check_round_trip(False)
+
+    def test_peak_index_signal_arrays(self):
+        peak_index = self.bunch.precursor.peak_set
+        copy = transfer.peak_index_from_arrays(transfer.peak_index_to_arrays(peak_index))
+        self.assertEqual(copy.mz_array.tolist(), peak_index.mz_array.tolist())
+        self.assertEqual(copy.intensity_array.tolist(), peak_index.intensity_array.tolist())
+
+        peak_index = PeakIndex(None, None, peak_index.peaks)
+        arrays = transfer.peak_index_to_arrays(peak_index)
+        self.assertNotIn("mz_array", arrays)
+        copy = transfer.peak_index_from_arrays(arrays)
+        self.assertIsNone(copy.mz_array)
+        self.assertIsNone(copy.intensity_array)
+        self.assertEqual(peak_index_signature(copy), peak_index_signature(peak_index))
+
+    @unittest.skipIf(not transfer.has_shared_memory, "Requires multiprocessing.shared_memory")
+    def test_shared_memory_round_trip(self):
+        self.check_round_trip(True)
+
+
+if __name__ == '__main__':
+    unittest.main()
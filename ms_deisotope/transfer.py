@@ -0,0 +1,409 @@
+"""Array-level serialization of peak sets and processed scans for moving them
+between processes.
+
+Pickling a :class:`~.DeconvolutedPeakSet` or :class:`~ms_peak_picker.PeakIndex`
+pickles each peak, its :class:`~.Envelope` and its isotopic fit as separate objects.
+The functions here instead lay each container out as a handful of column arrays,
+with the isotopic envelopes of a :class:`~.DeconvolutedPeakSet` flattened into
+two arrays indexed by an array of offsets. An :class:`ArrayBundle` packs any number
+of these columns into one contiguous buffer, which can be copied into a
+:mod:`multiprocessing.shared_memory` block so that only its name and layout
+need to be pickled.
+
+:class:`ScanBunchTransfer` applies this to whole :class:`~.ScanBunch` of
+:class:`~.ProcessedScan`. The isotopic fits of deconvoluted peaks are not
+transferred, as when writing them to a file.
+"""
+import json
+import struct
+
+from collections import OrderedDict
+
+import numpy as np
+
+from ms_peak_picker import PeakIndex, PeakSet, FittedPeak
+
+from .data_source.common import ScanBunch
+from .peak_set import DeconvolutedPeak, DeconvolutedPeakSet, Envelope
+from .utils import Base, range
+
+try:
+    from multiprocessing import shared_memory
+    from multiprocessing import resource_tracker
+    has_shared_memory = True
+except ImportError:  # pragma: no cover
+    shared_memory = None
+    resource_tracker = None
+    has_shared_memory = False
+
+
+PEAK_INDEX_FLOAT_FIELDS = (
+    "mz", "intensity", "signal_to_noise", "full_width_at_half_max",
+    "area", "left_width", "right_width")
+PEAK_INDEX_INT_FIELDS = ("peak_count", "index")
+
+DECONVOLUTED_FLOAT_FIELDS = (
+    "neutral_mass", "intensity", "signal_to_noise", "full_width_at_half_max",
+    "a_to_a2_ratio", "most_abundant_mass", "average_mass", "score", "mz", "area")
+
+
+def _float_column(peaks, name):
+    values = [getattr(peak, name) for peak in peaks]
+    return np.array([v if v is not None else np.nan for v in values], dtype=np.float64)
+
+
+def peak_index_to_arrays(peak_index):
+    """Lay out the peaks of `peak_index` as column arrays.
+
+    The raw signal arrays are included as ``mz_array`` and ``intensity_array``
+    unless they are :const:`None`, in which case :func:`peak_index_from_arrays`
+    leaves them :const:`None` too.
+
+    Parameters
+    ----------
+    peak_index : ms_peak_picker.PeakIndex
+
+    Returns
+    -------
+    OrderedDict
+        Maps each :class:`~ms_peak_picker.FittedPeak` attribute to an array
+    """
+    peaks = list(peak_index.peaks)
+    arrays = OrderedDict()
+    for name in PEAK_INDEX_FLOAT_FIELDS:
+        arrays[name] = _float_column(peaks, name)
+    for name in PEAK_INDEX_INT_FIELDS:
+        arrays[name] = np.array([getattr(peak, name) for peak in peaks], dtype=np.int64)
+    if peak_index.mz_array is not None:
+        arrays["mz_array"] = np.asarray(peak_index.mz_array, dtype=np.float64)
+        arrays["intensity_array"] = np.asarray(peak_index.intensity_array, dtype=np.float64)
+    return arrays
+
+
+def peak_index_from_arrays(arrays):
+    """Rebuild the :class:`~ms_peak_picker.PeakIndex` laid out by
+    :func:`peak_index_to_arrays`
+
+    Parameters
+    ----------
+    arrays : Mapping
+
+    Returns
+    -------
+    ms_peak_picker.PeakIndex
+    """
+    columns = [arrays[name].tolist() for name in (
+        "mz", "intensity", "signal_to_noise", "peak_count", "index",
+        "full_width_at_half_max", "area", "left_width", "right_width")]
+    peaks = PeakSet([FittedPeak(*values) for values in zip(*columns)])
+    peaks.reindex()
+    if "mz_array" not in arrays:
+        return PeakIndex(None, None, peaks)
+    return PeakIndex(arrays["mz_array"], arrays["intensity_array"], peaks)
+
+
+def deconvoluted_peak_set_to_arrays(peak_set):
+    """Lay out the peaks of `peak_set` as column arrays.
+
+    The isotopic envelopes are concatenated into ``envelope_mz`` and
+    ``envelope_intensity``, where the envelope of the `i`-th peak spans
+    ``envelope_offsets[i]:envelope_offsets[i + 1]``. Missing values are
+    stored as NaN.
+
+    Parameters
+    ----------
+    peak_set : DeconvolutedPeakSet
+
+    Returns
+    -------
+    OrderedDict
+        Maps each :class:`~.DeconvolutedPeak` attribute to an array
+    """
+    peaks = list(peak_set)
+    arrays = OrderedDict()
+    for name in DECONVOLUTED_FLOAT_FIELDS:
+        arrays[name] = _float_column(peaks, name)
+    arrays["charge"] = np.array([peak.charge for peak in peaks], dtype=np.int64)
+    arrays["chosen_for_msms"] = np.array([peak.chosen_for_msms for peak in peaks], dtype=np.bool_)
+    offsets = np.zeros(len(peaks) + 1, dtype=np.int64)
+    envelope_mz = []
+    envelope_intensity = []
+    for i, peak in enumerate(peaks):
+        for pair in peak.envelope:
+            envelope_mz.append(pair[0])
+            envelope_intensity.append(pair[1])
+        offsets[i + 1] = len(envelope_mz)
+    arrays["envelope_offsets"] = offsets
+    arrays["envelope_mz"] = np.array(envelope_mz, dtype=np.float64)
+    arrays["envelope_intensity"] = np.array(envelope_intensity, dtype=np.float64)
+    return arrays
+
+
+def deconvoluted_peak_set_from_arrays(arrays):
+    """Rebuild the :class:`~.DeconvolutedPeakSet` laid out by
+    :func:`deconvoluted_peak_set_to_arrays`
+
+    Parameters
+    ----------
+    arrays : Mapping
+
+    Returns
+    -------
+    DeconvolutedPeakSet
+    """
+    columns = {name: arrays[name].tolist() for name in DECONVOLUTED_FLOAT_FIELDS}
+    charges = arrays["charge"].tolist()
+    chosen = arrays["chosen_for_msms"].tolist()
+    offsets = arrays["envelope_offsets"].tolist()
+    envelope_pairs = list(zip(arrays["envelope_mz"].tolist(), arrays["envelope_intensity"].tolist()))
+    peaks = []
+    for i in range(len(charges)):
+        peaks.append(DeconvolutedPeak(
+            columns["neutral_mass"][i], columns["intensity"][i], charges[i],
+            columns["signal_to_noise"][i], 0, columns["full_width_at_half_max"][i],
+            columns["a_to_a2_ratio"][i], columns["most_abundant_mass"][i],
+            columns["average_mass"][i], columns["score"][i],
+            Envelope(envelope_pairs[offsets[i]:offsets[i + 1]]), columns["mz"][i],
+            None, chosen[i], columns["area"][i]))
+    peak_set = DeconvolutedPeakSet(peaks)
+    peak_set._reindex()
+    return peak_set
+
+
+_HEADER_SIZE = struct.Struct("<I")
+
+
+def _align(offset, alignment=8):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+class ArrayBundle(Base):
+    """A collection of named arrays which can be packed into, and read from,
+    a single contiguous buffer.
+
+    Attributes
+    ----------
+    arrays : OrderedDict
+        Maps names to :class:`numpy.ndarray`
+    """
+
+    def __init__(self, arrays=None):
+        self.arrays = OrderedDict(arrays or ())
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def __setitem__(self, name, array):
+        self.arrays[name] = np.ascontiguousarray(array)
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+    def __len__(self):
+        return len(self.arrays)
+
+    def update(self, arrays, prefix=""):
+        for name, array in arrays.items():
+            self[prefix + name] = array
+
+    def view(self, prefix):
+        """The arrays whose names start with `prefix`, with it removed
+        """
+        n = len(prefix)
+        return OrderedDict((name[n:], array) for name, array in self.arrays.items() if name.startswith(prefix))
+
+    def layout(self):
+        """Describe where each array lies in the packed buffer
+
+        Returns
+        -------
+        layout : list of tuple
+            The name, dtype, shape and byte offset of each array
+        size : int
+            The number of bytes of the packed buffer
+        """
+        layout = []
+        offset = 0
+        for name, array in self.arrays.items():
+            offset = _align(offset)
+            layout.append((name, array.dtype.str, array.shape, offset))
+            offset += array.nbytes
+        return layout, offset
+
+    def write_into(self, buffer, layout):
+        for name, dtype, shape, offset in layout:
+            array = self.arrays[name]
+            np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)[...] = array
+
+    @classmethod
+    def read_from(cls, buffer, layout, copy=True):
+        """Read the arrays described by `layout` from `buffer`. Unless `copy` is
+        :const:`True`, the arrays are views of `buffer`.
+        """
+        arrays = OrderedDict()
+        for name, dtype, shape, offset in layout:
+            array = np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)
+            arrays[name] = array.copy() if copy else array
+        return cls(arrays)
+
+    def to_bytes(self):
+        layout, size = self.layout()
+        buffer = bytearray(size)
+        self.write_into(buffer, layout)
+        return layout, bytes(buffer)
+
+    def to_packed_bytes(self):
+        """Pack the arrays and their layout into one self-describing byte string,
+        for sending to another program.
+
+        The string begins with the length of a JSON-encoded layout as a little-endian
+        32-bit unsigned integer, followed by the layout and then the packed buffer,
+        starting at the next multiple of 8 bytes.
+
+        Returns
+        -------
+        bytes
+        """
+        layout, buffer = self.to_bytes()
+        header = json.dumps([[name, dtype, list(shape), offset]
+                             for name, dtype, shape, offset in layout]).encode("utf8")
+        start = _align(_HEADER_SIZE.size + len(header))
+        padding = b"\0" * (start - _HEADER_SIZE.size - len(header))
+        return _HEADER_SIZE.pack(len(header)) + header + padding + buffer
+
+    @classmethod
+    def from_packed_bytes(cls, data, copy=True):
+        """Read the arrays packed by :meth:`to_packed_bytes` from `data`
+        """
+        data = memoryview(data)
+        header_size, = _HEADER_SIZE.unpack_from(data)
+        end = _HEADER_SIZE.size + header_size
+        layout = [(name, dtype, tuple(shape), offset)
+                  for name, dtype, shape, offset in json.loads(data[_HEADER_SIZE.size:end].tobytes().decode("utf8"))]
+        return cls.read_from(data[_align(end):], layout, copy=copy)
+
+    def to_shared_memory(self):
+        """Copy the arrays into a new shared memory block. Ownership of the block
+        passes to whichever process calls :meth:`SharedArrayBundle.attach` on the
+        returned handle, which releases it.
+
+        Returns
+        -------
+        SharedArrayBundle
+        """
+        if not has_shared_memory:
+            raise RuntimeError("multiprocessing.shared_memory requires Python 3.8 or later")
+        layout, size = self.layout()
+        block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            self.write_into(block.buf, layout)
+            name = block.name
+        finally:
+            block.close()
+        # The receiving process unlinks the block, so this process must not
+        # try to clean it up when it exits
+        resource_tracker.unregister(getattr(block, "_name", "/" + name), "shared_memory")
+        return SharedArrayBundle(name, layout)
+
+
+class SharedArrayBundle(Base):
+    """A picklable handle on an :class:`ArrayBundle` held in a shared memory block
+
+    Attributes
+    ----------
+    name : str
+        The name of the shared memory block
+    layout : list of tuple
+        The layout of the arrays in the block, as from :meth:`ArrayBundle.layout`
+    """
+
+    def __init__(self, name, layout):
+        self.name = name
+        self.layout = layout
+
+    def attach(self, unlink=True):
+        """Copy the arrays out of the shared memory block, releasing it
+        if `unlink` is :const:`True`
+
+        Returns
+        -------
+        ArrayBundle
+        """
+        block = shared_memory.SharedMemory(name=self.name)
+        try:
+            bundle = ArrayBundle.read_from(block.buf, self.layout, copy=True)
+        finally:
+            block.close()
+            if unlink:
+                block.unlink()
+        return bundle
+
+
+class ScanBunchTransfer(Base):
+    """A :class:`~.ScanBunch` of :class:`~.ProcessedScan` whose peak sets are
+    carried as arrays rather than pickled peak by peak.
+
+    Attributes
+    ----------
+    scans : list of ProcessedScan
+        The precursor and product scans, without their peak sets
+    arrays : ArrayBundle or SharedArrayBundle
+        The peak sets of each scan
+    """
+
+    def __init__(self, scans, arrays):
+        self.scans = scans
+        self.arrays = arrays
+
+    @classmethod
+    def from_bunch(cls, bunch, shared=False):
+        """Lay out the peak sets of `bunch`. If `shared` is :const:`True`, the arrays are
+        moved into a shared memory block, which :meth:`to_bunch` will release.
+
+        Parameters
+        ----------
+        bunch : ScanBunch
+            A bunch of :class:`~.ProcessedScan`, as from :meth:`~.ScanProcessor.pack_next`
+        shared : bool
+
+        Returns
+        -------
+        ScanBunchTransfer
+        """
+        scans = []
+        arrays = ArrayBundle()
+        for i, scan in enumerate([bunch.precursor] + list(bunch.products)):
+            stub = scan.clone()
+            stub.peak_set = None
+            stub.deconvoluted_peak_set = None
+            scans.append(stub)
+            if scan.peak_set is not None:
+                arrays.update(peak_index_to_arrays(scan.peak_set), "%d/peak_set/" % i)
+            if scan.deconvoluted_peak_set is not None:
+                arrays.update(deconvoluted_peak_set_to_arrays(scan.deconvoluted_peak_set),
+                              "%d/deconvoluted_peak_set/" % i)
+        if shared:
+            arrays = arrays.to_shared_memory()
+        return cls(scans, arrays)
+
+    def to_bunch(self):
+        """Rebuild the bunch
+
+        Returns
+        -------
+        ScanBunch
+        """
+        arrays = self.arrays
+        if isinstance(arrays, SharedArrayBundle):
+            arrays = arrays.attach()
+        scans = []
+        for i, stub in enumerate(self.scans):
+            scan = stub.clone()
+            prefix = "%d/peak_set/" % i
+            if prefix + "mz" in arrays:
+                scan.peak_set = peak_index_from_arrays(arrays.view(prefix))
+            prefix = "%d/deconvoluted_peak_set/" % i
+            if prefix + "mz" in arrays:
+                scan.deconvoluted_peak_set = deconvoluted_peak_set_from_arrays(arrays.view(prefix))
+            scans.append(scan)
+        return ScanBunch(scans[0], scans[1:])
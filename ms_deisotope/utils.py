@@ -107,11 +107,13 @@ class Constant(object):
 
 
 class DeconvolutionProcessResult(object):
-    def __init__(self, deconvoluter, peak_set, priorities, errors=None):
+    def __init__(self, deconvoluter, peak_set, priorities, errors=None, degraded=False, statistics=None):
         self.deconvoluter = deconvoluter
         self.peak_set = peak_set
         self.priorities = priorities
         self.errors = errors
+        self.degraded = degraded
+        self.statistics = statistics
 
     def __getitem__(self, i):
         if i == 0:
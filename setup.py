@@ -187,6 +187,11 @@ def run_setup(include_cext=True):
                 'License :: OSI Approved :: BSD License',
                 'Topic :: Scientific/Engineering :: Bio-Informatics'],
         install_requires=install_requires,
+        entry_points={
+            "console_scripts": [
+                "ms-deisotope = ms_deisotope.cli:main",
+            ],
+        },
         zip_safe=False)
 
 